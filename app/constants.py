@@ -6,3 +6,33 @@ def k_history(code: str) -> str:
 
 def k_current_issue(code: str) -> str:
     return f"cs28:lottery:{code}:current_issue"
+
+def k_result_version(code: str) -> str:
+    # 开奖结果更正计数：每次更正 +1，各实例据此重建进程内的走势统计 / 列式期次存储
+    return f"cs28:lottery:{code}:result_version"
+
+def k_scheduler_leader() -> str:
+    return "cs28:scheduler:leader"
+
+def k_leaderboard(board: str, period: str, bucket: str) -> str:
+    # board: profit / volume；period: day / week；bucket: 20240701 / 2024W27
+    return f"cs28:leaderboard:{board}:{period}:{bucket}"
+
+def k_risk_rate_user(user_id: int) -> str:
+    return f"cs28:risk:rate:user:{user_id}"
+
+def k_risk_rate_ip(ip: str) -> str:
+    return f"cs28:risk:rate:ip:{ip}"
+
+def k_risk_stake(code: str, issue: str, user_id: int) -> str:
+    return f"cs28:risk:stake:{code}:{issue}:{user_id}"
+
+def k_robot_reports(code: str) -> str:
+    return f"cs28:robots:{code}:reports"
+
+def k_outbox_applied(handler: str, bucket: int) -> str:
+    # Redis 侧增量订阅者已处理的事件 ID（SET，按 ID 分桶）
+    return f"cs28:outbox:applied:{handler}:{bucket}"
+
+def k_runtime_config_channel() -> str:
+    return "cs28:config:changed"
@@ -1,6 +1,7 @@
 
+import hmac
 from typing import Optional
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 import jwt
 from sqlalchemy import select
@@ -12,10 +13,10 @@ from app.models.user import User
 
 security = HTTPBearer(auto_error=False)
 
-async def get_current_user(
+async def get_current_user_id(
     creds: Optional[HTTPAuthorizationCredentials] = Depends(security),
-    session: AsyncSession = Depends(get_session),
-) -> User:
+) -> int:
+    """只校验 JWT、不查库；用户状态由调用方在自己的事务里复核（如下单时锁用户行）。"""
     if creds is None or creds.scheme.lower() != "bearer":
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="未授权")
     token = creds.credentials
@@ -27,8 +28,19 @@ async def get_current_user(
         uid = int(sub)
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="无效令牌") from e
+    return uid
 
+async def get_current_user(
+    uid: int = Depends(get_current_user_id),
+    session: AsyncSession = Depends(get_session),
+) -> User:
     u = await session.scalar(select(User).where(User.id == uid))
     if not u or u.status != 1:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="用户不存在或已禁用")
     return u
+
+async def require_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="管理端未启用")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, settings.ADMIN_TOKEN):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="管理令牌无效")
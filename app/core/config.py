@@ -9,15 +9,62 @@ class Settings:
     APP_PORT = int(os.getenv("APP_PORT", "8000"))
     TZ = os.getenv("TZ", "Asia/Shanghai")
 
+    # 生产启动（python -m app.run --prod）：预加载后 fork 多个 uvicorn worker 共享监听 socket
+    WEB_WORKERS = int(os.getenv("WEB_WORKERS", "0"))  # 0 = CPU 核数
+    WEB_PRELOAD = os.getenv("WEB_PRELOAD", "1") == "1"
+    WEB_LOOP = os.getenv("WEB_LOOP", "uvloop")
+    WEB_HTTP = os.getenv("WEB_HTTP", "httptools")
+    WEB_BACKLOG = int(os.getenv("WEB_BACKLOG", "2048"))
+    WEB_KEEPALIVE_SECONDS = int(os.getenv("WEB_KEEPALIVE_SECONDS", "65"))  # 大于前端 LB 的空闲超时
+    WEB_GRACEFUL_TIMEOUT_SECONDS = int(os.getenv("WEB_GRACEFUL_TIMEOUT_SECONDS", "30"))
+    WEB_LIMIT_CONCURRENCY = int(os.getenv("WEB_LIMIT_CONCURRENCY", "0"))  # 每 worker 并发连接上限，超出 503；0 不限
+    WEB_MAX_REQUESTS = int(os.getenv("WEB_MAX_REQUESTS", "0"))  # worker 处理 N 个请求后退出并由父进程补起；0 不限
+    WEB_FORWARDED_ALLOW_IPS = os.getenv("WEB_FORWARDED_ALLOW_IPS", "127.0.0.1")
+
     MYSQL_DSN = (
         f"mysql+aiomysql://{os.getenv('MYSQL_USER','root')}:{os.getenv('MYSQL_PASSWORD','123456')}"
         f"@{os.getenv('MYSQL_HOST','127.0.0.1')}:{os.getenv('MYSQL_PORT','3306')}/{os.getenv('MYSQL_DB','cs28')}?charset=utf8mb4"
     )
+    # 只读副本（可选）：未配置 MYSQL_READ_HOST 时只读查询仍走主库
+    MYSQL_READ_DSN = (
+        f"mysql+aiomysql://{os.getenv('MYSQL_READ_USER', os.getenv('MYSQL_USER','root'))}:"
+        f"{os.getenv('MYSQL_READ_PASSWORD', os.getenv('MYSQL_PASSWORD','123456'))}"
+        f"@{os.getenv('MYSQL_READ_HOST')}:{os.getenv('MYSQL_READ_PORT', os.getenv('MYSQL_PORT','3306'))}/{os.getenv('MYSQL_DB','cs28')}?charset=utf8mb4"
+    ) if os.getenv("MYSQL_READ_HOST") else ""
+
+    # 连接池（主库与只读库各一套）
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "3600"))
+    # 启动时预先建立的主库连接数（0 不预热），首批请求不再付建连开销
+    DB_POOL_PREWARM = int(os.getenv("DB_POOL_PREWARM", "2"))
+    # 启动时 create_all 建表（生产由 init.sql / 迁移负责，默认只在 dev 开）
+    DB_CREATE_ALL = os.getenv("DB_CREATE_ALL", "1" if APP_ENV == "dev" else "0") == "1"
+    # 1 = Redis / 统计 / 列式存储预热在启动阶段同步完成；0 = 后台预热，完成后再启动调度器
+    STARTUP_BLOCKING_WARMUP = os.getenv("STARTUP_BLOCKING_WARMUP", "0") == "1"
+    DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", os.getenv("DB_POOL_SIZE", "10")))
+    DB_READ_MAX_OVERFLOW = int(os.getenv("DB_READ_MAX_OVERFLOW", os.getenv("DB_MAX_OVERFLOW", "20")))
+
+    # 慢 SQL 阈值（毫秒，0 关闭）；调试响应头 X-SQL-Count / X-SQL-Time-Ms（默认仅 dev 开启）
+    SLOW_QUERY_MS = int(os.getenv("SLOW_QUERY_MS", "200"))
+    SQL_DEBUG_HEADERS = os.getenv("SQL_DEBUG_HEADERS", "1" if APP_ENV == "dev" else "0") == "1"
+
+    # 多 worker 指标汇总：各 worker 定时把快照写到这个目录，/metrics 合并输出
+    # （空 = 只输出本进程；app.run --prod 多 worker 时未配置则用临时目录 cs28-metrics-<端口>）
+    METRICS_DIR = os.getenv("METRICS_DIR", "")
+    METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
+
     REDIS_URL = f"redis://{os.getenv('REDIS_HOST','127.0.0.1')}:{os.getenv('REDIS_PORT','6379')}/{os.getenv('REDIS_DB','0')}"
 
     JWT_SECRET = os.getenv("JWT_SECRET", "change_me")
     JWT_EXPIRE_MINUTES = int(os.getenv("JWT_EXPIRE_MINUTES", "43200"))
     PASSWORD_SALT = os.getenv("PASSWORD_SALT", "change_me")
+    # bcrypt 哈希线程池：线程数 / 最多排队+执行中的请求数（超出直接 503）
+    PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+    PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+    # 管理端接口令牌（请求头 X-Admin-Token）；为空则管理端接口全部禁用
+    ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
 
     BET_LOCK_AHEAD_SECONDS = int(os.getenv("BET_LOCK_AHEAD_SECONDS", "3"))
 
@@ -28,4 +75,72 @@ class Settings:
     COLLECTOR_JND28_URL = os.getenv("COLLECTOR_JND28_URL", "https://cs00.vip/data/last/jnd28.json")
     COLLECTOR_POLL_SECONDS = int(os.getenv("COLLECTOR_POLL_SECONDS", "5"))
 
+    # 运行时参数（sys_kv_config，见 app/core/runtime.py）：Redis 失效消息即时生效，另按此间隔全量刷新兜底
+    RUNTIME_CONFIG_REFRESH_SECONDS = int(os.getenv("RUNTIME_CONFIG_REFRESH_SECONDS", "30"))
+
+    # 调度主节点选举（多 worker / 多实例时只有主节点跑采集、结算）
+    LEADER_ELECTION_ENABLED = os.getenv("LEADER_ELECTION_ENABLED", "1") == "1"
+    LEADER_LOCK_TTL_SECONDS = int(os.getenv("LEADER_LOCK_TTL_SECONDS", "5"))
+    LEADER_HEARTBEAT_SECONDS = int(os.getenv("LEADER_HEARTBEAT_SECONDS", "1"))
+    # 停机时等待正在执行的主节点任务的最长时间（秒），之后才释放主节点锁
+    SCHEDULER_SHUTDOWN_TIMEOUT_SECONDS = int(os.getenv("SCHEDULER_SHUTDOWN_TIMEOUT_SECONDS", "20"))
+
+    # 下单风控（Redis 滑动窗口，先于任何 DB 操作；0 表示不限制）
+    RISK_ENABLED = os.getenv("RISK_ENABLED", "1") == "1"
+    RISK_WINDOW_MS = int(os.getenv("RISK_WINDOW_MS", "1000"))
+    RISK_USER_BETS_PER_WINDOW = int(os.getenv("RISK_USER_BETS_PER_WINDOW", "5"))
+    RISK_IP_BETS_PER_WINDOW = int(os.getenv("RISK_IP_BETS_PER_WINDOW", "20"))
+    RISK_MAX_STAKE_PER_ISSUE = int(os.getenv("RISK_MAX_STAKE_PER_ISSUE", "50000"))  # 单用户单期累计投注额（元）
+    # risk_user_flag 中禁止下单的标记（逗号分隔），进程内缓存定时刷新
+    RISK_BLOCK_FLAGS = os.getenv("RISK_BLOCK_FLAGS", "BLOCK_BET")
+    RISK_FLAG_REFRESH_SECONDS = int(os.getenv("RISK_FLAG_REFRESH_SECONDS", "10"))
+
+    # 结算：封盘后预计算每单在各和值下的派彩，开奖后按块批量写回
+    SETTLE_PRECOMPUTE_ENABLED = os.getenv("SETTLE_PRECOMPUTE_ENABLED", "1") == "1"
+    SETTLE_APPLY_CHUNK = int(os.getenv("SETTLE_APPLY_CHUNK", "500"))  # 每个事务写回多少单
+    # 开奖结果更正后的重新结算：每个事务处理多少单
+    RESETTLE_CHUNK = int(os.getenv("RESETTLE_CHUNK", "500"))
+
+    # 事务发件箱：主节点轮询投递间隔、每批条数、最大重试次数、已投递事件保留时长
+    OUTBOX_POLL_SECONDS = int(os.getenv("OUTBOX_POLL_SECONDS", "1"))
+    OUTBOX_BATCH = int(os.getenv("OUTBOX_BATCH", "200"))
+    OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "10"))
+    OUTBOX_RETAIN_HOURS = int(os.getenv("OUTBOX_RETAIN_HOURS", "24"))
+
+    # 每期盈亏：issue_bettor（投注人数的增量依据）按期次保留的天数，过期由主节点分批清理
+    ISSUE_BETTOR_RETAIN_DAYS = int(os.getenv("ISSUE_BETTOR_RETAIN_DAYS", "3"))
+
+    # 订单归档：已结算/撤单超过 N 天的订单分批搬到 orders_archive / order_item_archive
+    ORDER_ARCHIVE_ENABLED = os.getenv("ORDER_ARCHIVE_ENABLED", "1") == "1"
+    ORDER_ARCHIVE_AFTER_DAYS = int(os.getenv("ORDER_ARCHIVE_AFTER_DAYS", "30"))
+    ORDER_ARCHIVE_CHUNK = int(os.getenv("ORDER_ARCHIVE_CHUNK", "500"))          # 每个事务搬多少单
+    ORDER_ARCHIVE_MAX_CHUNKS = int(os.getenv("ORDER_ARCHIVE_MAX_CHUNKS", "20"))  # 每轮最多几个事务
+    ORDER_ARCHIVE_SLEEP_MS = int(os.getenv("ORDER_ARCHIVE_SLEEP_MS", "200"))     # 事务之间的间隔
+    ORDER_ARCHIVE_INTERVAL_SECONDS = int(os.getenv("ORDER_ARCHIVE_INTERVAL_SECONDS", "60"))
+
+    # 机器人下注（is_robot 用户，压测 / 容量评估；调度任务只在主节点跑，默认关闭）
+    ROBOT_ENABLED = os.getenv("ROBOT_ENABLED", "0") == "1"
+    ROBOT_TARGET_URL = os.getenv("ROBOT_TARGET_URL", "")  # 为空则进程内调用本应用
+    ROBOT_COUNT = int(os.getenv("ROBOT_COUNT", "200"))
+    ROBOT_USERNAME_PREFIX = os.getenv("ROBOT_USERNAME_PREFIX", "robot_")
+    ROBOT_INITIAL_BALANCE = int(os.getenv("ROBOT_INITIAL_BALANCE", "100000"))
+    ROBOT_BETS_PER_ISSUE = int(os.getenv("ROBOT_BETS_PER_ISSUE", "1000"))
+    ROBOT_BURST_SHARE = float(os.getenv("ROBOT_BURST_SHARE", "0.5"))      # 集中在封盘前的下单占比
+    ROBOT_BURST_SECONDS = float(os.getenv("ROBOT_BURST_SECONDS", "15"))
+    ROBOT_CONCURRENCY = int(os.getenv("ROBOT_CONCURRENCY", "50"))         # 同时在途的下单请求数
+    ROBOT_MAX_ITEMS = int(os.getenv("ROBOT_MAX_ITEMS", "3"))
+    ROBOT_PLAY_WEIGHTS = os.getenv("ROBOT_PLAY_WEIGHTS", "大:25,小:25,单:20,双:20,极大:2,极小:2,和值:6")
+    ROBOT_STAKE_WEIGHTS = os.getenv("ROBOT_STAKE_WEIGHTS", "10:50,20:20,50:15,100:10,500:5")
+    ROBOT_REPORT_KEEP = int(os.getenv("ROBOT_REPORT_KEEP", "50"))
+
+    # 定时任务运行记录（job_run_log）：内存缓冲，按间隔批量落库
+    JOB_RUN_LOG_ENABLED = os.getenv("JOB_RUN_LOG_ENABLED", "1") == "1"
+    JOB_RUN_LOG_FLUSH_SECONDS = int(os.getenv("JOB_RUN_LOG_FLUSH_SECONDS", "5"))
+    JOB_RUN_LOG_RETAIN_DAYS = int(os.getenv("JOB_RUN_LOG_RETAIN_DAYS", "7"))   # 主节点定时清理更早的记录
+
+    # 走势统计窗口（期数，逗号分隔）
+    STATS_WINDOWS = os.getenv("STATS_WINDOWS", "100,500,1000")
+    # 进程内列式期次存储容量（期数）
+    ISSUE_STORE_CAPACITY = int(os.getenv("ISSUE_STORE_CAPACITY", "100000"))
+
 settings = Settings()
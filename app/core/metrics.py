@@ -0,0 +1,367 @@
+# app/core/metrics.py
+"""
+进程内轻量指标（Prometheus 文本格式，/metrics 暴露）：
+  - Counter / Gauge / Histogram：标签按位置传入，值存在 dict[tuple] 里，observe 只做几次加法
+  - register_collector：抓取时才执行的异步采集函数（如待结算订单数、连接池占用）
+  - MetricsMiddleware：纯 ASGI 中间件，按路由模板统计耗时、状态码和每请求 SQL 语句数
+多 worker（app.run --prod 预 fork、共用一个端口）时一次抓取只会落到其中一个 worker，所以跨进程汇总：
+  - 每个 worker 每 METRICS_FLUSH_SECONDS 把自己的快照写到 METRICS_DIR/<pid>.json（启动器在 fork 前清空该目录）
+  - /metrics 先写自己的最新快照，再读目录里所有快照合并：Counter / Histogram 求和（已退出 worker 的文件保留，
+    总数不倒退）；Gauge 按 multiprocess 方式合并：livesum 只加存活进程，worker 加 worker 标签分开列，
+    local 只取处理本次抓取的进程（抓取时由采集函数从库里查出的全局值）
+METRICS_DIR 为空（dev 单进程）时只输出本进程的值。
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LAG_BUCKETS = (0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0)
+
+_registry: List["_Metric"] = []
+_collectors: List[Tuple[Callable[[], Awaitable[None]], bool]] = []
+
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+def _fmt_labels(names: Sequence[str], values: Tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.doc = doc
+        self.labels = tuple(labels)
+        _registry.append(self)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+
+    def merge(self, snapshots: List[Tuple[int, bool, dict]]) -> Tuple[Sequence[str], Dict[Tuple, object]]:
+        """多进程快照 [(pid, 是否存活, {name: [[labels, value], ...]})] → (标签名, 合并后的值)；默认逐项求和。"""
+        out: Dict[Tuple, object] = {}
+        for _, _, snap in snapshots:
+            for labels, v in snap.get(self.name, ()):
+                k = tuple(labels)
+                out[k] = self._add(out.get(k), v)
+        return self.labels, out
+
+    @staticmethod
+    def _add(acc, v):
+        return v if acc is None else acc + v
+
+    def render(self, labels: Optional[Sequence[str]] = None, values: Optional[Dict[Tuple, object]] = None) -> List[str]:
+        return self.header()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = ()):
+        super().__init__(name, doc, labels)
+        self.values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1.0) -> None:
+        self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def render(self, labels: Optional[Sequence[str]] = None, values: Optional[Dict[Tuple, object]] = None) -> List[str]:
+        out = self.header()
+        names = self.labels if labels is None else labels
+        for k, v in (self.values if values is None else values).items():
+            out.append(f"{self.name}{_fmt_labels(names, k)} {v}")
+        return out
+
+
+class Gauge(Counter):
+    """
+    multiprocess：多 worker 时的合并方式
+      livesum —— 存活进程求和（连接池占用、排队中的 bcrypt 调用等每进程一份的量）
+      worker  —— 每个存活进程一行，加 worker=<pid> 标签（如各 worker 的启动阶段耗时）
+      local   —— 只取处理本次抓取的进程（采集函数在抓取时从库里查出的全局值，各进程相同，不能相加）
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = (), multiprocess: str = "livesum"):
+        super().__init__(name, doc, labels)
+        self.multiprocess = multiprocess
+
+    def merge(self, snapshots):
+        me = os.getpid()
+        if self.multiprocess == "local":
+            return self.labels, dict(self.values)
+        if self.multiprocess == "worker":
+            out = {}
+            for pid, alive, snap in snapshots:
+                if alive:
+                    for labels, v in snap.get(self.name, ()):
+                        out[tuple(labels) + (pid,)] = v
+            return self.labels + ("worker",), out
+        return super().merge([x for x in snapshots if x[1] or x[0] == me])
+
+    def set(self, value: float, *labels) -> None:
+        self.values[labels] = float(value)
+
+    def dec(self, *labels, amount: float = 1.0) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def clear(self) -> None:
+        self.values.clear()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, doc, labels)
+        self.buckets = tuple(buckets)
+        # labels -> [每个桶的计数..., +Inf 桶, sum]
+        self.values: Dict[Tuple, List[float]] = {}
+
+    def observe(self, value: float, *labels) -> None:
+        row = self.values.get(labels)
+        if row is None:
+            row = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        row[bisect_left(self.buckets, value)] += 1
+        row[-1] += value
+
+    @staticmethod
+    def _add(acc, v):
+        return list(v) if acc is None else [a + b for a, b in zip(acc, v)]
+
+    def render(self, labels: Optional[Sequence[str]] = None, values: Optional[Dict[Tuple, object]] = None) -> List[str]:
+        out = self.header()
+        for k, row in (self.values if values is None else values).items():
+            acc = 0
+            for i, b in enumerate(self.buckets):
+                acc += row[i]
+                le = 'le="%s"' % b
+                out.append(f"{self.name}_bucket{_fmt_labels(self.labels, k, le)} {acc}")
+            acc += row[len(self.buckets)]
+            le = 'le="+Inf"'
+            out.append(f"{self.name}_bucket{_fmt_labels(self.labels, k, le)} {acc}")
+            out.append(f"{self.name}_sum{_fmt_labels(self.labels, k)} {row[-1]}")
+            out.append(f"{self.name}_count{_fmt_labels(self.labels, k)} {acc}")
+        return out
+
+
+def register_collector(fn=None, *, per_process: bool = False):
+    """
+    抓取时执行的采集函数；per_process=True 表示采的是本进程自己的量（如连接池占用），
+    多 worker 时每次写快照前也执行一次，让其他 worker 处理的抓取也能看到较新的值。
+    """
+    def deco(f: Callable[[], Awaitable[None]]) -> Callable[[], Awaitable[None]]:
+        _collectors.append((f, per_process))
+        return f
+    return deco(fn) if fn is not None else deco
+
+
+async def _run_collectors(per_process_only: bool = False) -> None:
+    for fn, per_process in _collectors:
+        if per_process_only and not per_process:
+            continue
+        try:
+            await fn()
+        except Exception as e:
+            logger.warning("metrics collector %s failed: %s", getattr(fn, "__name__", fn), e)
+
+
+# ------------------------------
+# 多进程快照（METRICS_DIR）
+# ------------------------------
+def _snapshot() -> dict:
+    return {
+        m.name: [[list(k), v] for k, v in m.values.items()]
+        for m in _registry
+        if not (isinstance(m, Gauge) and m.multiprocess == "local")
+    }
+
+
+def write_snapshot() -> None:
+    """把本进程的指标写到 METRICS_DIR/<pid>.json（先写临时文件再改名，读方不会读到半个文件）。"""
+    if not settings.METRICS_DIR:
+        return
+    path = os.path.join(settings.METRICS_DIR, f"{os.getpid()}.json")
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(_snapshot(), f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _read_snapshots() -> List[Tuple[int, bool, dict]]:
+    me = os.getpid()
+    out = []
+    for fn in os.listdir(settings.METRICS_DIR):
+        stem, ext = os.path.splitext(fn)
+        if ext != ".json" or not stem.isdigit():
+            continue
+        pid = int(stem)
+        if pid == me:
+            out.append((pid, True, _snapshot()))  # 自己用内存里的最新值
+            continue
+        try:
+            with open(os.path.join(settings.METRICS_DIR, fn), encoding="utf-8") as f:
+                out.append((pid, _alive(pid), json.load(f)))
+        except (OSError, ValueError) as e:
+            logger.warning("metrics snapshot %s unreadable: %s", fn, e)
+    return out
+
+
+def reset_metrics_dir(path: str) -> None:
+    """启动器在 fork 前调用：清掉上一次运行留下的快照（进程号会复用）。"""
+    os.makedirs(path, exist_ok=True)
+    for fn in os.listdir(path):
+        if fn.endswith(".json") or fn.endswith(".json.tmp"):
+            try:
+                os.remove(os.path.join(path, fn))
+            except FileNotFoundError:
+                pass
+
+
+async def metrics_flusher() -> None:
+    """各 worker 的后台任务：定时采集本进程的量并写快照；取消时再写最后一次。"""
+    try:
+        while True:
+            await _run_collectors(per_process_only=True)
+            write_snapshot()
+            await asyncio.sleep(settings.METRICS_FLUSH_SECONDS)
+    finally:
+        write_snapshot()
+
+
+async def render_metrics() -> str:
+    await _run_collectors()
+    lines: List[str] = []
+    if not settings.METRICS_DIR:
+        for m in _registry:
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+    write_snapshot()
+    snapshots = _read_snapshots()
+    for m in _registry:
+        labels, values = m.merge(snapshots)
+        lines.extend(m.render(labels, values))
+    return "\n".join(lines) + "\n"
+
+
+# ------------------------------
+# 全局指标
+# ------------------------------
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency by route", ("method", "route"))
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests by route and status", ("method", "route", "status"))
+DB_POOL_WAIT = Histogram("db_pool_checkout_wait_seconds", "Time spent waiting for a pooled DB connection", ("engine",))
+DB_POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Connections currently checked out (sum over workers)", ("engine",))
+REDIS_LATENCY = Histogram(
+    "redis_command_duration_seconds", "Redis round-trip time by command", ("command",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0),
+)
+COLLECTOR_LAG = Histogram("collector_lag_seconds", "now - open_time when a new draw is ingested", ("lottery_code",), buckets=LAG_BUCKETS)
+SETTLEMENT_LAG = Histogram("settlement_lag_seconds", "open_time to payout commit per order", ("lottery_code",), buckets=LAG_BUCKETS)
+PENDING_ORDERS = Gauge("pending_unsettled_orders", "Unsettled orders (status 1/3) per issue",
+                       ("lottery_code", "issue_code"), multiprocess="local")
+SQL_STATEMENTS = Counter("sql_statements_total", "SQL statements executed", ("engine",))
+SQL_DURATION = Histogram(
+    "sql_statement_duration_seconds", "Per-statement execution time", ("engine",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0, 5.0),
+)
+SQL_PER_REQUEST = Histogram(
+    "sql_statements_per_request", "SQL statements per HTTP request", ("method", "route"),
+    buckets=(0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20, 50),
+)
+SQL_TIME_PER_REQUEST = Histogram("sql_time_per_request_seconds", "Total SQL time per HTTP request", ("method", "route"))
+PWHASH_IN_FLIGHT = Gauge("password_hash_in_flight", "bcrypt calls queued or running in the hash pool")
+PWHASH_WAIT = Histogram("password_hash_queue_wait_seconds", "Time a bcrypt call waited for a pool thread", ("op",))
+PWHASH_DURATION = Histogram("password_hash_duration_seconds", "bcrypt CPU time per call", ("op",))
+PWHASH_REJECTED = Counter("password_hash_rejected_total", "bcrypt calls rejected because the pool was full", ("op",))
+RISK_REJECTED = Counter("bet_risk_rejected_total", "Bets rejected by the risk gate", ("reason",))
+JOB_DURATION = Histogram("scheduler_job_duration_seconds", "Scheduled job run time", ("job",))
+OUTBOX_DISPATCHED = Counter("outbox_events_dispatched_total", "Outbox events delivered to all subscribers", ("topic",))
+OUTBOX_FAILED = Counter("outbox_handler_failures_total", "Outbox subscriber failures (event batch retried later)", ("topic", "handler"))
+OUTBOX_LAG = Histogram("outbox_dispatch_lag_seconds", "Outbox event created_at to delivery", ("topic",), buckets=LAG_BUCKETS)
+OUTBOX_PENDING = Gauge("outbox_events", "Undelivered outbox events by state (queried at scrape time)",
+                       ("topic", "state"), multiprocess="local")
+ROBOT_BETS = Counter("robot_bets_total", "Robot bets by outcome (ok / HTTP status / exception)", ("outcome",))
+STARTUP_PHASE = Gauge("startup_phase_seconds", "Duration of each startup phase per worker", ("phase",),
+                      multiprocess="worker")
+RESETTLED_ITEMS = Counter("resettled_items_total", "Order items re-settled after a draw correction", ("lottery_code",))
+JOB_RUNS = Counter("scheduler_job_runs_total", "Scheduled job runs by outcome", ("job", "outcome"))
+ARCHIVE_SKIPPED = Counter("order_archive_skipped_total", "Orders the archive job could not move", ("reason",))
+
+
+class QueryStats:
+    """单个请求内的 SQL 语句数与累计耗时（见 app/core/sqlstats.py）。"""
+    __slots__ = ("count", "seconds")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+
+current_query_stats: ContextVar[Optional[QueryStats]] = ContextVar("cs28_query_stats", default=None)
+
+
+class MetricsMiddleware:
+    """纯 ASGI 中间件（比 BaseHTTPMiddleware 少一层任务/队列开销）。"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_holder = [500]
+        qs = QueryStats()
+        current_query_stats.set(qs)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_holder[0] = message["status"]
+                if settings.SQL_DEBUG_HEADERS:
+                    # 流式响应此时只计到响应头发出之前的语句
+                    headers = list(message.get("headers", []))
+                    headers.append((b"x-sql-count", str(qs.count).encode()))
+                    headers.append((b"x-sql-time-ms", f"{qs.seconds * 1000:.1f}".encode()))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            route = scope.get("route")
+            # 用路由模板做标签，避免路径参数导致标签爆炸
+            path = getattr(route, "path", None) or "<unmatched>"
+            method = scope.get("method", "")
+            HTTP_LATENCY.observe(elapsed, method, path)
+            HTTP_REQUESTS.inc(method, path, status_holder[0])
+            SQL_PER_REQUEST.observe(qs.count, method, path)
+            SQL_TIME_PER_REQUEST.observe(qs.seconds, method, path)
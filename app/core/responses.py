@@ -0,0 +1,31 @@
+# app/core/responses.py
+"""
+orjson 响应类（全局默认 default_response_class）：
+  - datetime / date 原生编码（ISO 8601，与 jsonable_encoder 输出一致）
+  - Decimal 按 FastAPI 原来的规则编码：整数值 → int，其余 → float
+热点列表接口直接 return FastJSONResponse(dict)，跳过 response_model 的逐项校验与 jsonable_encoder。
+"""
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+
+
+def _default(obj: Any):
+    if isinstance(obj, Decimal):
+        return int(obj) if obj.as_tuple().exponent >= 0 else float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class FastJSONResponse(JSONResponse):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
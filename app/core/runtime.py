@@ -0,0 +1,97 @@
+# app/core/runtime.py
+"""
+运行时可调参数（sys_kv_config 表，交易中改值无需重启）：
+  - 读取：runtime.SETTLE_BATCH_LIMIT 这样的普通属性，和 settings.X 一样便宜（进程内快照，不查库 / Redis）
+  - 默认值：表里没有（或 is_active=0）的键用 TUNABLES 里的默认值（部分来自 settings）
+  - 更新：runtime_config_service 全量读表后调用 apply()，只替换变化的键并触发 on_change 回调
+    （如调度器按新间隔 reschedule）；值非法时记日志、保留当前值
+只有 TUNABLES 里声明的键会生效，表里其他键忽略。
+"""
+import logging
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Mapping, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Tunable:
+    name: str
+    type: type            # int / float
+    default: float
+    min: float
+    max: float
+    doc: str
+
+    def parse(self, raw: str):
+        """字符串 → 值；类型不对或越界时抛 ValueError。"""
+        v = self.type(str(raw).strip())
+        if not (self.min <= v <= self.max):
+            raise ValueError(f"{self.name} 应在 [{self.min}, {self.max}] 之间")
+        return v
+
+
+TUNABLES: Dict[str, Tunable] = {t.name: t for t in (
+    Tunable("SETTLE_BATCH_LIMIT", int, 200, 1, 10_000, "结算每轮最多处理的订单数"),
+    Tunable("SETTLE_INTERVAL_SECONDS", float, 2.0, 0.2, 60, "结算任务间隔（秒）"),
+    Tunable("COLLECTOR_POLL_SECONDS", float, float(settings.COLLECTOR_POLL_SECONDS), 1, 300, "开奖采集间隔（秒）"),
+    Tunable("ORDER_MAX_ITEMS", int, 10, 1, 200, "单笔订单最多投注项数"),
+    Tunable("REDIS_HISTORY_LEN", int, 200, 10, 5_000, "Redis 开奖历史保留期数"),
+)}
+
+_callbacks: Dict[str, List[Callable]] = {}
+
+
+class _Runtime:
+    """当前快照；属性名即 TUNABLES 的键。"""
+
+    def __init__(self):
+        for t in TUNABLES.values():
+            setattr(self, t.name, t.default)
+
+    def snapshot(self) -> Dict[str, float]:
+        return {name: getattr(self, name) for name in TUNABLES}
+
+
+runtime = _Runtime()
+
+
+def on_change(name: str, fn: Callable) -> None:
+    """注册回调 fn(new_value)，该键的值变化时（在 apply 里）同步调用。"""
+    if name not in TUNABLES:
+        raise KeyError(name)
+    _callbacks.setdefault(name, []).append(fn)
+
+
+def apply(values: Mapping[str, str]) -> Dict[str, Tuple[float, float]]:
+    """
+    用表里的有效值（{k: v}）刷新快照：缺的键回到默认值，非法值保留当前值。
+    返回 {键: (旧值, 新值)}，只含真正变化的键。
+    """
+    changed: Dict[str, Tuple[float, float]] = {}
+    for name, t in TUNABLES.items():
+        raw: Optional[str] = values.get(name)
+        if raw is None:
+            new = t.default
+        else:
+            try:
+                new = t.parse(raw)
+            except ValueError as e:
+                logger.warning("[runtime] ignore %s=%r: %s", name, raw, e)
+                continue
+        old = getattr(runtime, name)
+        if new == old:
+            continue
+        setattr(runtime, name, new)
+        changed[name] = (old, new)
+
+    for name, (old, new) in changed.items():
+        logger.warning("[runtime] %s: %s -> %s", name, old, new)
+        for fn in _callbacks.get(name, ()):
+            try:
+                fn(new)
+            except Exception:
+                logger.exception("[runtime] on_change %s failed", name)
+    return changed
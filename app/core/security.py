@@ -1,13 +1,22 @@
 
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from typing import Optional
+from fastapi import HTTPException
 from passlib.context import CryptContext
 import jwt
 
 from app.core.config import settings
+from app.core.metrics import PWHASH_IN_FLIGHT, PWHASH_WAIT, PWHASH_DURATION, PWHASH_REJECTED
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt 每次 100~300ms CPU；放到专用线程池（bcrypt 计算时释放 GIL），不阻塞事件循环
+_hash_executor = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="pwhash")
+_hash_pending = 0
+
 def hash_password(raw: str) -> str:
     # 盐可以在 .env 里配置，默认 change_me
     salted = f"{raw}:{settings.PASSWORD_SALT}"
@@ -17,6 +26,47 @@ def verify_password(raw: str, hashed: str) -> bool:
     salted = f"{raw}:{settings.PASSWORD_SALT}"
     return pwd_context.verify(salted, hashed)
 
+async def _run_hashing(op: str, fn, *args):
+    """
+    在哈希线程池里执行 fn；排队+执行中的数量超过上限时直接 503，
+    登录洪峰只会让登录变慢 / 被拒，不会拖住同进程的下单等接口。
+    """
+    global _hash_pending
+    if _hash_pending >= settings.PASSWORD_HASH_MAX_PENDING:
+        PWHASH_REJECTED.inc(op)
+        raise HTTPException(status_code=503, detail="登录繁忙，请稍后重试", headers={"Retry-After": "1"})
+
+    submitted = time.perf_counter()
+
+    def _timed():
+        started = time.perf_counter()
+        PWHASH_WAIT.observe(started - submitted, op)
+        try:
+            return fn(*args)
+        finally:
+            PWHASH_DURATION.observe(time.perf_counter() - started, op)
+
+    _hash_pending += 1
+    PWHASH_IN_FLIGHT.set(_hash_pending)
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_hash_executor, _timed)
+    finally:
+        _hash_pending -= 1
+        PWHASH_IN_FLIGHT.set(_hash_pending)
+
+
+async def hash_password_async(raw: str) -> str:
+    return await _run_hashing("hash", hash_password, raw)
+
+
+async def verify_password_async(raw: str, hashed: str) -> bool:
+    return await _run_hashing("verify", verify_password, raw, hashed)
+
+
+def shutdown_hash_executor() -> None:
+    _hash_executor.shutdown(wait=False, cancel_futures=True)
+
+
 def create_access_token(subject: str | int, expires_minutes: Optional[int] = None) -> str:
     expire = datetime.now(timezone.utc) + timedelta(minutes=expires_minutes or settings.JWT_EXPIRE_MINUTES)
     payload = {
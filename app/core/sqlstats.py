@@ -0,0 +1,42 @@
+# app/core/sqlstats.py
+"""
+SQL 语句计数 / 耗时（SQLAlchemy before/after_cursor_execute 事件）：
+  - 累加到当前请求的 QueryStats（由 MetricsMiddleware 放进 ContextVar；
+    SQLAlchemy 的 greenlet 会继承调用方上下文，所以在事件回调里也能取到）
+  - 全局指标：按引擎统计语句数与单条耗时
+  - 超过 SLOW_QUERY_MS 的语句连同参数打 WARNING 日志
+"""
+import logging
+import time
+
+from sqlalchemy import event
+
+from app.core.config import settings
+from app.core.metrics import SQL_STATEMENTS, SQL_DURATION, current_query_stats
+
+logger = logging.getLogger(__name__)
+
+
+def instrument_engine(async_engine, label: str) -> None:
+    sync_engine = async_engine.sync_engine
+    slow_seconds = settings.SLOW_QUERY_MS / 1000.0
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._cs28_t0 = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - getattr(context, "_cs28_t0", time.perf_counter())
+        SQL_STATEMENTS.inc(label)
+        SQL_DURATION.observe(elapsed, label)
+        st = current_query_stats.get()
+        if st is not None:
+            st.count += 1
+            st.seconds += elapsed
+        if slow_seconds > 0 and elapsed >= slow_seconds:
+            logger.warning(
+                "[slow-sql] %.1fms (%s) %s | params=%.500r",
+                elapsed * 1000, label, " ".join(statement.split()), parameters,
+            )
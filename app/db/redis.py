@@ -1,4 +1,31 @@
+import time
 import redis.asyncio as redis
+from redis.asyncio.client import Pipeline
 from app.core.config import settings
+from app.core.metrics import REDIS_LATENCY
 
-r = redis.from_url(settings.REDIS_URL, decode_responses=True)
+
+class TimedPipeline(Pipeline):
+    async def execute(self, raise_on_error: bool = True):
+        t0 = time.perf_counter()
+        try:
+            return await super().execute(raise_on_error)
+        finally:
+            REDIS_LATENCY.observe(time.perf_counter() - t0, "PIPELINE")
+
+
+class TimedRedis(redis.Redis):
+    """记录每条命令的往返耗时（按命令名打标签）。"""
+
+    async def execute_command(self, *args, **options):
+        t0 = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            REDIS_LATENCY.observe(time.perf_counter() - t0, str(args[0]).upper() if args else "")
+
+    def pipeline(self, transaction: bool = True, shard_hint=None) -> TimedPipeline:
+        return TimedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+r = TimedRedis.from_url(settings.REDIS_URL, decode_responses=True)
@@ -1,11 +1,59 @@
+import time
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from app.core.config import settings
+from app.core.metrics import DB_POOL_WAIT, DB_POOL_CHECKED_OUT, register_collector
+from app.core.sqlstats import instrument_engine
 
-engine = create_async_engine(settings.MYSQL_DSN, pool_pre_ping=True, pool_recycle=3600)
+def _timed_pool(label: str):
+    """连接池子类：记录取连接的等待时间（含池满时排队、溢出时新建连接）。"""
+    class TimedQueuePool(AsyncAdaptedQueuePool):
+        def _do_get(self):
+            t0 = time.perf_counter()
+            try:
+                return super()._do_get()
+            finally:
+                DB_POOL_WAIT.observe(time.perf_counter() - t0, label)
+    return TimedQueuePool
+
+def _make_engine(dsn: str, pool_size: int, max_overflow: int, label: str):
+    return create_async_engine(
+        dsn,
+        poolclass=_timed_pool(label),
+        pool_pre_ping=True,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+    )
+
+# 主库：下单/撤单/派彩等写操作
+engine = _make_engine(settings.MYSQL_DSN, settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW, "primary")
+instrument_engine(engine, "primary")
 AsyncSessionLocal = async_sessionmaker(engine, expire_on_commit=False)
+
+# 只读库：赔率/历史/结算候选扫描等；未配置副本时与主库共用同一个 engine
+if settings.MYSQL_READ_DSN:
+    read_engine = _make_engine(settings.MYSQL_READ_DSN, settings.DB_READ_POOL_SIZE, settings.DB_READ_MAX_OVERFLOW, "read")
+    instrument_engine(read_engine, "read")
+else:
+    read_engine = engine
+AsyncReadSessionLocal = async_sessionmaker(read_engine, expire_on_commit=False)
+
+@register_collector(per_process=True)
+async def _collect_pool_usage():
+    DB_POOL_CHECKED_OUT.set(engine.sync_engine.pool.checkedout(), "primary")
+    if read_engine is not engine:
+        DB_POOL_CHECKED_OUT.set(read_engine.sync_engine.pool.checkedout(), "read")
+
 Base = declarative_base()
 
 async def get_session() -> AsyncSession:
     async with AsyncSessionLocal() as session:
         yield session
+
+async def get_read_session() -> AsyncSession:
+    """只读查询专用；副本可能有秒级延迟，不要用于“读后写”的场景。"""
+    async with AsyncReadSessionLocal() as session:
+        yield session
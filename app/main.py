@@ -1,28 +1,44 @@
 # app/main.py
+import asyncio
+import time
+from contextlib import contextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, JSONResponse
 
 from app.core.config import settings
+from app.core.metrics import MetricsMiddleware, metrics_flusher, render_metrics, STARTUP_PHASE
+from app.core.runtime import runtime
+from app.core.security import shutdown_hash_executor
+from app.core.responses import FastJSONResponse
 from app.db.session import AsyncSessionLocal
+from app.db.redis import r
+from app.constants import k_result_version
 
 from app.routers.lottery import router as lottery_router
 from app.routers.user import router as user_router
 from app.routers.orders import router as orders_router
+from app.routers.admin import router as admin_router
 import logging, sys
 
-# 启动相关
-from app.tasks.scheduler import start_scheduler
+# 启动相关（调度器模块在预热完成后才 import，见 _warmup）
 from app.services.bootstrap_service import (
     init_db,
+    prewarm_pool,
     ensure_default_lottery,
     warmup_redis_from_db,
 )
+from app.services.stats_service import warmup_stats_from_db
+from app.services.issue_store import warmup_issue_store_from_db
+from app.services.runtime_config_service import load_runtime_config, runtime_config_listener
 
 app = FastAPI(
     title=settings.APP_NAME,
     version=getattr(settings, "APP_VERSION", "0.1.0"),
     docs_url="/docs",
     redoc_url="/redoc",
+    default_response_class=FastJSONResponse,
 )
 
 # CORS
@@ -33,6 +49,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# 路由耗时/状态码统计（最外层，包含 CORS 处理时间）
+app.add_middleware(MetricsMiddleware)
 logging.basicConfig(
     level=logging.WARNING,  # 根日志级别
     format="%(asctime)s %(levelname)s [%(name)s] %(message)s",
@@ -48,29 +66,144 @@ logging.getLogger("apscheduler").setLevel(logging.ERROR)        # 只保留错
 
 # 保留你自己的结算成功日志
 logging.getLogger("app.tasks.settlement").setLevel(logging.INFO)
+# 启动各阶段耗时
+logging.getLogger("app.startup").setLevel(logging.INFO)
+startup_logger = logging.getLogger("app.startup")
 
 # ✅ 注册路由（这里不再额外加 prefix，避免出现 /api/api/...）
 app.include_router(lottery_router)
 app.include_router(user_router)
 app.include_router(orders_router)
+app.include_router(admin_router)
 
 # 启动初始化
-@app.on_event("startup")
-async def on_startup() -> None:
-    await init_db()
+# 关键路径只做：按需建表（DB_CREATE_ALL）、预建连接池、Redis 连通；完成即可接流量（/readyz 200）。
+# Redis / 统计 / 列式存储预热和调度器启动放到后台任务（STARTUP_BLOCKING_WARMUP=1 时同步做），
+# 预热完成前调度器不启动，避免增量更新被随后的全量回放覆盖。
+_startup = {"ready": False, "warm": False, "phases": {}}
+_warmup_task: asyncio.Task | None = None
+_config_task: asyncio.Task | None = None
+_metrics_task: asyncio.Task | None = None
+WARMUP_RETRY_SECONDS = 5
+
+
+@contextmanager
+def _phase(name: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        dt = time.perf_counter() - t0
+        _startup["phases"][name] = round(dt * 1000, 1)
+        STARTUP_PHASE.set(dt, name)
+
+
+def _fmt_phases(names) -> str:
+    return " ".join(f"{n}={_startup['phases'][n]}ms" for n in names if n in _startup["phases"])
+
+
+async def _warmup() -> None:
+    t0 = time.perf_counter()
     async with AsyncSessionLocal() as session:
-        lot = await ensure_default_lottery(session)
-        # 预热最近 200 条到 Redis
-        await warmup_redis_from_db(session, lot.code, limit=200)
+        with _phase("lottery"):
+            lot = await ensure_default_lottery(session)
+        # 先记下结果更正版本：预热期间若有更正，调度器第一次同步视图时会重建
+        views_version = await r.get(k_result_version(lot.code))
+        # 预热最近 REDIS_HISTORY_LEN 条到 Redis
+        with _phase("redis_history"):
+            await warmup_redis_from_db(session, lot.code, limit=runtime.REDIS_HISTORY_LEN)
+        # 走势统计：回放最近 max(窗口) 期
+        with _phase("trend_stats"):
+            await warmup_stats_from_db(session, lot.code)
+        # 列式期次存储：加载最近 ISSUE_STORE_CAPACITY 期
+        with _phase("issue_store"):
+            await warmup_issue_store_from_db(session, lot.code)
     # 启动调度器（定时采集/结算等任务）
-    start_scheduler()
+    with _phase("scheduler"):
+        from app.tasks.scheduler import set_views_version, start_scheduler
+        set_views_version(lot.code, views_version)
+        start_scheduler()
+    _startup["warm"] = True
+    startup_logger.info(
+        "warmup done in %.1fms: %s", (time.perf_counter() - t0) * 1000,
+        _fmt_phases(("lottery", "redis_history", "trend_stats", "issue_store", "scheduler")),
+    )
+
+
+async def _warmup_until_done() -> None:
+    """后台预热；数据库 / Redis 暂时不可用时隔几秒重试，不让 worker 退出。"""
+    while True:
+        try:
+            await _warmup()
+            return
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            startup_logger.exception("warmup failed, retrying in %ss: %s", WARMUP_RETRY_SECONDS, e)
+            await asyncio.sleep(WARMUP_RETRY_SECONDS)
+
+
+@app.on_event("startup")
+async def on_startup() -> None:
+    global _warmup_task, _config_task, _metrics_task
+    t0 = time.perf_counter()
+    if settings.DB_CREATE_ALL:
+        with _phase("create_all"):
+            await init_db()
+    with _phase("db_pool"):
+        await prewarm_pool(settings.DB_POOL_PREWARM)
+    with _phase("redis"):
+        await r.ping()
+    # 运行时参数：先加载一次（读不到就用默认值，监听任务订阅成功后会再加载），再订阅失效消息
+    with _phase("runtime_config"):
+        try:
+            await load_runtime_config()
+        except Exception as e:
+            startup_logger.warning("runtime config load failed, using defaults: %s", e)
+    _config_task = asyncio.get_running_loop().create_task(runtime_config_listener())
+    if settings.METRICS_DIR:
+        _metrics_task = asyncio.get_running_loop().create_task(metrics_flusher())
+    if settings.STARTUP_BLOCKING_WARMUP:
+        await _warmup()
+    else:
+        _warmup_task = asyncio.get_running_loop().create_task(_warmup_until_done())
+    _startup["ready"] = True
+    startup_logger.info(
+        "ready in %.1fms: %s%s", (time.perf_counter() - t0) * 1000,
+        _fmt_phases(("create_all", "db_pool", "redis", "runtime_config")),
+        "" if settings.STARTUP_BLOCKING_WARMUP else " (warmup in background)",
+    )
+
+@app.on_event("shutdown")
+async def on_shutdown() -> None:
+    for task in (_warmup_task, _config_task):
+        if task is not None and not task.done():
+            task.cancel()
+    if _startup["warm"]:
+        from app.tasks.scheduler import stop_scheduler
+        await stop_scheduler()
+    shutdown_hash_executor()
+    if _metrics_task is not None:
+        # 取消时写最后一次快照：退出前的计数仍计入汇总
+        _metrics_task.cancel()
+        await asyncio.gather(_metrics_task, return_exceptions=True)
 
 # 健康检查
 @app.get("/ping")
 async def ping():
     return {"ok": True, "env": settings.APP_ENV}
 
+# Prometheus 抓取（配置了 METRICS_DIR 时为所有 worker 的汇总）
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(await render_metrics(), media_type="text/plain; version=0.0.4")
+
 # 也可以提供 kubernetes/监控用探针
 @app.get("/healthz")
 async def healthz():
     return {"status": "healthy"}
+
+# 就绪探针：关键路径完成即 200；warm 表示后台预热 / 调度器是否已就绪，phases 为各阶段耗时（ms）
+@app.get("/readyz")
+async def readyz():
+    return JSONResponse(_startup, status_code=200 if _startup["ready"] else 503)
@@ -1,14 +1,19 @@
 from datetime import datetime
 from sqlalchemy.orm import Mapped, mapped_column
-from sqlalchemy import String, DateTime, BigInteger, SmallInteger, func
+from sqlalchemy import String, DateTime, BigInteger, SmallInteger, Index, func
 from sqlalchemy.dialects.mysql import TINYINT
 from app.db.session import Base
 
 class Issue(Base):
     __tablename__ = "issue"
+    __table_args__ = (
+        Index("uk_issue", "lottery_code", "issue_code", unique=True),
+        Index("idx_issue_status", "lottery_code", "status", "open_time"),
+        Index("idx_issue_open_time", "lottery_code", "open_time"),  # 最近 N 期（预热 / 历史 / 导出）
+    )
 
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
-    lottery_code: Mapped[str] = mapped_column(String(32), nullable=False, index=True)
+    lottery_code: Mapped[str] = mapped_column(String(32), nullable=False)
     issue_code: Mapped[str] = mapped_column(String(32), nullable=False)
 
     open_time: Mapped[datetime] = mapped_column(DateTime, nullable=False)
@@ -0,0 +1,42 @@
+from datetime import datetime, date
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import String, Integer, Numeric, Date, DateTime, BigInteger, Index, func
+from app.db.session import Base
+
+# 每期盈亏汇总（见 app/services/issue_pnl_service.py）：由下单 / 撤单 / 结算的 outbox 事件增量维护
+class IssuePnl(Base):
+    __tablename__ = "issue_pnl"
+    __table_args__ = (
+        Index("uk_issue_pnl", "lottery_code", "issue_code", unique=True),
+        Index("idx_pnl_date", "lottery_code", "issue_date"),   # 按天汇总 / 按天列期次
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    lottery_code: Mapped[str] = mapped_column(String(32), nullable=False)
+    issue_code: Mapped[str] = mapped_column(String(32), nullable=False)
+    issue_date: Mapped[date] = mapped_column(Date, nullable=False)                       # 开奖日期（开奖前为下单日期）
+    order_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)         # 有效订单数（不含撤单）
+    bettor_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)        # 投注人数（不含撤单）
+    turnover: Mapped[float] = mapped_column(Numeric(18,2), nullable=False, default=0)    # 有效投注额
+    cancel_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    cancel_amount: Mapped[float] = mapped_column(Numeric(18,2), nullable=False, default=0)
+    settled_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)       # 已结算订单数
+    settled_stake: Mapped[float] = mapped_column(Numeric(18,2), nullable=False, default=0)  # 已结算订单的投注额
+    payout: Mapped[float] = mapped_column(Numeric(18,2), nullable=False, default=0)      # 派彩（含重新结算调整）
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime, server_default=func.now(), onupdate=func.now()
+    )
+
+
+# 每期投注人数的增量依据：(期次, 用户) 一行，记该用户在该期的有效订单数（0 ↔ 正数的变化即投注人数 ±1）
+class IssueBettor(Base):
+    __tablename__ = "issue_bettor"
+    __table_args__ = (
+        Index("uk_issue_bettor", "lottery_code", "issue_code", "user_id", unique=True),
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    lottery_code: Mapped[str] = mapped_column(String(32), nullable=False)
+    issue_code: Mapped[str] = mapped_column(String(32), nullable=False)
+    user_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    order_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)    # 有效订单数（不含撤单）
@@ -0,0 +1,22 @@
+from datetime import datetime
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import String, DateTime, BigInteger, SmallInteger, Index, func
+from app.db.session import Base
+
+class JobRunLog(Base):
+    __tablename__ = "job_run_log"
+    __table_args__ = (
+        Index("idx_job_time", "job_name", "started_at"),
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    job_name: Mapped[str] = mapped_column(String(64), nullable=False)
+    status: Mapped[int] = mapped_column(SmallInteger, nullable=False)  # 1成功 2失败
+    # JSON：{"ms": 耗时毫秒, "items": 处理条数, "error": 异常摘要}
+    detail: Mapped[str | None] = mapped_column(String(255))
+    started_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime)
+
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, server_default=func.now()
+    )
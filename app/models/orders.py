@@ -1,11 +1,22 @@
 
 from datetime import datetime
 from sqlalchemy.orm import Mapped, mapped_column
-from sqlalchemy import String, Integer, Numeric, DateTime, BigInteger, SmallInteger, func
+from sqlalchemy import String, Integer, Numeric, DateTime, BigInteger, SmallInteger, Index, func
 from app.db.session import Base
 
+CHANNEL_ROBOT = "robot"  # 机器人订单的渠道（由 is_robot 决定，不信任前端）；报表 / 导出按它剔除
+
+# 索引与 init.sql 保持一致（create_all 建出的表与线上相同）；热点查询的执行计划见 bench/plans.py
 class Orders(Base):
     __tablename__ = "orders"
+    __table_args__ = (
+        Index("idempotency_key", "idempotency_key", unique=True),
+        Index("idx_order_user_time", "user_id", "created_at"),
+        Index("idx_order_user_id", "user_id", "id"),                                # 订单历史：按 ID 倒序翻页
+        Index("idx_order_issue", "lottery_code", "issue_code"),
+        Index("idx_order_issue_status", "lottery_code", "issue_code", "status"),    # 整期预计算 / 写回
+        Index("idx_order_status", "status"),                                        # 未结算订单扫描
+    )
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
     lottery_code: Mapped[str] = mapped_column(String(32), nullable=False)
@@ -16,12 +27,17 @@ class Orders(Base):
     win_amount: Mapped[float] = mapped_column(Numeric(16,2), default=0)
     ip: Mapped[str | None] = mapped_column(String(64))
     channel: Mapped[str | None] = mapped_column(String(32))
-    idempotency_key: Mapped[str | None] = mapped_column(String(64), unique=True)
+    idempotency_key: Mapped[str | None] = mapped_column(String(64))
     created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
     updated_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now(), onupdate=func.now())
 
 class OrderItem(Base):
     __tablename__ = "order_item"
+    __table_args__ = (
+        Index("uk_order_play_sel", "order_id", "play_code", "selection", unique=True),
+        Index("idx_item_order", "order_id"),
+        Index("idx_item_settled", "settled_at"),                                    # 结算明细导出
+    )
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
     order_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
     play_code: Mapped[int] = mapped_column(Integer, nullable=False)
@@ -31,3 +47,44 @@ class OrderItem(Base):
     result_status: Mapped[int] = mapped_column(SmallInteger, default=0)  # 0未结算 1赢 2输 3和/取消
     win_amount: Mapped[float] = mapped_column(Numeric(16,2), default=0)
     settled_at: Mapped[datetime | None] = mapped_column(DateTime)
+
+# ------------------------------
+# 归档表（见 app/tasks/archive.py）：结构同上，保留原 ID，不自增
+# ------------------------------
+class OrdersArchive(Base):
+    __tablename__ = "orders_archive"
+    __table_args__ = (
+        Index("idx_order_arch_user", "user_id", "id"),
+        Index("idx_order_arch_created", "created_at"),                              # 订单导出（按下单日）
+        Index("uk_order_arch_idem", "idempotency_key", unique=True),               # 归档后重放幂等键仍能查到
+    )
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=False)
+    user_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    lottery_code: Mapped[str] = mapped_column(String(32), nullable=False)
+    issue_code: Mapped[str] = mapped_column(String(32), nullable=False)
+    total_amount: Mapped[float] = mapped_column(Numeric(16,2), nullable=False)
+    total_odds: Mapped[float | None] = mapped_column(Numeric(10,4))
+    status: Mapped[int] = mapped_column(SmallInteger, nullable=False)
+    win_amount: Mapped[float] = mapped_column(Numeric(16,2), default=0)
+    ip: Mapped[str | None] = mapped_column(String(64))
+    channel: Mapped[str | None] = mapped_column(String(32))
+    idempotency_key: Mapped[str | None] = mapped_column(String(64))
+    created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    archived_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+
+class OrderItemArchive(Base):
+    __tablename__ = "order_item_archive"
+    __table_args__ = (
+        Index("idx_item_arch_order", "order_id"),
+        Index("idx_item_arch_settled", "settled_at"),
+    )
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=False)
+    order_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    play_code: Mapped[int] = mapped_column(Integer, nullable=False)
+    selection: Mapped[str] = mapped_column(String(32), nullable=False)
+    odds: Mapped[float] = mapped_column(Numeric(10,4), nullable=False)
+    stake_amount: Mapped[float] = mapped_column(Numeric(16,2), nullable=False)
+    result_status: Mapped[int] = mapped_column(SmallInteger, default=0)
+    win_amount: Mapped[float] = mapped_column(Numeric(16,2), default=0)
+    settled_at: Mapped[datetime | None] = mapped_column(DateTime)
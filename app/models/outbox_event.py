@@ -0,0 +1,39 @@
+from datetime import datetime
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import String, Integer, Text, DateTime, BigInteger, SmallInteger, Index, PrimaryKeyConstraint, func
+from sqlalchemy.dialects.mysql import MEDIUMTEXT
+from app.db.session import Base
+
+class OutboxEvent(Base):
+    """事务内写入的待投递事件（见 app/services/outbox_service.py）。"""
+    __tablename__ = "outbox_event"
+    __table_args__ = (
+        Index("idx_outbox_due", "status", "next_attempt_at"),
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    topic: Mapped[str] = mapped_column(String(64), nullable=False)
+    payload: Mapped[str] = mapped_column(Text().with_variant(MEDIUMTEXT(), "mysql"), nullable=False)  # JSON
+    status: Mapped[int] = mapped_column(SmallInteger, default=0)  # 0待投递 1已投递 2放弃（超过重试次数）
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    # 已成功的订阅者（逗号分隔），重试时跳过
+    done_handlers: Mapped[str] = mapped_column(String(255), default="")
+    last_error: Mapped[str | None] = mapped_column(String(255))
+    next_attempt_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+    dispatched_at: Mapped[datetime | None] = mapped_column(DateTime)
+
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, server_default=func.now()
+    )
+
+
+class OutboxApplied(Base):
+    """增量型订阅者已处理过的事件（与增量写同一事务登记，重复投递时跳过）；随已投递事件一起清理。"""
+    __tablename__ = "outbox_applied"
+    __table_args__ = (
+        PrimaryKeyConstraint("event_id", "handler"),
+    )
+
+    event_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    handler: Mapped[str] = mapped_column(String(64), nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
@@ -1,13 +1,16 @@
 # app/models/play_type.py
 from sqlalchemy.orm import Mapped, mapped_column
-from sqlalchemy import String, Integer, Numeric
+from sqlalchemy import String, Integer, Numeric, Index
 from app.db.session import Base
 
 class PlayType(Base):
     __tablename__ = "play_type"
+    __table_args__ = (
+        Index("uk_play", "lottery_code", "code", unique=True),
+    )
     id: Mapped[int] = mapped_column(primary_key=True)
-    lottery_code: Mapped[str] = mapped_column(String(32), index=True)
+    lottery_code: Mapped[str] = mapped_column(String(32))
     code: Mapped[int] = mapped_column(Integer)            # 玩法编码（管理端可用）
-    name: Mapped[str] = mapped_column(String(32), index=True)  # '大' | '小' | '0'..'27' ...
+    name: Mapped[str] = mapped_column(String(32))  # '大' | '小' | '0'..'27' ...
     odds: Mapped[float] = mapped_column(Numeric(10,4))
     status: Mapped[int] = mapped_column(Integer, default=1)     # 1=启用
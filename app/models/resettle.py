@@ -0,0 +1,45 @@
+from datetime import datetime
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import String, Integer, Numeric, DateTime, BigInteger, SmallInteger, Index, func
+from sqlalchemy.dialects.mysql import TINYINT
+from app.db.session import Base
+
+# 开奖结果更正后的重新结算（见 app/tasks/resettle.py）：一次更正一个批次，逐子单记录改判前后
+class ResettleBatch(Base):
+    __tablename__ = "resettle_batch"
+    __table_args__ = (
+        Index("idx_resettle_issue", "lottery_code", "issue_code"),
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    lottery_code: Mapped[str] = mapped_column(String(32), nullable=False)
+    issue_code: Mapped[str] = mapped_column(String(32), nullable=False)
+    old_nums: Mapped[str] = mapped_column(String(16), nullable=False)    # "n1,n2,n3"
+    old_sum: Mapped[int] = mapped_column(TINYINT(unsigned=True), nullable=False)
+    new_nums: Mapped[str] = mapped_column(String(16), nullable=False)
+    new_sum: Mapped[int] = mapped_column(TINYINT(unsigned=True), nullable=False)
+    status: Mapped[int] = mapped_column(SmallInteger, nullable=False, default=0)  # 0待处理 1完成 2失败 3已被后续更正取代
+    order_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)  # 改判的订单数
+    item_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)   # 改判的子单数
+    user_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)   # 调整余额的用户数（各块累加）
+    delta_amount: Mapped[float] = mapped_column(Numeric(16,2), nullable=False, default=0)  # 派彩净变化（正=补发）
+    message: Mapped[str | None] = mapped_column(String(255))
+    created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime)
+
+class ResettleItemLog(Base):
+    __tablename__ = "resettle_item_log"
+    __table_args__ = (
+        Index("idx_resettle_item_batch", "batch_id", "order_id"),
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    batch_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    order_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    item_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    user_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    old_result: Mapped[int] = mapped_column(SmallInteger, nullable=False)
+    new_result: Mapped[int] = mapped_column(SmallInteger, nullable=False)
+    old_win: Mapped[float] = mapped_column(Numeric(16,2), nullable=False)
+    new_win: Mapped[float] = mapped_column(Numeric(16,2), nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
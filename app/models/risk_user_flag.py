@@ -0,0 +1,19 @@
+from datetime import datetime
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import String, DateTime, BigInteger, UniqueConstraint, func
+from app.db.session import Base
+
+class RiskUserFlag(Base):
+    __tablename__ = "risk_user_flag"
+    __table_args__ = (
+        UniqueConstraint("user_id", "flag_code", name="uk_risk"),
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    user_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    flag_code: Mapped[str] = mapped_column(String(32), nullable=False)  # 如 BLOCK_BET / BET_TOO_FAST
+    note: Mapped[str | None] = mapped_column(String(255))
+
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, server_default=func.now()
+    )
@@ -0,0 +1,20 @@
+from datetime import datetime
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import String, DateTime, BigInteger, SmallInteger, Index, func
+from app.db.session import Base
+
+class SettleLog(Base):
+    __tablename__ = "settle_log"
+    __table_args__ = (
+        Index("idx_settle_issue", "lottery_code", "issue_code"),
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    lottery_code: Mapped[str] = mapped_column(String(32), nullable=False)
+    issue_code: Mapped[str] = mapped_column(String(32), nullable=False)
+    status: Mapped[int] = mapped_column(SmallInteger, nullable=False)  # 1开始 2完成 3失败
+    message: Mapped[str | None] = mapped_column(String(255))
+
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, server_default=func.now()
+    )
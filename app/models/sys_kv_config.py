@@ -0,0 +1,20 @@
+from datetime import datetime
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import String, DateTime, BigInteger, SmallInteger, func
+from app.db.session import Base
+
+class SysKvConfig(Base):
+    __tablename__ = "sys_kv_config"
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    k: Mapped[str] = mapped_column(String(64), nullable=False, unique=True)
+    v: Mapped[str] = mapped_column(String(512), nullable=False)
+    remark: Mapped[str | None] = mapped_column(String(255))
+    is_active: Mapped[int] = mapped_column(SmallInteger, nullable=False, server_default="1")
+
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, server_default=func.now()
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime, server_default=func.now(), onupdate=func.now()
+    )
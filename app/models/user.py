@@ -1,10 +1,13 @@
 from datetime import datetime
 from sqlalchemy.orm import Mapped, mapped_column
-from sqlalchemy import String, Integer, Numeric, DateTime, BigInteger, Boolean, func
+from sqlalchemy import String, Integer, Numeric, DateTime, BigInteger, Boolean, Index, func
 from app.db.session import Base
 
 class User(Base):
     __tablename__ = "user"
+    __table_args__ = (
+        Index("idx_user_username", "username"),
+    )
 
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
     username: Mapped[str] = mapped_column(String(64), unique=True, nullable=False)
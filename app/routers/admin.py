@@ -0,0 +1,282 @@
+import asyncio
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+import orjson
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.auth import require_admin
+from app.db.session import get_session, get_read_session
+from app.schemas.admin import OddsProposalIn, RuntimeConfigIn
+from app.services.job_log_service import recent_job_runs, job_run_summary
+from app.services.outbox_service import outbox_summary
+from app.services.runtime_config_service import list_runtime_config, set_runtime_config
+from app.services.resettle_service import recent_batches, get_batch, batch_items
+from app.services.issue_pnl_service import issue_pnl_rows, day_pnl_rollup
+from app.tasks.resettle import run_resettle
+from app.tasks.robots import recent_reports
+from app.services.odds_analysis_service import (
+    MAX_SAMPLES, play_report, pnl_vector, exact_distribution, monte_carlo,
+    load_odds, load_issue_bets, load_issue_mix,
+)
+from app.services.export_service import (
+    FORMATS, MEDIA_TYPES,
+    ISSUE_COLUMNS, ORDER_COLUMNS, SETTLEMENT_COLUMNS,
+    day_range, issues_stmt, orders_stmt, settlements_stmt, stream_rows,
+)
+
+router = APIRouter(prefix="/api/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+
+def _parse_day(v: Optional[str], name: str) -> Optional[datetime]:
+    if v is None:
+        return None
+    try:
+        return datetime.strptime(v, "%Y-%m-%d")
+    except ValueError:
+        raise HTTPException(400, f"{name} 格式应为 YYYY-MM-DD")
+
+
+def _check_fmt(fmt: str) -> str:
+    if fmt not in FORMATS:
+        raise HTTPException(400, f"fmt 仅支持 {'/'.join(FORMATS)}")
+    return fmt
+
+
+def _export(gen, fmt: str, filename: str) -> StreamingResponse:
+    return StreamingResponse(
+        gen,
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'},
+    )
+
+
+@router.get("/export/issues")
+async def export_issues(
+        code: str = Query(..., description="彩种代码"),
+        start: Optional[str] = Query(None, description="开始日期 YYYY-MM-DD（含）"),
+        end: Optional[str] = Query(None, description="结束日期 YYYY-MM-DD（含）"),
+        fmt: str = Query("ndjson", description="ndjson | csv"),
+):
+    fmt = _check_fmt(fmt)
+    s = _parse_day(start, "start")
+    e = _parse_day(end, "end")
+    stmt = issues_stmt(code, s, day_range(e)[1] if e else None)
+    return _export(stream_rows(stmt, ISSUE_COLUMNS, fmt), fmt, f"issue_{code}")
+
+
+@router.get("/export/orders")
+async def export_orders(
+        date: str = Query(..., description="下单日期 YYYY-MM-DD"),
+        code: Optional[str] = Query(None, description="彩种代码（可选）"),
+        fmt: str = Query("ndjson", description="ndjson | csv"),
+        include_robots: bool = Query(False, description="是否包含机器人（压测）订单"),
+):
+    fmt = _check_fmt(fmt)
+    start, end = day_range(_parse_day(date, "date"))
+    stmts = orders_stmt(start, end, code, include_robots)
+    return _export(stream_rows(stmts, ORDER_COLUMNS, fmt), fmt, f"orders_{date}")
+
+
+@router.get("/export/settlements")
+async def export_settlements(
+        date: str = Query(..., description="结算日期 YYYY-MM-DD"),
+        code: Optional[str] = Query(None, description="彩种代码（可选）"),
+        fmt: str = Query("ndjson", description="ndjson | csv"),
+        include_robots: bool = Query(False, description="是否包含机器人（压测）订单"),
+):
+    fmt = _check_fmt(fmt)
+    start, end = day_range(_parse_day(date, "date"))
+    stmts = settlements_stmt(start, end, code, include_robots)
+    return _export(stream_rows(stmts, SETTLEMENT_COLUMNS, fmt), fmt, f"settlements_{date}")
+
+
+@router.get("/jobs/runs")
+async def job_runs(
+        job: Optional[str] = Query(None, description="任务名（collector_jnd28 / tick_current_issue / settle_orders_job）"),
+        limit: int = Query(50, ge=1, le=500),
+        session: AsyncSession = Depends(get_read_session),
+):
+    return {"items": await recent_job_runs(session, job, limit)}
+
+
+@router.get("/jobs/summary")
+async def job_summary(
+        minutes: int = Query(60, ge=1, le=7 * 24 * 60, description="统计最近多少分钟"),
+        session: AsyncSession = Depends(get_read_session),
+):
+    return {"minutes": minutes, "jobs": await job_run_summary(session, minutes)}
+
+
+@router.get("/outbox")
+async def outbox_status(
+        limit: int = Query(20, ge=1, le=200, description="最多返回多少条失败事件"),
+        session: AsyncSession = Depends(get_read_session),
+):
+    return await outbox_summary(session, limit)
+
+
+@router.get("/config")
+async def get_runtime_config(session: AsyncSession = Depends(get_session)):
+    """运行时参数：当前进程生效值、默认值、取值范围和表里的原始行。"""
+    return {"items": await list_runtime_config(session)}
+
+
+@router.put("/config/{key}")
+async def put_runtime_config(
+        key: str,
+        body: RuntimeConfigIn,
+        session: AsyncSession = Depends(get_session),
+):
+    """修改运行时参数：写 sys_kv_config 后广播，所有 worker 立即生效（is_active=false 恢复默认值）。"""
+    try:
+        await set_runtime_config(session, key, body.value, body.is_active, body.remark)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return {"items": [i for i in await list_runtime_config(session) if i["key"] == key]}
+
+
+@router.get("/resettle")
+async def resettle_batches(
+        code: Optional[str] = Query(None, description="彩种代码"),
+        issue: Optional[str] = Query(None, description="期号"),
+        limit: int = Query(20, ge=1, le=200),
+        session: AsyncSession = Depends(get_read_session),
+):
+    """开奖结果更正批次（新→旧）：更正前后号码、状态（0待处理 1完成 2失败 3已取代）、改判单数、派彩净变化。"""
+    return {"items": await recent_batches(session, code, issue, limit)}
+
+
+@router.get("/resettle/{batch_id}/items")
+async def resettle_items(
+        batch_id: int,
+        after_id: int = Query(0, ge=0, description="上一页最后一条的 id"),
+        limit: int = Query(200, ge=1, le=1000),
+        session: AsyncSession = Depends(get_read_session),
+):
+    """批次的逐子单改判明细（改判前后结果 / 派彩）。"""
+    return {"items": await batch_items(session, batch_id, after_id, limit)}
+
+
+@router.post("/resettle/{batch_id}/run")
+async def resettle_run(batch_id: int, session: AsyncSession = Depends(get_session)):
+    """手动重跑一个批次（outbox 重试用尽后被放弃的批次）；幂等，已完成的批次不会重复调整余额。"""
+    if await get_batch(session, batch_id) is None:
+        raise HTTPException(404, "批次不存在")
+    summary = await run_resettle(batch_id)
+    return {"summary": summary, "batch": await get_batch(session, batch_id)}
+
+
+MAX_PNL_DAYS = 366
+
+
+def _pnl_range(start: Optional[str], end: Optional[str]):
+    e = (_parse_day(end, "end") or datetime.now()).date()
+    s = (_parse_day(start, "start") or datetime.combine(e, datetime.min.time())).date()
+    if s > e:
+        raise HTTPException(400, "start 不能晚于 end")
+    if (e - s).days >= MAX_PNL_DAYS:
+        raise HTTPException(400, f"日期范围不能超过 {MAX_PNL_DAYS} 天")
+    return s, e
+
+
+@router.get("/pnl/issues")
+async def pnl_issues(
+        code: str = Query(..., description="彩种代码"),
+        start: Optional[str] = Query(None, description="开始日期 YYYY-MM-DD（含，默认同 end）"),
+        end: Optional[str] = Query(None, description="结束日期 YYYY-MM-DD（含，默认今天）"),
+        before_issue: Optional[str] = Query(None, description="游标：上一页最后一条的 issue_code"),
+        limit: int = Query(500, ge=1, le=5000),
+        session: AsyncSession = Depends(get_read_session),
+):
+    """每期盈亏（新→旧）：投注额、订单数、投注人数、撤单、已结算投注额、派彩、庄家盈亏。读 issue_pnl 汇总表。"""
+    s, e = _pnl_range(start, end)
+    return {"code": code, "items": await issue_pnl_rows(session, code, s, e, before_issue, limit)}
+
+
+@router.get("/pnl/days")
+async def pnl_days(
+        code: str = Query(..., description="彩种代码"),
+        start: Optional[str] = Query(None, description="开始日期 YYYY-MM-DD（含，默认同 end）"),
+        end: Optional[str] = Query(None, description="结束日期 YYYY-MM-DD（含，默认今天）"),
+        session: AsyncSession = Depends(get_read_session),
+):
+    """按天汇总每期盈亏（新→旧）。"""
+    s, e = _pnl_range(start, end)
+    return {"code": code, "days": await day_pnl_rollup(session, code, s, e)}
+
+
+@router.get("/robots/reports")
+async def robot_reports(
+        code: str = Query(..., description="彩种代码"),
+        limit: int = Query(20, ge=1, le=200),
+):
+    """机器人下注的每期报告（新→旧）：成功 / 错误数、吞吐、峰值每秒、延迟分位。"""
+    return {"reports": [orjson.loads(x) for x in await recent_reports(code, limit)]}
+
+
+async def _simulate(pnl, horizon: int, runs: int, seed: Optional[int]) -> dict:
+    # 最多 MAX_SAMPLES 次抽样，放到线程里跑，不阻塞事件循环上的其他请求
+    if horizon * runs > MAX_SAMPLES:
+        raise HTTPException(400, f"horizon × runs 不能超过 {MAX_SAMPLES}")
+    return await asyncio.to_thread(monte_carlo, pnl, horizon, runs, seed)
+
+
+@router.get("/analysis/odds")
+async def analysis_odds(
+        code: str = Query(..., description="彩种代码"),
+        session: AsyncSession = Depends(get_read_session),
+):
+    """当前启用玩法的命中概率 / 期望返还 / 庄家优势。"""
+    return {"code": code, "plays": play_report(await load_odds(session, code))}
+
+
+@router.post("/analysis/odds")
+async def analysis_odds_proposal(
+        body: OddsProposalIn,
+        session: AsyncSession = Depends(get_read_session),
+):
+    """调整赔率前试算：新赔率下各玩法的庄家优势；给出 issue 时按该期投注结构算盈亏分布。"""
+    current = await load_odds(session, body.code)
+    proposed = {**current, **body.odds}
+    out = {"code": body.code, "changed": sorted(body.odds), "plays": play_report(proposed)}
+    if body.issue:
+        mix = await load_issue_mix(session, body.code, body.issue)
+        unknown = sorted(set(mix) - set(proposed))
+        if unknown:
+            raise HTTPException(400, f"该期存在无赔率的玩法：{','.join(unknown)}")
+        stake, pnl = pnl_vector((sel, amt, proposed[sel]) for sel, amt in mix.items())
+        out["issue"] = {
+            "issue": body.issue,
+            "stake": stake,
+            "pnl_by_sum": pnl,
+            "exact": exact_distribution(pnl),
+            "simulation": await _simulate(pnl, body.horizon, body.runs, body.seed),
+        }
+    return out
+
+
+@router.get("/analysis/issue")
+async def analysis_issue(
+        code: str = Query(..., description="彩种代码"),
+        issue: str = Query(..., description="期号"),
+        horizon: int = Query(1, ge=1, le=10_000, description="蒙特卡洛：同样的投注结构连续多少期"),
+        runs: int = Query(10_000, ge=1, le=100_000, description="蒙特卡洛：抽样次数"),
+        seed: Optional[int] = Query(None),
+        session: AsyncSession = Depends(get_read_session),
+):
+    """按该期实际子单（下单时锁定的赔率）计算庄家盈亏：28 个和值的精确分布 + 多期蒙特卡洛。"""
+    bets = await load_issue_bets(session, code, issue)
+    stake, pnl = pnl_vector(bets)
+    return {
+        "code": code,
+        "issue": issue,
+        "items": len(bets),
+        "stake": stake,
+        "pnl_by_sum": pnl,
+        "exact": exact_distribution(pnl),
+        "simulation": await _simulate(pnl, horizon, runs, seed),
+    }
@@ -1,19 +1,38 @@
-from fastapi import APIRouter, Depends, Query
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from typing import List, Optional
 from datetime import datetime
 import json
+import orjson
 from sqlalchemy import select
+from app.core.responses import FastJSONResponse
 from app.db.redis import r
-from app.db.session import AsyncSession, get_session
+from app.db.session import AsyncSession, get_read_session
 from app.constants import k_current_issue, k_last_result, k_history
 from app.models.issue import Issue
-from app.schemas.lottery import CurrentIssueResp, HistoryResp, HistoryItem
+from app.schemas.lottery import CurrentIssueResp, HistoryResp, HistoryItem, StatsResp, OddsItem
 from app.models.play_type import PlayType  # 你的 ORM 模型
+from app.services.stats_service import ensure_trend_stats, STATS_WINDOWS
+from app.services.issue_store import get_issue_store, query_issues_db
+
+HISTORY_RANGE_MAX = 1000  # 范围查询单页上限
+HISTORY_FIELDS = tuple(HistoryItem.model_fields)
+
+
+def _history_items(raw) -> list:
+    """Redis 历史 JSON → 响应 dict（只保留 HistoryItem 字段，坏数据跳过），不构造 pydantic 对象。"""
+    items = []
+    for s in raw:
+        try:
+            d = orjson.loads(s)
+            items.append({k: d[k] for k in HISTORY_FIELDS})
+        except (orjson.JSONDecodeError, KeyError, TypeError):
+            continue
+    return items
 
 router = APIRouter(prefix="/api/lottery", tags=["lottery"])
 
 @router.get("/current", response_model=CurrentIssueResp)
-async def current_issue(code: str = Query(...), db: AsyncSession = Depends(get_session)):
+async def current_issue(code: str = Query(...), db: AsyncSession = Depends(get_read_session)):
     ci = await r.hgetall(k_current_issue(code))
     if ci:
         return {
@@ -54,21 +73,81 @@ async def last_result(code: str):
     return {}
 
 @router.get("/history", response_model=HistoryResp)
-async def history(code: str, limit: int = 30):
+async def history(
+        code: str,
+        limit: int = 30,
+        before: Optional[str] = Query(None, description="早于该期号（向旧翻页）"),
+        after: Optional[str] = Query(None, description="晚于该期号（向新翻页）"),
+        date: Optional[str] = Query(None, description="开奖日期 YYYY-MM-DD"),
+        since_issue: Optional[str] = Query(None, description="增量同步：只返回晚于该期号的记录"),
+        session: AsyncSession = Depends(get_read_session),
+):
+    if since_issue is not None:
+        return await _history_since(code, since_issue, limit)
+
+    if before is not None or after is not None or date is not None:
+        # 范围查询走进程内列式存储（二分），不查 MySQL；新 worker 存储还没加载完时直接查只读库
+        if (before is not None and not before.isdigit()) or (after is not None and not after.isdigit()):
+            raise HTTPException(400, "期号必须为数字")
+        day = None
+        if date is not None:
+            try:
+                day = datetime.strptime(date, "%Y-%m-%d")
+            except ValueError:
+                raise HTTPException(400, "日期格式应为 YYYY-MM-DD")
+        store = get_issue_store(code)
+        if store.loaded:
+            items = store.query(min(limit, HISTORY_RANGE_MAX), before=before, after=after, day=day)
+        else:
+            items = await query_issues_db(session, code, min(limit, HISTORY_RANGE_MAX), before=before, after=after, day=day)
+        return FastJSONResponse({"code": code, "head": None, "truncated": False, "list": items})
+
     raw = await r.lrange(k_history(code), 0, limit - 1)
-    items = []
-    for s in raw:
-        try:
-            items.append(HistoryItem(**json.loads(s)))
-        except Exception:
-            continue
+    items = _history_items(raw)
     # 不要反转：因为我们保证了 Redis 列表就是新→旧
-    return {"code": code, "list": items}
+    return FastJSONResponse({
+        "code": code, "head": items[0]["issue_code"] if items else None, "truncated": False, "list": items,
+    })
+
+async def _history_since(code: str, since_issue: str, limit: int):
+    """
+    增量同步：无新期次时返回 304（空响应体）；否则只返回新增的期次 + 当前最新期号。
+    优先走列式存储，期号非数字或存储未加载时回退到 Redis 历史列表。
+    """
+    since_issue = since_issue.strip()
+    store = get_issue_store(code)
+    if store.loaded and len(store) and since_issue.isdigit():
+        head = store.head_code
+        if head == since_issue:
+            return Response(status_code=304, headers={"X-Head-Issue": head})
+        items, truncated = store.since(since_issue, limit)
+        return FastJSONResponse({"code": code, "head": head, "truncated": truncated, "list": items})
+
+    raw = await r.lrange(k_history(code), 0, limit - 1)
+    items = []
+    found = False
+    for d in _history_items(raw):
+        if d["issue_code"] == since_issue:
+            found = True
+            break
+        items.append(d)
+    head = items[0]["issue_code"] if items else (since_issue if found else None)
+    if found and not items:
+        return Response(status_code=304, headers={"X-Head-Issue": since_issue})
+    return FastJSONResponse({"code": code, "head": head, "truncated": not found, "list": items})
+
+@router.get("/stats", response_model=StatsResp)
+async def trend_stats(
+        code: str = Query(..., description="彩种代码"),
+        window: int = Query(STATS_WINDOWS[0], description="统计窗口（期数）"),
+):
+    # 内存增量统计，直接取快照；只有预热完成前的第一次查询会回放一次只读库
+    return FastJSONResponse((await ensure_trend_stats(code)).snapshot(window))
 
-@router.get("/odds")
+@router.get("/odds", response_model=List[OddsItem])
 async def get_odds(
         code: str = Query(..., description="彩种代码"),
-        session: AsyncSession = Depends(get_session),
+        session: AsyncSession = Depends(get_read_session),
 ):
     stmt = select(
         PlayType.name,     # 展示名称
@@ -76,10 +155,11 @@ async def get_odds(
         PlayType.status
     ).where(PlayType.lottery_code == code)
     rows = (await session.execute(stmt)).all()
-    return [
+    # Decimal 赔率由 FastJSONResponse 直接编码
+    return FastJSONResponse([
         { "name": k.name, "odds": k.odds, "status": k.status}
         for k in rows
-    ]
+    ])
 
 
 
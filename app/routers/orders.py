@@ -1,19 +1,25 @@
 from __future__ import annotations
-from typing import Dict, List
+from datetime import datetime
+from typing import Dict, List, Optional
 from decimal import Decimal, ROUND_HALF_UP
 
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-
-from app.db.session import get_session
-from app.core.auth import get_current_user
+from sqlalchemy import select, union_all
+
+from app.db.session import get_session, get_read_session
+from app.core.responses import FastJSONResponse
+from app.core.runtime import runtime
+from app.services.order_history_service import load_order_history
+from app.services.outbox_service import add_event, TOPIC_ORDER_PLACED, TOPIC_ORDER_CANCELLED
+from app.services.risk_service import check_bet, release_stake
+from app.core.auth import get_current_user, get_current_user_id
 from app.models.user import User
-from app.models.orders import Orders, OrderItem
+from app.models.orders import Orders, OrderItem, OrdersArchive, CHANNEL_ROBOT
 from app.models.play_type import PlayType
 from app.schemas.orders import (
     OrderPlaceIn, OrderPlaceOut, OrderItemIn,
-    OrderOut, OrderItemOut, OrderCancelIn, OrderCancelOut
+    OrderOut, OrderCancelIn, OrderCancelOut
 )
 
 router = APIRouter(prefix="/api/orders", tags=["orders"])
@@ -24,7 +30,6 @@ ALIAS_TO_NAME = {
     "JDA": "极大", "JX": "极小",
 }
 
-MAX_ITEMS = 10
 STATUS_SUBMITTED = 1
 STATUS_CANCELLED = 2
 
@@ -83,9 +88,8 @@ def normalize_play_to_name(play: str | int, enabled_names: set[str]) -> str:
     raise HTTPException(400, f"未知玩法: {p}")
 
 def get_client_ip(req: Request) -> str:
-    xff = req.headers.get("X-Forwarded-For") or req.headers.get("x-forwarded-for")
-    if xff:
-        return xff.split(",")[0].strip()
+    # 不直接读 X-Forwarded-For（客户端可任意伪造，绕过 / 冒用按 IP 的风控）：
+    # uvicorn proxy_headers 只对 WEB_FORWARDED_ALLOW_IPS 里的代理改写 client.host
     return req.client.host if req.client else ""
 
 @router.post("/place", response_model=OrderPlaceOut)
@@ -93,10 +97,11 @@ async def place_order(
         payload: OrderPlaceIn,
         request: Request,
         session: AsyncSession = Depends(get_session),
-        current_user: User = Depends(get_current_user),
+        user_id: int = Depends(get_current_user_id),
 ):
     """
     下单：
+      - 风控闸门（Redis，频率 / 单期额度 / 风险标记）先于任何 DB 操作
       - 赔率以 play_type 为准（不信任前端赔率）
       - 扣减 user.balance
       - 写入 Orders / OrderItem（play_code, selection, odds, stake_amount）
@@ -104,17 +109,24 @@ async def place_order(
     # 基础校验
     if not payload.items:
         raise HTTPException(400, "下注明细不能为空")
-    if len(payload.items) > MAX_ITEMS:
-        raise HTTPException(400, f"投注种类过多（最多{MAX_ITEMS}条）")
+    if len(payload.items) > runtime.ORDER_MAX_ITEMS:
+        raise HTTPException(400, f"投注种类过多（最多{runtime.ORDER_MAX_ITEMS}条）")
 
+    # ⓪ 风控：不通过直接拒绝，不占用 DB 连接/事务
+    ip = get_client_ip(request)
+    issue_code = str(payload.issue)
+    raw_total = q2(sum((Decimal(str(it.amount)) for it in payload.items), Decimal("0")))
+    reserved = await check_bet(user_id, ip, payload.code, issue_code, raw_total)
+
+    placed = False
     try:
-        # ① 幂等：如果带了 idempotency_key，判断是否已下过单
+        # ① 幂等：如果带了 idempotency_key，判断是否已下过单（热表 + 归档表，一条语句同一快照）
         if payload.idempotency_key:
             rs = await session.execute(
-                select(Orders.id).where(
-                    Orders.user_id == current_user.id,
-                    Orders.idempotency_key == payload.idempotency_key,
-                    )
+                union_all(*(
+                    select(t.id).where(t.user_id == user_id, t.idempotency_key == payload.idempotency_key)
+                    for t in (Orders, OrdersArchive)
+                )).limit(1)
             )
             existed = rs.scalar_one_or_none()
             if existed:
@@ -138,23 +150,32 @@ async def place_order(
             normalized.append(OrderItemIn(play=name, amount=float(q2(amt))))
             total += amt
 
-        # ④ 扣款（行级锁）
-        u = await session.get(User, current_user.id, with_for_update=True)
+        # ④ 扣款（行级锁；顺带复核用户状态）
+        u = await session.get(User, user_id, with_for_update=True)
+        if not u or u.status != 1:
+            raise HTTPException(401, "用户不存在或已禁用")
         bal = Decimal(str(u.balance or 0))
         if bal < total:
             raise HTTPException(400, "余额不足")
         u.balance = float(q2(bal - total))
-
-        # ⑤ 建单
+        # 用户累计：同一行已加锁更新余额，顺带累加不多一条语句
+        u.total_bet_amount = float(q2(Decimal(str(u.total_bet_amount or 0)) + total))
+        u.total_orders = int(u.total_orders or 0) + 1
+
+        # ⑤ 建单（渠道标记以用户为准：机器人一律记 robot，真实用户不能冒用）
+        robot = bool(u.is_robot)
+        channel = payload.channel or "web"
+        if robot or channel == CHANNEL_ROBOT:
+            channel = CHANNEL_ROBOT if robot else "web"
         order = Orders(
-            user_id=current_user.id,
+            user_id=user_id,
             lottery_code=payload.code,
-            issue_code=str(payload.issue),
+            issue_code=issue_code,
             total_amount=float(q2(total)),
             total_odds=None,  # 可选：如需汇总赔率可自行定义
             status=STATUS_SUBMITTED,
-            ip=get_client_ip(request),
-            channel=payload.channel or "web",
+            ip=ip,
+            channel=channel,
             idempotency_key=payload.idempotency_key,
         )
         session.add(order)
@@ -171,58 +192,34 @@ async def place_order(
                 stake_amount=float(q2(Decimal(str(it.amount)))),   # Numeric(16,2)
             ))
 
+        # 排行榜等下单后的副作用走 outbox（同一事务写入，主节点异步投递）
+        add_event(session, TOPIC_ORDER_PLACED, {
+            "user_id": user_id, "order_id": order.id, "lottery_code": payload.code, "issue_code": issue_code,
+            "amount": q2(total), "at": datetime.now(), "robot": robot,
+        })
+
         await session.commit()
+        placed = True
         return OrderPlaceOut(order_id=order.id, total_amount=float(q2(total)), status=0)
 
     except HTTPException:
         await session.rollback(); raise
     except Exception:
         await session.rollback(); raise
+    finally:
+        # 未成功建单（含幂等重放）时归还预占的单期额度
+        if reserved and not placed:
+            await release_stake(user_id, payload.code, issue_code, raw_total)
 
 @router.get("/history", response_model=List[OrderOut])
 async def order_history(
         limit: int = 20,
-        session: AsyncSession = Depends(get_session),
+        before_id: Optional[int] = Query(None, description="游标：只返回订单 ID 小于它的记录（传上一页最后一条的 id）"),
+        session: AsyncSession = Depends(get_read_session),
         current_user: User = Depends(get_current_user),
 ):
-    # 查订单
-    rs = await session.execute(
-        select(Orders).where(Orders.user_id == current_user.id)
-        .order_by(Orders.id.desc()).limit(limit)
-    )
-    orders = rs.scalars().all()
-    if not orders:
-        return []
-
-    order_ids = [o.id for o in orders]
-
-    # 查子单
-    rs2 = await session.execute(
-        select(OrderItem).where(OrderItem.order_id.in_(order_ids))
-    )
-    items = rs2.scalars().all()
-    by_order: Dict[int, List[OrderItemOut]] = {}
-    for it in items:
-        by_order.setdefault(it.order_id, []).append(
-            OrderItemOut(
-                id=it.id,
-                play=str(it.selection),
-                amount=float(it.stake_amount),
-                odds=float(it.odds),
-            )
-        )
-
-    out: List[OrderOut] = []
-    for o in orders:
-        out.append(OrderOut(
-            id=o.id,
-            lottery_code=o.lottery_code,
-            issue_code=o.issue_code,
-            total_amount=float(o.total_amount),
-            status=int(o.status),
-            items=by_order.get(o.id, []),
-        ))
-    return out
+    # 热表 + 归档表合并；直接拼响应 dict，不构造 ORM / pydantic 对象
+    return FastJSONResponse(await load_order_history(session, current_user.id, limit, before_id))
 
 @router.post("/cancel", response_model=OrderCancelOut)
 async def cancel_order(
@@ -247,11 +244,20 @@ async def cancel_order(
         if int(order.status) != STATUS_SUBMITTED:
             raise HTTPException(400, "仅已提交订单可取消")
 
-        # 退款 + 状态更新
-        u.balance = float(q2(Decimal(str(u.balance or 0)) + Decimal(str(order.total_amount))))
+        # 退款 + 状态更新 + 回退用户累计
+        amount = Decimal(str(order.total_amount))
+        u.balance = float(q2(Decimal(str(u.balance or 0)) + amount))
+        u.total_bet_amount = float(q2(Decimal(str(u.total_bet_amount or 0)) - amount))
+        u.total_orders = max(0, int(u.total_orders or 0) - 1)
         order.status = STATUS_CANCELLED
+        add_event(session, TOPIC_ORDER_CANCELLED, {
+            "user_id": u.id, "order_id": order.id, "lottery_code": order.lottery_code, "issue_code": order.issue_code,
+            "amount": amount, "at": order.created_at, "robot": bool(u.is_robot),
+        })
 
         await session.commit()
+        # 风控额度归还保持同步（下单失败时也要归还，不能依赖事务内事件）
+        await release_stake(u.id, order.lottery_code, order.issue_code, amount)
         return OrderCancelOut(order_id=order.id, status=1, balance=u.balance)
 
     except HTTPException:
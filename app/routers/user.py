@@ -1,12 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.session import get_session
+from app.db.session import get_session, get_read_session
 from app.models.user import User
-from app.schemas.user import RegisterIn, LoginIn, TokenOut, UserOut
-from app.core.security import hash_password, verify_password, create_access_token
+from app.schemas.user import RegisterIn, LoginIn, TokenOut, UserOut, LeaderboardResp, LeaderboardRankOut
+from app.core.security import hash_password_async, verify_password_async, create_access_token
 from app.core.auth import get_current_user
+from app.services.leaderboard_service import BOARDS, PERIODS, top, rank_of
 
 
 router = APIRouter(prefix="/api/user", tags=["user"])
@@ -15,20 +17,28 @@ router = APIRouter(prefix="/api/user", tags=["user"])
 @router.post("/register", response_model=UserOut, status_code=201)
 async def register(data: RegisterIn, session: AsyncSession = Depends(get_session)):
     # 检查用户名是否存在
-    exists = await session.scalar(select(User).where(User.username == data.username))
+    exists = await session.scalar(select(User.id).where(User.username == data.username))
     if exists:
         raise HTTPException(status_code=400, detail="用户名已存在")
+    # 哈希要排队几十到几百毫秒：先结束事务归还连接，避免注册 / 登录洪峰占满连接池拖住下单
+    await session.commit()
+    password_hash = await hash_password_async(data.password)
 
     u = User(
         username=data.username,
-        password_hash=hash_password(data.password),
+        password_hash=password_hash,
         nickname=data.nickname or data.username,
         status=1,
         is_robot=False,
         balance=0,  # 注册时初始化余额
     )
     session.add(u)
-    await session.commit()
+    try:
+        await session.commit()
+    except IntegrityError:
+        # 哈希期间同名用户抢先注册（username 唯一）
+        await session.rollback()
+        raise HTTPException(status_code=400, detail="用户名已存在")
     await session.refresh(u)
 
     return UserOut.model_validate(u)
@@ -36,16 +46,62 @@ async def register(data: RegisterIn, session: AsyncSession = Depends(get_session
 
 @router.post("/login", response_model=TokenOut)
 async def login(data: LoginIn, session: AsyncSession = Depends(get_session)):
-    u = await session.scalar(select(User).where(User.username == data.username))
-    if not u or not verify_password(data.password, u.password_hash):
+    row = (await session.execute(
+        select(User.id, User.password_hash, User.status).where(User.username == data.username)
+    )).one_or_none()
+    # 同注册：校验密码前先归还连接
+    await session.commit()
+    if row is None or not await verify_password_async(data.password, row.password_hash):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="用户名或密码错误")
-    if u.status != 1:
+    if row.status != 1:
         raise HTTPException(status_code=403, detail="用户已禁用")
 
-    token = create_access_token(subject=str(u.id))
+    token = create_access_token(subject=str(row.id))
     return TokenOut(access_token=token)
 
 
 @router.get("/profile", response_model=UserOut)
 async def profile(current_user: User = Depends(get_current_user)):
     return UserOut.model_validate(current_user)
+
+
+def _check_board(board: str, period: str) -> None:
+    if board not in BOARDS:
+        raise HTTPException(400, f"board 仅支持 {'/'.join(BOARDS)}")
+    if period not in PERIODS:
+        raise HTTPException(400, f"period 仅支持 {'/'.join(PERIODS)}")
+
+
+@router.get("/leaderboard", response_model=LeaderboardResp)
+async def leaderboard(
+        board: str = Query("profit", description="profit 盈利 / volume 投注额"),
+        period: str = Query("day", description="day 今日 / week 本周"),
+        limit: int = Query(20, ge=1, le=100),
+        session: AsyncSession = Depends(get_read_session),
+):
+    _check_board(board, period)
+    rows = await top(board, period, limit)
+    names = {}
+    if rows:
+        rs = await session.execute(
+            select(User.id, User.nickname, User.username).where(User.id.in_([uid for uid, _ in rows]))
+        )
+        names = {uid: nick or uname for uid, nick, uname in rs.all()}
+    return {
+        "board": board,
+        "period": period,
+        "list": [
+            {"rank": i + 1, "user_id": uid, "nickname": names.get(uid, f"UID{uid}"), "score": score}
+            for i, (uid, score) in enumerate(rows)
+        ],
+    }
+
+
+@router.get("/leaderboard/me", response_model=LeaderboardRankOut)
+async def leaderboard_me(
+        board: str = Query("profit"),
+        period: str = Query("day"),
+        current_user: User = Depends(get_current_user),
+):
+    _check_board(board, period)
+    return {"board": board, "period": period, **await rank_of(board, period, current_user.id)}
@@ -1,12 +1,173 @@
 # run.py
+"""
+启动入口：python -m app.run [--dev | --prod]
+  - dev（APP_ENV=dev 时默认）：单进程 + reload，和原来一样
+  - prod：父进程绑定监听端口、预加载 app（WEB_PRELOAD=1），再 fork WEB_WORKERS 个 uvicorn 子进程共享同一个 socket
+      · uvloop + httptools，keep-alive / backlog / 并发上限 / 优雅退出超时都来自 settings
+      · SIGTERM / SIGINT 转发给子进程：停止接收新连接 → 等在途请求（含下单）完成 → lifespan shutdown（调度器排空、释放主节点锁）
+      · 子进程异常退出时由父进程补起（从已预加载的父进程 fork，重启很快）
+      · 所有 worker 共用一个端口，/metrics 按 METRICS_DIR 里各 worker 的快照汇总（见 app/core/metrics.py）
+预加载只 import 模块，不建连接 / 不起事件循环；连接池、Redis、调度器、主节点选举的锁 token 都在各子进程里创建。
+"""
+import argparse
+import logging
+import os
+import signal
+import tempfile
+import time
+from typing import Dict
+
 import uvicorn
 
-if __name__ == "__main__":
+from app.core.config import settings
+from app.core.metrics import reset_metrics_dir
+
+logger = logging.getLogger("app.run")
+
+
+def _worker_count() -> int:
+    return settings.WEB_WORKERS if settings.WEB_WORKERS > 0 else (os.cpu_count() or 1)
+
+
+def _config(app) -> uvicorn.Config:
+    return uvicorn.Config(
+        app,
+        host=settings.APP_HOST,
+        port=settings.APP_PORT,
+        loop=settings.WEB_LOOP,
+        http=settings.WEB_HTTP,
+        backlog=settings.WEB_BACKLOG,
+        timeout_keep_alive=settings.WEB_KEEPALIVE_SECONDS,
+        timeout_graceful_shutdown=settings.WEB_GRACEFUL_TIMEOUT_SECONDS,
+        limit_concurrency=settings.WEB_LIMIT_CONCURRENCY or None,
+        limit_max_requests=settings.WEB_MAX_REQUESTS or None,
+        proxy_headers=True,
+        forwarded_allow_ips=settings.WEB_FORWARDED_ALLOW_IPS,
+        log_level="warning",
+        access_log=False,
+    )
+
+
+def run_dev() -> None:
     uvicorn.run(
         "app.main:app",
-        host="0.0.0.0",
-        port=8000,
+        host=settings.APP_HOST,
+        port=settings.APP_PORT,
         reload=True,
         log_level="warning",
         access_log=False
     )
+
+
+def _spawn(config: uvicorn.Config, sock) -> int:
+    pid = os.fork()
+    if pid:
+        return pid
+    # 子进程：恢复默认信号处理（uvicorn.Server 会自己接管 SIGINT / SIGTERM）
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    code = 0
+    try:
+        uvicorn.Server(config).run(sockets=[sock])
+    except BaseException:
+        logger.exception("worker %s crashed", os.getpid())
+        code = 1
+    finally:
+        os._exit(code)
+
+
+def _metrics_dir(n: int) -> None:
+    """多 worker 共用一个端口：指标快照目录在 fork 前定好并清空，子进程（含 spawn 的）都用同一个。"""
+    if n <= 1:
+        return
+    path = settings.METRICS_DIR or os.path.join(tempfile.gettempdir(), f"cs28-metrics-{settings.APP_PORT}")
+    reset_metrics_dir(path)
+    settings.METRICS_DIR = os.environ["METRICS_DIR"] = path
+
+
+def run_prod() -> None:
+    n = _worker_count()
+    _metrics_dir(n)
+    if not hasattr(os, "fork"):
+        # 没有 fork 的平台退回 uvicorn 自带的多进程（spawn，不预加载）
+        uvicorn.run("app.main:app", workers=n, host=settings.APP_HOST, port=settings.APP_PORT,
+                    loop=settings.WEB_LOOP, http=settings.WEB_HTTP, backlog=settings.WEB_BACKLOG,
+                    timeout_keep_alive=settings.WEB_KEEPALIVE_SECONDS,
+                    timeout_graceful_shutdown=settings.WEB_GRACEFUL_TIMEOUT_SECONDS,
+                    log_level="warning", access_log=False)
+        return
+
+    if settings.WEB_PRELOAD:
+        from app.main import app  # fork 前 import：子进程共享已加载的模块（写时复制）
+        from app.tasks import scheduler  # noqa: F401  后台预热才 import 的调度 / 采集模块也一并预加载
+    else:
+        app = "app.main:app"
+    config = _config(app)
+    sock = config.bind_socket()
+
+    children: Dict[int, float] = {}
+    stopping = False
+
+    def _forward(sig, _frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM if sig != signal.SIGQUIT else signal.SIGINT)
+            except ProcessLookupError:
+                pass
+
+    for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGQUIT):
+        signal.signal(sig, _forward)
+
+    for _ in range(n):
+        children[_spawn(config, sock)] = time.monotonic()
+    print(f"[run] {settings.APP_NAME} listening on {settings.APP_HOST}:{settings.APP_PORT} "
+          f"workers={n} loop={settings.WEB_LOOP} http={settings.WEB_HTTP} preload={int(settings.WEB_PRELOAD)}",
+          flush=True)
+
+    # 优雅退出：子进程自己等在途请求（WEB_GRACEFUL_TIMEOUT_SECONDS）+ 调度器排空，父进程再多等一点后强杀
+    deadline = None
+    while children:
+        if stopping:
+            if deadline is None:
+                deadline = (time.monotonic() + settings.WEB_GRACEFUL_TIMEOUT_SECONDS
+                            + settings.SCHEDULER_SHUTDOWN_TIMEOUT_SECONDS + 5)
+            if time.monotonic() >= deadline:
+                for pid in children:
+                    logger.error("worker %s did not exit in time, killing", pid)
+                    os.kill(pid, signal.SIGKILL)
+                deadline = float("inf")
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG if stopping else 0)
+        except ChildProcessError:
+            break
+        if not pid:
+            time.sleep(0.1)
+            continue
+        started = children.pop(pid, None)
+        if started is None or stopping:
+            continue
+        logger.error("worker %s exited with %s, restarting", pid, os.waitstatus_to_exitcode(status))
+        # 刚起就退出（配置错误等）时放慢重启，避免空转
+        if time.monotonic() - started < 1.0:
+            time.sleep(1.0)
+        children[_spawn(config, sock)] = time.monotonic()
+    sock.close()
+
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(prog="python -m app.run", description="cs28-api 启动入口")
+    mode = ap.add_mutually_exclusive_group()
+    mode.add_argument("--dev", action="store_true", help="单进程 + reload")
+    mode.add_argument("--prod", action="store_true", help="多进程（WEB_WORKERS）+ uvloop + httptools")
+    args = ap.parse_args(argv)
+    dev = args.dev or (not args.prod and settings.APP_ENV == "dev")
+    if dev:
+        run_dev()
+    else:
+        run_prod()
+
+
+if __name__ == "__main__":
+    main()
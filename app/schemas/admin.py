@@ -0,0 +1,17 @@
+from pydantic import BaseModel, Field
+from typing import Optional, Dict
+
+
+class OddsProposalIn(BaseModel):
+    code: str = Field(description="彩种代码")
+    odds: Dict[str, float] = Field(default_factory=dict, description="拟调整的赔率 {玩法名: 赔率}，未给出的沿用当前值")
+    issue: Optional[str] = Field(None, description="可选：用该期实际投注结构按新赔率试算庄家盈亏")
+    horizon: int = Field(1, ge=1, le=10_000, description="蒙特卡洛：连续期数")
+    runs: int = Field(10_000, ge=1, le=100_000, description="蒙特卡洛：抽样次数")
+    seed: Optional[int] = None
+
+
+class RuntimeConfigIn(BaseModel):
+    value: str = Field(description="参数值（按参数类型解析并校验范围）")
+    is_active: bool = Field(True, description="false 表示停用该行，回到默认值")
+    remark: Optional[str] = Field(None, max_length=255)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Optional, List, Dict
 
 class IssueResult(BaseModel):
     lottery_code: str
@@ -29,4 +29,34 @@ class HistoryItem(BaseModel):
 
 class HistoryResp(BaseModel):
     code: str = Field(..., description="lottery code")
+    head: Optional[str] = Field(None, description="最新期号，可作为下次 since_issue")
+    truncated: bool = Field(False, description="增量同步时落后超过 limit 期，list 仅为最新一页")
     list: List[HistoryItem]
+
+class OddsItem(BaseModel):
+    name: str
+    odds: float
+    status: int
+
+class StatsSumItem(BaseModel):
+    value: int
+    freq: int
+    missing: int
+
+class StatsCategoryItem(BaseModel):
+    name: str
+    freq: int
+    missing: int
+
+class StatsStreak(BaseModel):
+    value: str
+    length: int
+
+class StatsResp(BaseModel):
+    code: str
+    window: int
+    count: int
+    issue_code: str
+    sums: List[StatsSumItem]
+    categories: List[StatsCategoryItem]
+    streaks: Dict[str, StatsStreak]
@@ -23,3 +23,20 @@ class UserOut(BaseModel):
     balance: float = 0   # 新增：余额
 
     model_config = ConfigDict(from_attributes=True)
+
+class LeaderboardItem(BaseModel):
+    rank: int
+    user_id: int
+    nickname: str
+    score: float
+
+class LeaderboardResp(BaseModel):
+    board: str       # profit / volume
+    period: str      # day / week
+    list: list[LeaderboardItem]
+
+class LeaderboardRankOut(BaseModel):
+    board: str
+    period: str
+    rank: int | None = None    # 未上榜为 null
+    score: float | None = None
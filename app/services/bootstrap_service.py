@@ -7,12 +7,25 @@ from app.core.config import settings
 from app.db.redis import r
 from app.constants import k_last_result, k_history
 from datetime import datetime
+import asyncio
 import json
 
 async def init_db():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
 
+async def prewarm_pool(n: int) -> int:
+    """同时借出 n 个主库连接各跑一次 SELECT 1 再归还，让连接池里留下 n 个已建好的连接。"""
+    n = min(n, settings.DB_POOL_SIZE)
+    if n <= 0:
+        return 0
+    conns = await asyncio.gather(*(engine.connect() for _ in range(n)))
+    try:
+        await asyncio.gather(*(c.exec_driver_sql("SELECT 1") for c in conns))
+    finally:
+        await asyncio.gather(*(c.close() for c in conns))
+    return n
+
 async def ensure_default_lottery(session: AsyncSession):
     res = await session.execute(select(Lottery).where(Lottery.code==settings.LOTTERY_DEFAULT_CODE))
     lot = res.scalar_one_or_none()
@@ -37,20 +50,19 @@ async def warmup_redis_from_db(session: AsyncSession, lottery_code: str, limit:
     from app.db.redis import r
     from app.constants import k_history, k_last_result
 
-    # 用 open_time 升序取出（旧→新）
+    # 取最近 limit 期（新→旧），下面再反转成旧→新
     result = await session.execute(
         Issue.__table__.select()
         .where(Issue.lottery_code == lottery_code, Issue.status >= 3)
-        .order_by(Issue.open_time.asc())
+        .order_by(Issue.open_time.desc())
         .limit(limit)
     )
-    rows = result.mappings().all()
+    rows = list(reversed(result.mappings().all()))
 
     h_key = k_history(lottery_code)
     lr_key = k_last_result(lottery_code)
-    await r.delete(h_key)
 
-    last_payload = None
+    payloads = []
     for d in rows:
         item = {
             "lottery_code": d["lottery_code"],
@@ -60,13 +72,13 @@ async def warmup_redis_from_db(session: AsyncSession, lottery_code: str, limit:
             "bs": d["bs"], "oe": d["oe"], "extreme": d["extreme"],
             "open_time": d["open_time"].strftime("%Y-%m-%d %H:%M:%S"),
         }
-        payload = json.dumps(item, ensure_ascii=False, sort_keys=True)
-        # 旧→新依次 LPUSH，最终列表是 新→旧（最新在索引0）
-        await r.lpush(h_key, payload)
-        last_payload = payload
-
-    if last_payload:
-        await r.set(lr_key, last_payload)
-
-
+        payloads.append(json.dumps(item, ensure_ascii=False, sort_keys=True))
 
+    # 多个 worker 会同时预热：用 MULTI 一次性重建，避免交错 LPUSH 产生重复
+    pipe = r.pipeline(transaction=True)
+    pipe.delete(h_key)
+    if payloads:
+        # 旧→新依次 LPUSH，最终列表是 新→旧（最新在索引0）
+        pipe.lpush(h_key, *payloads)
+        pipe.set(lr_key, payloads[-1])
+    await pipe.execute()
@@ -0,0 +1,330 @@
+# app/services/issue_pnl_service.py
+"""
+每期盈亏汇总（issue_pnl）：管理端报表只读这张小表，不再聚合 orders / order_item。
+  - 下单 / 撤单 / 结算 / 重新结算各自的 outbox 事件驱动增量更新（主节点投递）：
+    一批事件先按期次合并，每批每张语句一次 executemany（结算事件本身就是按块发出的）
+  - 投注人数只由 issue_bettor 增量维护：(期次, 用户) 记有效订单数，0 → 正数 +1、正数 → 0 -1（同一用户多单、撤单都不回表）；
+    issue_bettor 过了保留期由 purge_issue_bettors 清理
+  - 机器人（压测）订单不计：事件带 robot 标记的跳过
+  - issue_date 先取下单日期，结算时改为开奖日期，按天汇总走 idx_pnl_date
+投递是“至少一次”：每个订阅者在自己的事务里 claim_events，重复投递的事件不会再计一次。
+"""
+import datetime as dt
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select, insert, update, delete, func, and_, or_, bindparam
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.models.issue import Issue
+from app.models.issue_pnl import IssuePnl, IssueBettor
+from app.models.lottery import Lottery
+from app.services.outbox_service import (
+    claim_events, subscribe, TOPIC_ORDER_PLACED, TOPIC_ORDER_CANCELLED, TOPIC_ORDERS_SETTLED, TOPIC_ORDERS_RESETTLED,
+)
+
+Key = Tuple[str, str]
+BettorKey = Tuple[str, str, int]   # (lottery_code, issue_code, user_id)
+
+PURGE_ISSUES = 20  # purge_issue_bettors 每个彩种每次最多清理的期次数
+
+COUNTERS = (
+    "order_count", "bettor_count", "turnover", "cancel_count", "cancel_amount", "settled_count", "settled_stake", "payout",
+)
+AMOUNTS = ("turnover", "cancel_amount", "settled_stake", "payout")
+
+STATUS_SETTLED = 4
+STATUS_LOST = 5
+
+
+def _issues_where(model, keys: Iterable[Key]):
+    # 展开成 OR（而不是行值 IN），各分支都能走 (lottery_code, issue_code) 索引
+    return or_(*(and_(model.lottery_code == code, model.issue_code == issue) for code, issue in keys))
+
+
+def _key(e: dict) -> Optional[Key]:
+    # 老版本事件没有期次字段，跳过
+    if not e.get("lottery_code") or not e.get("issue_code"):
+        return None
+    return e["lottery_code"], str(e["issue_code"])
+
+
+def _at(e: dict) -> dt.date:
+    return (dt.datetime.fromisoformat(e["at"]) if e.get("at") else dt.datetime.now()).date()
+
+
+def _acc(deltas: Dict[Key, Dict[str, Decimal]], key: Key, **kw) -> None:
+    row = deltas.setdefault(key, {})
+    for k, v in kw.items():
+        row[k] = row.get(k, 0) + v
+
+
+async def apply_pnl_deltas(
+        s: AsyncSession,
+        deltas: Dict[Key, Dict[str, Decimal]],
+        dates: Dict[Key, dt.date],
+        set_dates: bool = False,
+) -> None:
+    """
+    在调用方的事务里：缺的期次先插入空行 → 计数器按差额累加（executemany）。
+    set_dates=True 时用 dates 覆盖 issue_date（结算时改成开奖日期）。
+    """
+    if not deltas:
+        return
+    keys = list(deltas)
+    t = IssuePnl.__table__
+    existing = set((await s.execute(
+        select(IssuePnl.lottery_code, IssuePnl.issue_code).where(_issues_where(IssuePnl, keys))
+    )).tuples().all())
+    missing = [k for k in keys if k not in existing]
+    if missing:
+        today = dt.date.today()
+        await s.execute(insert(t), [
+            {"lottery_code": code, "issue_code": issue, "issue_date": dates.get((code, issue), today)}
+            for code, issue in missing
+        ])
+
+    params = []
+    for (code, issue), d in deltas.items():
+        p = {"b_code": code, "b_issue": issue}
+        for c in COUNTERS:
+            v = d.get(c, 0)
+            p["b_" + c] = float(v) if c in AMOUNTS else int(v)
+        params.append(p)
+    cond = and_(t.c.lottery_code == bindparam("b_code"), t.c.issue_code == bindparam("b_issue"))
+    await s.execute(
+        update(t).where(cond).values({c: t.c[c] + bindparam("b_" + c) for c in COUNTERS}),
+        params,
+    )
+
+    if set_dates and dates:
+        await s.execute(
+            update(t).where(cond).values(issue_date=bindparam("b_date")),
+            [{"b_code": code, "b_issue": issue, "b_date": d} for (code, issue), d in dates.items()],
+        )
+
+
+async def apply_bettor_deltas(s: AsyncSession, per_user: Dict[BettorKey, int]) -> Dict[Key, int]:
+    """
+    在调用方的事务里按 (期次, 用户) 累加 issue_bettor 的有效订单数（缺的行先插入），
+    返回各期投注人数的变化：该用户的有效订单数从 0 变正 +1，从正变 0 -1。
+    """
+    per_user = {k: n for k, n in per_user.items() if n}
+    if not per_user:
+        return {}
+    t = IssueBettor.__table__
+    uids: Dict[Key, List[int]] = {}
+    for code, issue, uid in per_user:
+        uids.setdefault((code, issue), []).append(uid)
+    old = {
+        (code, issue, uid): n for code, issue, uid, n in (await s.execute(
+            select(t.c.lottery_code, t.c.issue_code, t.c.user_id, t.c.order_count)
+            .where(or_(*(
+                and_(t.c.lottery_code == code, t.c.issue_code == issue, t.c.user_id.in_(ids))
+                for (code, issue), ids in uids.items()
+            )))
+            .with_for_update()
+        )).tuples().all()
+    }
+    missing = [k for k in per_user if k not in old]
+    if missing:
+        await s.execute(insert(t), [
+            {"lottery_code": code, "issue_code": issue, "user_id": uid, "order_count": 0}
+            for code, issue, uid in missing
+        ])
+    await s.execute(
+        update(t)
+        .where(t.c.lottery_code == bindparam("b_code"), t.c.issue_code == bindparam("b_issue"),
+               t.c.user_id == bindparam("b_uid"))
+        .values(order_count=t.c.order_count + bindparam("b_n")),
+        [{"b_code": code, "b_issue": issue, "b_uid": uid, "b_n": n} for (code, issue, uid), n in per_user.items()],
+    )
+
+    changes: Dict[Key, int] = {}
+    for (code, issue, uid), n in per_user.items():
+        before = old.get((code, issue, uid), 0)
+        d = int(before + n > 0) - int(before > 0)
+        if d:
+            changes[(code, issue)] = changes.get((code, issue), 0) + d
+    return changes
+
+
+async def _order_events_pnl(events: list, sign: int) -> None:
+    """下单（sign=1）/ 撤单（sign=-1）：订单数、投注额、撤单计数，以及投注人数的增量。"""
+    async with AsyncSessionLocal() as s:
+        async with s.begin():
+            deltas: Dict[Key, Dict[str, Decimal]] = {}
+            dates: Dict[Key, dt.date] = {}
+            per_user: Dict[BettorKey, int] = {}
+            for e in await claim_events(s, "issue_pnl", events):
+                key = _key(e)
+                if key is None or e.get("robot"):
+                    continue
+                amount = Decimal(str(e["amount"]))
+                if sign > 0:
+                    _acc(deltas, key, order_count=1, turnover=amount)
+                else:
+                    _acc(deltas, key, order_count=-1, turnover=-amount, cancel_count=1, cancel_amount=amount)
+                dates.setdefault(key, _at(e))
+                bk = (key[0], key[1], int(e["user_id"]))
+                per_user[bk] = per_user.get(bk, 0) + sign
+            for key, d in (await apply_bettor_deltas(s, per_user)).items():
+                _acc(deltas, key, bettor_count=d)
+            await apply_pnl_deltas(s, deltas, dates)
+
+
+# ------------------------------
+# outbox 订阅
+# ------------------------------
+@subscribe(TOPIC_ORDER_PLACED, "issue_pnl")
+async def _on_order_placed(events: list):
+    await _order_events_pnl(events, 1)
+
+
+@subscribe(TOPIC_ORDER_CANCELLED, "issue_pnl")
+async def _on_order_cancelled(events: list):
+    await _order_events_pnl(events, -1)
+
+
+@subscribe(TOPIC_ORDERS_SETTLED, "issue_pnl")
+async def _on_orders_settled(events: list):
+    """一个结算事件是一块（预计算写回）或一单（逐单结算）；只计中奖 / 未中奖，作废不计。"""
+    async with AsyncSessionLocal() as s:
+        async with s.begin():
+            deltas: Dict[Key, Dict[str, Decimal]] = {}
+            for e in await claim_events(s, "issue_pnl", events):
+                for o in e["orders"]:
+                    if o.get("status") not in (STATUS_SETTLED, STATUS_LOST) or o.get("robot"):
+                        continue
+                    key = _key(o)
+                    if key is None:
+                        continue
+                    _acc(deltas, key, settled_count=1, settled_stake=Decimal(str(o["stake"])),
+                         payout=Decimal(str(o["win"])))
+            if not deltas:
+                return
+            dates = {
+                (code, issue): ot.date()
+                for code, issue, ot in (await s.execute(
+                    select(Issue.lottery_code, Issue.issue_code, Issue.open_time).where(_issues_where(Issue, deltas))
+                )).tuples().all()
+            }
+            await apply_pnl_deltas(s, deltas, dates, set_dates=True)
+
+
+@subscribe(TOPIC_ORDERS_RESETTLED, "issue_pnl")
+async def _on_orders_resettled(events: list):
+    async with AsyncSessionLocal() as s:
+        async with s.begin():
+            deltas: Dict[Key, Dict[str, Decimal]] = {}
+            for e in await claim_events(s, "issue_pnl", events):
+                key = _key(e)
+                if key is None:
+                    continue
+                robots = set(e.get("robots", ()))
+                payout = sum((Decimal(str(v)) for uid, v in e["users"].items() if uid not in robots), Decimal("0"))
+                _acc(deltas, key, payout=payout)
+            await apply_pnl_deltas(s, deltas, {})
+
+
+# ------------------------------
+# 清理
+# ------------------------------
+async def purge_issue_bettors(max_issues: int = PURGE_ISSUES) -> int:
+    """
+    删除 issue_date 早于 ISSUE_BETTOR_RETAIN_DAYS 天的期次的 issue_bettor 行（这些期早已结算，不会再有下单 / 撤单）；
+    每个彩种从最老的期次开始，每次最多 max_issues 期。返回删除行数。
+    """
+    cutoff = dt.date.today() - dt.timedelta(days=settings.ISSUE_BETTOR_RETAIN_DAYS)
+    t = IssueBettor
+    deleted = 0
+    async with AsyncSessionLocal() as s:
+        for code in (await s.execute(select(Lottery.code))).scalars().all():
+            issues = (await s.execute(
+                select(t.issue_code).where(t.lottery_code == code)
+                .distinct().order_by(t.issue_code.asc()).limit(max_issues)
+            )).scalars().all()
+            if not issues:
+                continue
+            old = (await s.execute(
+                select(IssuePnl.issue_code)
+                .where(IssuePnl.lottery_code == code, IssuePnl.issue_code.in_(issues), IssuePnl.issue_date < cutoff)
+            )).scalars().all()
+            if not old:
+                continue
+            rs = await s.execute(delete(t).where(t.lottery_code == code, t.issue_code.in_(old)))
+            await s.commit()
+            deleted += rs.rowcount or 0
+    return deleted
+
+
+# ------------------------------
+# 管理端查询
+# ------------------------------
+def _money(v) -> float:
+    return float(v or 0)
+
+
+def _pnl_dict(row) -> dict:
+    settled_stake, payout = _money(row.settled_stake), _money(row.payout)
+    return {
+        "issue_code": row.issue_code,
+        "issue_date": row.issue_date.strftime("%Y-%m-%d"),
+        "orders": row.order_count,
+        "bettors": row.bettor_count,
+        "turnover": _money(row.turnover),
+        "cancel_count": row.cancel_count,
+        "cancel_amount": _money(row.cancel_amount),
+        "settled_orders": row.settled_count,
+        "settled_stake": settled_stake,
+        "payout": payout,
+        "house_profit": round(settled_stake - payout, 2),
+    }
+
+
+async def issue_pnl_rows(
+        session: AsyncSession, code: str, start: dt.date, end: dt.date, before_issue: Optional[str], limit: int,
+) -> List[dict]:
+    """[start, end] 内的期次（新→旧）；翻页传上一页最后一条的 issue_code 作为 before_issue。"""
+    stmt = (
+        select(IssuePnl)
+        .where(IssuePnl.lottery_code == code, IssuePnl.issue_date >= start, IssuePnl.issue_date <= end)
+        .order_by(IssuePnl.issue_code.desc())
+        .limit(limit)
+    )
+    if before_issue:
+        stmt = stmt.where(IssuePnl.issue_code < before_issue)
+    return [_pnl_dict(r) for r in (await session.execute(stmt)).scalars()]
+
+
+async def day_pnl_rollup(session: AsyncSession, code: str, start: dt.date, end: dt.date) -> List[dict]:
+    """按天汇总（新→旧）；bettors 是各期投注人数之和（同一用户在多期投注会重复计）。"""
+    t = IssuePnl
+    rows = (await session.execute(
+        select(
+            t.issue_date, func.count(), func.sum(t.order_count), func.sum(t.bettor_count), func.sum(t.turnover),
+            func.sum(t.cancel_count), func.sum(t.cancel_amount), func.sum(t.settled_count),
+            func.sum(t.settled_stake), func.sum(t.payout),
+        )
+        .where(t.lottery_code == code, t.issue_date >= start, t.issue_date <= end)
+        .group_by(t.issue_date)
+        .order_by(t.issue_date.desc())
+    )).all()
+    out = []
+    for day, issues, orders, bettors, turnover, cancels, cancel_amt, settled, stake, payout in rows:
+        out.append({
+            "date": day.strftime("%Y-%m-%d") if hasattr(day, "strftime") else str(day),
+            "issues": issues,
+            "orders": int(orders or 0),
+            "bettors": int(bettors or 0),
+            "turnover": _money(turnover),
+            "cancel_count": int(cancels or 0),
+            "cancel_amount": _money(cancel_amt),
+            "settled_orders": int(settled or 0),
+            "settled_stake": _money(stake),
+            "payout": _money(payout),
+            "house_profit": round(_money(stake) - _money(payout), 2),
+        })
+    return out
@@ -1,5 +1,5 @@
 from datetime import datetime, timedelta
-from typing import Dict, Any
+from typing import Dict, Any, Tuple
 import json
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -7,6 +7,8 @@ from app.models.issue import Issue
 from app.models.lottery import Lottery
 from app.constants import k_last_result, k_history, k_current_issue
 from app.db.redis import r
+from app.services.outbox_service import subscribe, TOPIC_ISSUE_OPENED, TOPIC_ISSUE_CORRECTED
+from app.services.resettle_service import record_result_correction
 
 def calc_fields(n1:int, n2:int, n3:int):
     s = n1 + n2 + n3
@@ -16,7 +18,9 @@ def calc_fields(n1:int, n2:int, n3:int):
     return s, bs, oe, extreme
 
 async def upsert_issue_from_result(db: AsyncSession, lottery_code: str, issue_code: str, 
-                                   n1:int, n2:int, n3:int, open_time: datetime, raw_json: str) -> Issue:
+                                   n1:int, n2:int, n3:int, open_time: datetime, raw_json: str,
+                                   commit: bool = True) -> Tuple[Issue, bool]:
+    """写入 / 更新一期开奖结果，返回 (期次, 是否新开奖)：新插入的行或由未开奖变为已开奖时为 True，重复拉到同一期为 False。"""
     s, bs, oe, extreme = calc_fields(n1,n2,n3)
     # get lottery for lock_ahead
     lot = (await db.execute(select(Lottery).where(Lottery.code==lottery_code))).scalar_one()
@@ -24,7 +28,12 @@ async def upsert_issue_from_result(db: AsyncSession, lottery_code: str, issue_co
 
     res = await db.execute(select(Issue).where(Issue.lottery_code==lottery_code, Issue.issue_code==issue_code))
     row = res.scalar_one_or_none()
+    old = None
+    drawn = row is None or row.status != 3
     if row:
+        # 已开奖的期次号码变了：上游更正了结果，已结算订单要重新结算（同一事务记下更正批次）
+        if row.status == 3 and (row.n1, row.n2, row.n3) != (n1, n2, n3):
+            old = (row.n1, row.n2, row.n3, row.sum_value)
         row.n1, row.n2, row.n3 = n1, n2, n3
         row.sum_value, row.bs, row.oe, row.extreme = s, bs, oe, extreme
         row.open_time = open_time
@@ -43,14 +52,22 @@ async def upsert_issue_from_result(db: AsyncSession, lottery_code: str, issue_co
             raw_json=(raw_json or "")[:255]
         )
         db.add(row)
-    await db.commit()
-    return row
+    if old is not None:
+        await db.flush()
+        await record_result_correction(db, row, old)
+    # commit=False：调用方还要在同一事务里写 outbox 事件
+    if commit:
+        await db.commit()
+    else:
+        await db.flush()
+    return row, drawn
 
 # app/services/issue_service.py
 async def set_redis_after_issue(lottery_code: str, issue_dict: dict):
     import json
     from app.db.redis import r
     from app.constants import k_history, k_last_result
+    from app.core.runtime import runtime
 
     h_key = k_history(lottery_code)
     lr_key = k_last_result(lottery_code)
@@ -59,7 +76,8 @@ async def set_redis_after_issue(lottery_code: str, issue_dict: dict):
     issue_code = issue_dict["issue_code"]
 
     # 先删除历史里相同期号（避免重复）——按值删除，需用“规范化JSON”（sort_keys=True）
-    existing = await r.lrange(h_key, 0, 199)
+    keep = runtime.REDIS_HISTORY_LEN
+    existing = await r.lrange(h_key, 0, keep - 1)
     if existing:
         pipe = r.pipeline()
         for item in existing:
@@ -73,12 +91,37 @@ async def set_redis_after_issue(lottery_code: str, issue_dict: dict):
     # 头插 + 限长 + 更新 last_result（保证最新在前）
     pipe = r.pipeline()
     pipe.lpush(h_key, payload)
-    pipe.ltrim(h_key, 0, 199)
+    pipe.ltrim(h_key, 0, keep - 1)
     pipe.set(lr_key, payload)
     await pipe.execute()
 
 
 
+async def replace_redis_issue(lottery_code: str, issue_dict: dict):
+    """
+    结果更正：原位替换 Redis 历史里的同一期（不改变顺序）；是最新一期时同时更新 last_result。
+    同一管道里把 result_version +1，各实例的 sync_issue_views_job 看到后重建进程内视图。
+    """
+    from app.constants import k_history, k_last_result, k_result_version
+    from app.core.runtime import runtime
+
+    h_key = k_history(lottery_code)
+    payload = json.dumps(issue_dict, ensure_ascii=False, sort_keys=True)
+    existing = await r.lrange(h_key, 0, runtime.REDIS_HISTORY_LEN - 1)
+    pipe = r.pipeline()
+    for idx, item in enumerate(existing):
+        try:
+            if json.loads(item).get("issue_code") != issue_dict["issue_code"]:
+                continue
+        except Exception:
+            continue
+        pipe.lset(h_key, idx, payload)
+        if idx == 0:
+            pipe.set(k_last_result(lottery_code), payload)
+    pipe.incr(k_result_version(lottery_code))
+    await pipe.execute()
+
+
 async def set_current_issue_cache(lottery_code:str, issue_code:str, open_time:datetime, close_time:datetime, allow_bet:bool):
     payload = {
         "lottery_code": lottery_code,
@@ -89,3 +132,32 @@ async def set_current_issue_cache(lottery_code:str, issue_code:str, open_time:da
     }
     await r.hset(k_current_issue(lottery_code), mapping=payload)
     await r.expire(k_current_issue(lottery_code), 3600)
+
+
+# ------------------------------
+# outbox 订阅：开奖入库后的 Redis 写入
+# ------------------------------
+@subscribe(TOPIC_ISSUE_OPENED, "redis_history")
+async def _on_issue_opened_history(events: list):
+    for e in events:
+        item = e["item"]
+        await set_redis_after_issue(item["lottery_code"], item)
+
+
+@subscribe(TOPIC_ISSUE_CORRECTED, "redis_history")
+async def _on_issue_corrected_history(events: list):
+    for e in events:
+        item = e["item"]
+        await replace_redis_issue(item["lottery_code"], item)
+
+
+@subscribe(TOPIC_ISSUE_OPENED, "current_issue")
+async def _on_issue_opened_current(events: list):
+    # 同一彩种只需要最新一期；allow_bet 按投递时刻计算（之后由每秒的 tick 任务刷新）
+    latest = {}
+    for e in events:
+        latest[e["item"]["lottery_code"]] = e["next"]
+    for code, nxt in latest.items():
+        open_time = datetime.strptime(nxt["open_time"], "%Y-%m-%d %H:%M:%S")
+        close_time = datetime.strptime(nxt["close_time"], "%Y-%m-%d %H:%M:%S")
+        await set_current_issue_cache(code, nxt["issue_code"], open_time, close_time, datetime.now() < close_time)
@@ -0,0 +1,208 @@
+# app/services/issue_store.py
+"""
+进程内列式期次存储（每个彩种一份）：
+  issue_code / n1 / n2 / n3 / sum_value / open_time 各一条 array，按期号升序追加。
+  每期约 20 字节，10 万期约 2MB；范围查询用二分，不访问 MySQL。
+期号必须是纯数字（jnd28 即是），否则该彩种不入库，接口回退到 Redis 历史。
+后台预热完成前（loaded=False）范围查询由 query_issues_db 直接查只读库。
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.issue import Issue
+from app.services.issue_service import calc_fields
+
+_EPOCH = datetime(1970, 1, 1)
+TIME_FMT = "%Y-%m-%d %H:%M:%S"
+
+
+def _to_ts(dt: datetime) -> int:
+    # open_time 是库里的 naive 本地时间，这里只做可逆编码，不做时区换算
+    return int((dt - _EPOCH).total_seconds())
+
+
+def _from_ts(ts: int) -> datetime:
+    return _EPOCH + timedelta(seconds=ts)
+
+
+def _item(issue_code: str, n1: int, n2: int, n3: int, open_time: datetime) -> dict:
+    s, bs, oe, extreme = calc_fields(n1, n2, n3)
+    return {
+        "issue_code": str(issue_code),
+        "open_time": open_time.strftime(TIME_FMT),
+        "n1": n1, "n2": n2, "n3": n3,
+        "sum_value": s, "bs": bs, "oe": oe, "extreme": extreme,
+    }
+
+
+class IssueStore:
+    def __init__(self, lottery_code: str, capacity: int):
+        self.lottery_code = lottery_code
+        self.capacity = capacity
+        self.codes = array("q")
+        self.n1 = array("B")
+        self.n2 = array("B")
+        self.n3 = array("B")
+        self.sums = array("B")
+        self.open_ts = array("q")
+        self.loaded = False
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @property
+    def head_code(self) -> Optional[str]:
+        return str(self.codes[-1]) if self.codes else None
+
+    def append(self, issue_code: str, n1: int, n2: int, n3: int, open_time: datetime) -> bool:
+        """追加一期；同期号覆盖（上游更正），乱序到达的旧期号二分插入。"""
+        issue_code = str(issue_code)
+        if not issue_code.isdigit():
+            return False
+        code = int(issue_code)
+        ts = _to_ts(open_time)
+        s = n1 + n2 + n3
+
+        if not self.codes or code > self.codes[-1]:
+            i = len(self.codes)
+            self.codes.append(code)
+            self.n1.append(n1); self.n2.append(n2); self.n3.append(n3)
+            self.sums.append(s)
+            self.open_ts.append(ts)
+        else:
+            i = bisect_left(self.codes, code)
+            if i < len(self.codes) and self.codes[i] == code:
+                self.n1[i], self.n2[i], self.n3[i] = n1, n2, n3
+                self.sums[i] = s
+                self.open_ts[i] = ts
+                return True
+            self.codes.insert(i, code)
+            self.n1.insert(i, n1); self.n2.insert(i, n2); self.n3.insert(i, n3)
+            self.sums.insert(i, s)
+            self.open_ts.insert(i, ts)
+
+        # 超出容量 10% 再整体裁剪，摊薄 del 的搬移成本
+        over = len(self.codes) - self.capacity
+        if over > self.capacity // 10:
+            for col in (self.codes, self.n1, self.n2, self.n3, self.sums, self.open_ts):
+                del col[:over]
+        return True
+
+    def item(self, i: int) -> dict:
+        return _item(self.codes[i], self.n1[i], self.n2[i], self.n3[i], _from_ts(self.open_ts[i]))
+
+    def query(
+            self,
+            limit: int,
+            before: Optional[str] = None,
+            after: Optional[str] = None,
+            day: Optional[datetime] = None,
+    ) -> List[dict]:
+        """
+        按条件取一页，结果新→旧：
+          - before：早于该期号；after：晚于该期号（取紧挨着 after 的一页）
+          - day：当天 00:00:00 ~ 次日 00:00:00
+        """
+        lo, hi = 0, len(self.codes)
+        if before is not None:
+            hi = bisect_left(self.codes, int(before))
+        if after is not None:
+            lo = bisect_right(self.codes, int(after))
+        if day is not None:
+            start = _to_ts(day.replace(hour=0, minute=0, second=0, microsecond=0))
+            lo = max(lo, bisect_left(self.open_ts, start))
+            hi = min(hi, bisect_left(self.open_ts, start + 86400))
+        if hi <= lo or limit <= 0:
+            return []
+
+        if after is not None and before is None:
+            hi = min(hi, lo + limit)
+        else:
+            lo = max(lo, hi - limit)
+        return [self.item(i) for i in range(hi - 1, lo - 1, -1)]
+
+    def since(self, issue_code: str, limit: int) -> tuple[List[dict], bool]:
+        """
+        增量同步：返回晚于 issue_code 的期次（新→旧，最多 limit 条）。
+        第二个返回值表示是否截断（客户端落后超过 limit 期，应整页替换）。
+        """
+        lo = bisect_right(self.codes, int(issue_code))
+        hi = len(self.codes)
+        truncated = hi - lo > limit
+        lo = max(lo, hi - limit)
+        return [self.item(i) for i in range(hi - 1, lo - 1, -1)], truncated
+
+
+_stores: Dict[str, IssueStore] = {}
+
+
+def get_issue_store(lottery_code: str) -> IssueStore:
+    st = _stores.get(lottery_code)
+    if st is None:
+        st = _stores[lottery_code] = IssueStore(lottery_code, settings.ISSUE_STORE_CAPACITY)
+    return st
+
+
+def push_issue_store(item: dict) -> bool:
+    """采集到新一期后调用（item 与 Redis 历史里的 JSON 结构一致）。"""
+    return get_issue_store(item["lottery_code"]).append(
+        item["issue_code"],
+        int(item["n1"]), int(item["n2"]), int(item["n3"]),
+        datetime.strptime(item["open_time"], TIME_FMT),
+    )
+
+
+async def query_issues_db(
+        session: AsyncSession,
+        lottery_code: str,
+        limit: int,
+        before: Optional[str] = None,
+        after: Optional[str] = None,
+        day: Optional[datetime] = None,
+) -> List[dict]:
+    """与 IssueStore.query 同样的条件和顺序（新→旧），直接查库；列式存储加载完成前使用。"""
+    if limit <= 0:
+        return []
+    stmt = (
+        select(Issue.issue_code, Issue.n1, Issue.n2, Issue.n3, Issue.open_time)
+        .where(Issue.lottery_code == lottery_code, Issue.status >= 3)
+    )
+    if before is not None:
+        stmt = stmt.where(Issue.issue_code < before)
+    if after is not None:
+        stmt = stmt.where(Issue.issue_code > after)
+    if day is not None:
+        start = day.replace(hour=0, minute=0, second=0, microsecond=0)
+        stmt = stmt.where(Issue.open_time >= start, Issue.open_time < start + timedelta(days=1))
+    # after 单独出现时取紧挨着它的一页（升序取再反转）
+    ascending = after is not None and before is None
+    stmt = stmt.order_by(Issue.open_time.asc() if ascending else Issue.open_time.desc()).limit(limit)
+    rows = [r for r in (await session.execute(stmt)).all() if None not in (r.n1, r.n2, r.n3)]
+    if ascending:
+        rows.reverse()
+    return [_item(c, int(n1), int(n2), int(n3), ot) for c, n1, n2, n3, ot in rows]
+
+
+async def warmup_issue_store_from_db(session: AsyncSession, lottery_code: str) -> IssueStore:
+    """启动时加载最近 ISSUE_STORE_CAPACITY 期。"""
+    st = _stores[lottery_code] = IssueStore(lottery_code, settings.ISSUE_STORE_CAPACITY)
+    rows = (
+        await session.execute(
+            select(Issue.issue_code, Issue.n1, Issue.n2, Issue.n3, Issue.open_time)
+            .where(Issue.lottery_code == lottery_code, Issue.status >= 3)
+            .order_by(Issue.open_time.desc())
+            .limit(st.capacity)
+        )
+    ).all()
+    for issue_code, n1, n2, n3, open_time in reversed(rows):
+        if n1 is None or n2 is None or n3 is None:
+            continue
+        st.append(issue_code, int(n1), int(n2), int(n3), open_time)
+    st.loaded = True
+    return st
@@ -0,0 +1,201 @@
+# app/services/job_log_service.py
+"""
+定时任务运行记录（job_run_log）：
+  - record_job_run 只往内存缓冲追加一行，不在任务路径上写库
+  - flush_job_runs 由调度器定时调用，一条多行 INSERT 批量落库；停机时再刷一次
+  - 耗时 / 处理条数 / 异常摘要以 JSON 放在 detail 列（表里只有秒级时间列）
+  - purge_job_runs 由主节点定时调用，按任务名走 idx_job_time 分块删除超过 JOB_RUN_LOG_RETAIN_DAYS 天的记录
+"""
+import json
+import logging
+import math
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Deque, Dict, List, Optional
+
+from sqlalchemy import insert, select, delete, func, case
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.metrics import JOB_DURATION, JOB_RUNS
+from app.db.session import AsyncSessionLocal
+from app.models.job_run_log import JobRunLog
+
+logger = logging.getLogger(__name__)
+
+STATUS_OK = 1
+STATUS_FAILED = 2
+
+# 落库失败时最多保留的行数（超出丢最旧的，避免 DB 故障期间内存无限增长）
+BUFFER_MAX = 10000
+FLUSH_BATCH = 500
+
+PURGE_CHUNK = 5000
+PURGE_MAX_CHUNKS = 20       # 每个任务每轮最多删除的块数，积压较多时分几轮删完
+SUMMARY_MAX_ROWS = 20000    # 每个任务参与耗时分位数计算的最近记录数
+
+_buffer: Deque[dict] = deque(maxlen=BUFFER_MAX)
+
+
+def _detail(ms: float, items: Optional[int], error: Optional[str]) -> str:
+    d: Dict[str, object] = {"ms": round(ms, 1)}
+    if items is not None:
+        d["items"] = items
+    if error:
+        d["error"] = error[:160]
+    return json.dumps(d, ensure_ascii=False)[:255]
+
+
+def record_job_run(
+        job_name: str,
+        started_at: datetime,
+        seconds: float,
+        items: Optional[int] = None,
+        error: Optional[str] = None,
+) -> None:
+    status = STATUS_FAILED if error else STATUS_OK
+    JOB_DURATION.observe(seconds, job_name)
+    JOB_RUNS.inc(job_name, "ok" if status == STATUS_OK else "failed")
+    if not settings.JOB_RUN_LOG_ENABLED:
+        return
+    _buffer.append({
+        "job_name": job_name,
+        "status": status,
+        "detail": _detail(seconds * 1000, items, error),
+        "started_at": started_at,
+        "finished_at": started_at + timedelta(seconds=seconds),
+    })
+
+
+async def flush_job_runs() -> int:
+    """把缓冲区的运行记录批量写入 job_run_log；失败时放回缓冲区等下次。"""
+    total = 0
+    while _buffer:
+        rows: List[dict] = [_buffer.popleft() for _ in range(min(FLUSH_BATCH, len(_buffer)))]
+        try:
+            async with AsyncSessionLocal() as session:
+                await session.execute(insert(JobRunLog), rows)
+                await session.commit()
+        except Exception as e:
+            _buffer.extendleft(reversed(rows))
+            logger.warning("[job_run_log] flush failed, %d rows buffered: %s", len(_buffer), e)
+            break
+        total += len(rows)
+    return total
+
+
+async def _job_names(session: AsyncSession) -> List[str]:
+    # DISTINCT 走 idx_job_time 的最左列（MySQL 松散索引扫描），任务名只有十几个
+    return list((await session.execute(select(JobRunLog.job_name).distinct())).scalars().all())
+
+
+async def purge_job_runs() -> int:
+    """删除超过 JOB_RUN_LOG_RETAIN_DAYS 天的运行记录，返回删除数；每个任务按 (job_name, started_at) 分块删。"""
+    cutoff = datetime.now() - timedelta(days=settings.JOB_RUN_LOG_RETAIN_DAYS)
+    total = 0
+    async with AsyncSessionLocal() as s:
+        names = await _job_names(s)
+    for name in names:
+        for _ in range(PURGE_MAX_CHUNKS):
+            async with AsyncSessionLocal() as s:
+                async with s.begin():
+                    ids = (await s.execute(
+                        select(JobRunLog.id)
+                        .where(JobRunLog.job_name == name, JobRunLog.started_at < cutoff)
+                        .order_by(JobRunLog.started_at.asc())
+                        .limit(PURGE_CHUNK)
+                    )).scalars().all()
+                    if ids:
+                        await s.execute(delete(JobRunLog).where(JobRunLog.id.in_(ids)))
+            total += len(ids)
+            if len(ids) < PURGE_CHUNK:
+                break
+    return total
+
+
+# ------------------------------
+# 查询（管理端）
+# ------------------------------
+def _parse_detail(detail: Optional[str]) -> dict:
+    try:
+        d = json.loads(detail or "{}")
+    except ValueError:
+        return {}
+    return d if isinstance(d, dict) else {}
+
+
+def _percentile(sorted_vals: List[float], p: float) -> Optional[float]:
+    # 最近秩法：MySQL 5.7 没有 PERCENTILE_CONT，取回后在内存里算
+    if not sorted_vals:
+        return None
+    k = min(len(sorted_vals), max(1, math.ceil(p / 100.0 * len(sorted_vals)))) - 1
+    return sorted_vals[k]
+
+
+def _row_dict(row: JobRunLog) -> dict:
+    extra = _parse_detail(row.detail)
+    return {
+        "id": row.id,
+        "job_name": row.job_name,
+        "status": row.status,
+        "started_at": row.started_at.strftime("%Y-%m-%d %H:%M:%S"),
+        "ms": extra.get("ms"),
+        "items": extra.get("items"),
+        "error": extra.get("error"),
+    }
+
+
+async def recent_job_runs(session: AsyncSession, job_name: Optional[str], limit: int) -> List[dict]:
+    stmt = select(JobRunLog)
+    if job_name:
+        stmt = stmt.where(JobRunLog.job_name == job_name)
+    rs = await session.execute(stmt.order_by(JobRunLog.id.desc()).limit(limit))
+    return [_row_dict(r) for r in rs.scalars().all()]
+
+
+async def job_run_summary(session: AsyncSession, minutes: int, max_rows: int = SUMMARY_MAX_ROWS) -> List[dict]:
+    """
+    最近 minutes 分钟内每个任务的次数、失败数、p50/p95/max 耗时和平均处理条数。
+    逐个任务走 idx_job_time(job_name, started_at) 范围查询：次数 / 失败数在库里精确聚合；
+    耗时分位数和处理条数只取该任务最近 max_rows 条计算，超出时 truncated=true，sampled_since 为样本里最早的开始时间。
+    """
+    since = datetime.now() - timedelta(minutes=minutes)
+    out = []
+    for name in sorted(await _job_names(session)):
+        in_range = (JobRunLog.job_name == name, JobRunLog.started_at >= since)
+        runs, failed = (await session.execute(
+            select(func.count(), func.coalesce(func.sum(case((JobRunLog.status != STATUS_OK, 1), else_=0)), 0))
+            .where(*in_range)
+        )).one()
+        if not runs:
+            continue
+        rows = (await session.execute(
+            select(JobRunLog.started_at, JobRunLog.detail)
+            .where(*in_range)
+            .order_by(JobRunLog.started_at.desc())
+            .limit(max_rows)
+        )).all()
+        ms: List[float] = []
+        items = 0
+        for _, detail in rows:
+            extra = _parse_detail(detail)
+            if isinstance(extra.get("ms"), (int, float)):
+                ms.append(float(extra["ms"]))
+            if isinstance(extra.get("items"), int):
+                items += extra["items"]
+        vals = sorted(ms)
+        truncated = int(runs) > len(rows)
+        out.append({
+            "job_name": name,
+            "runs": int(runs),
+            "failed": int(failed),
+            "p50_ms": _percentile(vals, 50),
+            "p95_ms": _percentile(vals, 95),
+            "max_ms": vals[-1] if vals else None,
+            "items_total": items,
+            "items_per_run": round(items / len(rows), 2) if rows else 0,
+            "sampled": len(rows),
+            "truncated": truncated,
+            "sampled_since": rows[-1][0].strftime("%Y-%m-%d %H:%M:%S") if truncated else None,
+        })
+    return out
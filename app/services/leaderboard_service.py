@@ -0,0 +1,137 @@
+# app/services/leaderboard_service.py
+"""
+排行榜（Redis ZSET，按天 / 按周分桶）：
+  - volume：下单 +金额、撤单 -金额（order.placed / order.cancelled 事件，按发生时间分桶）
+  - profit：每批 orders.settled 事件按用户汇总（派彩 - 本金）后一次 pipeline 写入
+读取 ZREVRANGE / ZREVRANK 都是 O(log n)，不再对订单表 GROUP BY。
+分数以“分”为单位的整数累加，避免浮点累计误差；读出时再除以 100。
+订阅者路径上事件 ID 与分数在同一个 MULTI 里写入（先查过的 ID 跳过），重复投递不会重复计分；
+Redis 写失败抛出，由 outbox 退避重试，不影响下单 / 结算事务。
+"""
+import logging
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+from app.db.redis import r
+from app.constants import k_leaderboard, k_outbox_applied
+from app.services.outbox_service import EVENT_ID, subscribe, TOPIC_ORDER_PLACED, TOPIC_ORDER_CANCELLED
+
+logger = logging.getLogger(__name__)
+
+BOARDS = ("profit", "volume")
+PERIODS = ("day", "week")
+# 分桶保留时间：当天/当周结束后还能查上一期
+_TTL = {"day": 3 * 86400, "week": 15 * 86400}
+# 已处理事件 ID：每 APPLIED_BUCKET 个 ID 一个 SET；只需覆盖事件的重试期（投递完成后不会再投）
+APPLIED_BUCKET = 100_000
+APPLIED_TTL = 3 * 86400
+
+
+def _bucket(period: str, now: Optional[datetime] = None) -> str:
+    now = now or datetime.now()
+    if period == "day":
+        return now.strftime("%Y%m%d")
+    year, week, _ = now.isocalendar()
+    return f"{year}W{week:02d}"
+
+
+def _keys(board: str, now: Optional[datetime] = None) -> List[Tuple[str, int]]:
+    return [(k_leaderboard(board, p, _bucket(p, now)), _TTL[p]) for p in PERIODS]
+
+
+def _applied_key(handler: str, event_id: int) -> str:
+    return k_outbox_applied(handler, int(event_id) // APPLIED_BUCKET)
+
+
+async def fresh_events(handler: str, events: List[dict]) -> List[dict]:
+    """过滤掉 handler 已计过分的事件（没有事件 ID 的 payload 原样保留）。"""
+    ids = [e[EVENT_ID] for e in events if EVENT_ID in e]
+    if not ids:
+        return events
+    pipe = r.pipeline(transaction=False)
+    for eid in ids:
+        pipe.sismember(_applied_key(handler, eid), str(eid))
+    seen = {eid for eid, hit in zip(ids, await pipe.execute()) if hit}
+    if seen:
+        logger.warning("[leaderboard] %s skipped %d already applied events", handler, len(seen))
+    return [e for e in events if e.get(EVENT_ID) not in seen]
+
+
+def event_ids(events: List[dict]) -> List[int]:
+    return [e[EVENT_ID] for e in events if EVENT_ID in e]
+
+
+async def _incr(
+        board: str, deltas: Mapping[int, Decimal], at: Optional[datetime] = None,
+        handler: Optional[str] = None, applied: Sequence[int] = (),
+) -> None:
+    """分数与已处理事件 ID（handler / applied）在同一个 MULTI 里写入。"""
+    if not deltas and not applied:
+        return
+    pipe = r.pipeline(transaction=True)
+    for key, ttl in _keys(board, at):
+        for uid, amount in deltas.items():
+            cents = int(Decimal(amount) * 100)
+            if cents:
+                pipe.zincrby(key, cents, str(uid))
+        pipe.expire(key, ttl)
+    if handler:
+        for eid in applied:
+            key = _applied_key(handler, eid)
+            pipe.sadd(key, str(eid))
+            pipe.expire(key, APPLIED_TTL)
+    await pipe.execute()
+
+
+async def add_volume(user_id: int, amount: Decimal, at: Optional[datetime] = None) -> None:
+    """at：计入哪一天/周（撤单时传下单时间，从原来的桶里扣回）。"""
+    await _incr("volume", {user_id: amount}, at)
+
+
+async def add_profit(
+        deltas: Mapping[int, Decimal], handler: Optional[str] = None, applied: Sequence[int] = (),
+) -> None:
+    """订阅者传 handler / applied（本批事件 ID），与分数一起记下，重复投递时由 fresh_events 跳过。"""
+    await _incr("profit", deltas, handler=handler, applied=applied)
+
+
+async def top(board: str, period: str, limit: int) -> List[Tuple[int, float]]:
+    rows = await r.zrevrange(k_leaderboard(board, period, _bucket(period)), 0, limit - 1, withscores=True)
+    return [(int(uid), score / 100) for uid, score in rows]
+
+
+async def rank_of(board: str, period: str, user_id: int) -> Dict[str, Optional[float]]:
+    key = k_leaderboard(board, period, _bucket(period))
+    pipe = r.pipeline(transaction=False)
+    pipe.zrevrank(key, str(user_id))
+    pipe.zscore(key, str(user_id))
+    rank, score = await pipe.execute()
+    return {"rank": None if rank is None else int(rank) + 1, "score": None if score is None else float(score) / 100}
+
+
+# ------------------------------
+# outbox 订阅：下单 / 撤单的投注额
+# ------------------------------
+async def _volume_by_day(events: list, sign: int) -> None:
+    """同一天的事件合并成一次 MULTI（日桶 / 周桶都由这一天决定），连同这些事件的 ID；机器人订单不上榜。"""
+    by_day: Dict[str, Tuple[datetime, Dict[int, Decimal], List[dict]]] = {}
+    for e in await fresh_events("leaderboard_volume", [e for e in events if not e.get("robot")]):
+        at = datetime.fromisoformat(e["at"]) if e.get("at") else datetime.now()
+        _, deltas, day_events = by_day.setdefault(at.strftime("%Y%m%d"), (at, {}, []))
+        uid = int(e["user_id"])
+        deltas[uid] = deltas.get(uid, Decimal("0")) + sign * Decimal(str(e["amount"]))
+        day_events.append(e)
+    for at, deltas, day_events in by_day.values():
+        await _incr("volume", deltas, at, handler="leaderboard_volume", applied=event_ids(day_events))
+
+
+@subscribe(TOPIC_ORDER_PLACED, "leaderboard_volume")
+async def _on_order_placed(events: list):
+    await _volume_by_day(events, 1)
+
+
+@subscribe(TOPIC_ORDER_CANCELLED, "leaderboard_volume")
+async def _on_order_cancelled(events: list):
+    # at 是原下单时间：从原来的桶里扣回
+    await _volume_by_day(events, -1)
@@ -0,0 +1,91 @@
+# app/services/order_history_service.py
+"""
+用户订单历史（按订单 ID 倒序、before_id 游标翻页），热表 + 归档表合并：
+  - 先查热表 orders；本页落在归档水位（归档表最大订单 ID）之下、或热表不足一页时才回查 orders_archive
+  - 两边按 ID 合并取前 limit 条，子单各自到 order_item / order_item_archive 取
+近期订单的翻页只查热表；翻到旧游标时透明地读归档。
+"""
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.orders import Orders, OrderItem, OrdersArchive, OrderItemArchive
+
+# 归档水位的进程内缓存：归档任务只搬 N 天前的订单，短暂滞后不影响近期翻页
+_ARCHIVE_MAX_TTL = 10.0
+_archive_max: tuple[float, Optional[int]] = (float("-inf"), None)
+
+
+async def archived_max_id(session: AsyncSession) -> Optional[int]:
+    """归档表中最大的订单 ID（缓存 10 秒；归档表为空时 None）。"""
+    global _archive_max
+    ts, v = _archive_max
+    if time.monotonic() - ts < _ARCHIVE_MAX_TTL:
+        return v
+    v = await session.scalar(select(func.max(OrdersArchive.id)))
+    _archive_max = (time.monotonic(), v)
+    return v
+
+
+async def _load_page(
+        session: AsyncSession, order_model, item_model, user_id: int,
+        limit: int, before_id: Optional[int], after_id: Optional[int] = None,
+) -> List[dict]:
+    stmt = select(
+        order_model.id, order_model.lottery_code, order_model.issue_code, order_model.total_amount, order_model.status,
+    ).where(order_model.user_id == user_id)
+    if before_id is not None:
+        stmt = stmt.where(order_model.id < before_id)
+    if after_id is not None:
+        stmt = stmt.where(order_model.id > after_id)
+    orders = (await session.execute(stmt.order_by(order_model.id.desc()).limit(limit))).all()
+    if not orders:
+        return []
+
+    rs = await session.execute(
+        select(item_model.order_id, item_model.id, item_model.selection, item_model.stake_amount, item_model.odds)
+        .where(item_model.order_id.in_([o.id for o in orders]))
+    )
+    by_order: Dict[int, List[dict]] = {}
+    for order_id, item_id, selection, stake, odds in rs.all():
+        by_order.setdefault(order_id, []).append({
+            "id": item_id,
+            "play": str(selection),
+            "amount": float(stake),
+            "odds": float(odds),
+        })
+
+    return [
+        {
+            "id": o.id,
+            "lottery_code": o.lottery_code,
+            "issue_code": o.issue_code,
+            "total_amount": float(o.total_amount),
+            "status": int(o.status),
+            "items": by_order.get(o.id, []),
+        }
+        for o in orders
+    ]
+
+
+async def load_order_history(session: AsyncSession, user_id: int, limit: int, before_id: Optional[int] = None) -> List[dict]:
+    hot = await _load_page(session, Orders, OrderItem, user_id, limit, before_id)
+
+    watermark = await archived_max_id(session)
+    if watermark is None:
+        return hot
+    # 热表满页且整页都在水位之上：归档表里不可能有更靠前的订单
+    full = len(hot) >= limit
+    if full and hot[-1]["id"] > watermark:
+        return hot
+
+    cold = await _load_page(
+        session, OrdersArchive, OrderItemArchive, user_id, limit, before_id,
+        after_id=hot[-1]["id"] if full else None,
+    )
+    if not cold:
+        return hot
+    merged = sorted(hot + cold, key=lambda o: o["id"], reverse=True)
+    return merged[:limit]
@@ -0,0 +1,308 @@
+# app/services/outbox_service.py
+"""
+事务发件箱（outbox）：
+  - 业务代码在自己的事务里 add_event(session, topic, payload)，与业务变更一起提交或一起回滚
+  - 主节点的投递任务按 ID 顺序批量取出到期事件，按 topic 分组交给订阅者（@subscribe），
+    订阅者一次拿到同一 topic 的一批 payload（便于合并写 Redis / DB）
+  - 某个订阅者失败：把这批事件对半拆开重投，找出真正出错的事件，同批其他事件不受牵连；
+    出错的事件记下失败原因，已成功的订阅者记进 done_handlers，退避后只重试失败的；
+    超过 OUTBOX_MAX_ATTEMPTS 次标记为放弃（status=2）并打 ERROR 日志
+投递是“至少一次”（订阅者提交后、done_handlers 落库前崩溃会再投一次），订阅者需自己做到幂等：
+  - 覆盖型（按期号覆盖 Redis、按状态复核）天然幂等
+  - 增量型写库（用户累计、每期盈亏）在自己的事务里 claim_events，登记 (event_id, handler) 并跳过处理过的事件
+  - 增量型写 Redis（排行榜）在同一个 MULTI 里记下事件 ID（见 leaderboard_service）
+请求 / 任务路径只多一条 INSERT，新增订阅者不增加它们的延迟。
+"""
+import asyncio
+import datetime as dt
+import logging
+from typing import Awaitable, Callable, Dict, List, Set, Tuple
+
+import orjson
+from sqlalchemy import bindparam, delete, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.metrics import OUTBOX_DISPATCHED, OUTBOX_FAILED, OUTBOX_LAG, OUTBOX_PENDING, register_collector
+from app.core.responses import dumps
+from app.db.session import AsyncSessionLocal, AsyncReadSessionLocal
+from app.models.outbox_event import OutboxEvent, OutboxApplied
+
+logger = logging.getLogger(__name__)
+
+TOPIC_ISSUE_OPENED = "issue.opened"        # 开奖入库：{"item": 开奖结果, "next": 下一期 open/close}
+TOPIC_ORDERS_SETTLED = "orders.settled"    # 结算提交：{"orders": [{order_id, user_id, issue_code, stake, win, status, ...}]}
+TOPIC_ORDER_PLACED = "order.placed"        # 下单提交：{"user_id", "order_id", "lottery_code", "issue_code", "amount", "at"}
+TOPIC_ORDER_CANCELLED = "order.cancelled"  # 撤单提交：{"user_id", "order_id", "lottery_code", "issue_code", "amount", "at"（原下单时间）}
+TOPIC_ISSUE_CORRECTED = "issue.corrected"  # 已开奖期次结果被更正：{"batch_id", "item": 更正后的开奖结果}
+TOPIC_ORDERS_RESETTLED = "orders.resettled"  # 重新结算一块提交：{"batch_id", "issue_code", "users": {user_id: 派彩变化}}
+
+STATUS_PENDING = 0
+STATUS_DONE = 1
+STATUS_DEAD = 2
+
+# 投递时注入每个 payload 的事件 ID（订阅者据此去重）
+EVENT_ID = "_event_id"
+
+Handler = Callable[[List[dict]], Awaitable[None]]
+_handlers: Dict[str, List[Tuple[str, Handler]]] = {}
+
+
+def subscribe(topic: str, name: str) -> Callable[[Handler], Handler]:
+    """注册订阅者；name 用于记录成功 / 失败（同一 topic 内唯一，改名会导致重试时重复执行）。"""
+    def deco(fn: Handler) -> Handler:
+        subs = _handlers.setdefault(topic, [])
+        if all(n != name for n, _ in subs):
+            subs.append((name, fn))
+        return fn
+    return deco
+
+
+def add_event(session: AsyncSession, topic: str, payload: dict) -> None:
+    """在调用方的事务里追加一条事件（随业务一起提交）。"""
+    now = dt.datetime.now()
+    session.add(OutboxEvent(topic=topic, payload=dumps(payload).decode(), next_attempt_at=now, created_at=now))
+
+
+async def claim_events(session: AsyncSession, handler: str, events: List[dict]) -> List[dict]:
+    """
+    增量型写库订阅者在自己的事务里调用：返回该 handler 还没处理过的事件，并登记它们。
+    登记与增量写一起提交 / 回滚，重复投递的事件不会再计一次。没有事件 ID 的 payload（直接调用）原样返回。
+    """
+    ids = [e[EVENT_ID] for e in events if EVENT_ID in e]
+    if not ids:
+        return events
+    seen = set((await session.execute(
+        select(OutboxApplied.event_id).where(OutboxApplied.handler == handler, OutboxApplied.event_id.in_(ids))
+    )).scalars().all())
+    fresh = [e for e in events if e.get(EVENT_ID) not in seen]
+    claimed = [{"event_id": e[EVENT_ID], "handler": handler} for e in fresh if EVENT_ID in e]
+    if claimed:
+        await session.execute(insert(OutboxApplied), claimed)
+    if seen:
+        logger.warning("[outbox] %s skipped %d already applied events", handler, len(events) - len(fresh))
+    return fresh
+
+
+# ------------------------------
+# 投递
+# ------------------------------
+_lock = asyncio.Lock()
+_kicked: Set[asyncio.Task] = set()
+
+
+def _backoff(attempts: int) -> dt.timedelta:
+    return dt.timedelta(seconds=min(300, 2 ** attempts))
+
+
+async def dispatch_outbox_once() -> int:
+    """投递一批到期事件，返回本批处理的事件数（含失败重排的）。同一进程内串行。"""
+    async with _lock:
+        return await _dispatch_batch()
+
+
+async def _deliver(topic: str, name: str, fn: Handler, todo: List[Tuple[int, dict]],
+                   errors: Dict[int, str]) -> List[int]:
+    """
+    把一批事件交给订阅者，返回成功的事件 ID。
+    整批失败时对半拆开分别重投，直到单个事件：只有真正出错的事件记失败、累计 attempts，
+    同批的其他事件照常完成（订阅者本身幂等，失败的那次调用已整体回滚或可覆盖重做）。
+    """
+    try:
+        await fn([p for _, p in todo])
+        return [eid for eid, _ in todo]
+    except Exception as e:
+        if len(todo) == 1:
+            OUTBOX_FAILED.inc(topic, name)
+            logger.exception("[outbox] %s/%s failed for event %s: %s", topic, name, todo[0][0], e)
+            errors[todo[0][0]] = f"{name}: {type(e).__name__}: {e}"[:255]
+            return []
+        logger.warning("[outbox] %s/%s failed for %d events, splitting: %s", topic, name, len(todo), e)
+    mid = len(todo) // 2
+    return (await _deliver(topic, name, fn, todo[:mid], errors)
+            + await _deliver(topic, name, fn, todo[mid:], errors))
+
+
+async def _dispatch_batch() -> int:
+    now = dt.datetime.now()
+    async with AsyncSessionLocal() as s:
+        rows = (await s.execute(
+            select(OutboxEvent.id, OutboxEvent.topic, OutboxEvent.payload, OutboxEvent.attempts,
+                   OutboxEvent.done_handlers, OutboxEvent.created_at)
+            .where(OutboxEvent.status == STATUS_PENDING, OutboxEvent.next_attempt_at <= now)
+            .order_by(OutboxEvent.id.asc())
+            .limit(settings.OUTBOX_BATCH)
+        )).all()
+    if not rows:
+        return 0
+
+    # event_id -> 已成功的订阅者 / 本轮失败原因
+    done: Dict[int, Set[str]] = {r.id: set(filter(None, (r.done_handlers or "").split(","))) for r in rows}
+    errors: Dict[int, str] = {}
+    by_topic: Dict[str, List[Tuple[int, dict]]] = {}
+    for r in rows:
+        try:
+            payload = orjson.loads(r.payload)
+            payload[EVENT_ID] = r.id
+            by_topic.setdefault(r.topic, []).append((r.id, payload))
+        except Exception as e:
+            errors[r.id] = f"bad payload: {e}"
+
+    for topic, events in by_topic.items():
+        for name, fn in _handlers.get(topic, []):
+            todo = [(eid, p) for eid, p in events if name not in done[eid]]
+            if not todo:
+                continue
+            for eid in await _deliver(topic, name, fn, todo, errors):
+                done[eid].add(name)
+
+    finished = dt.datetime.now()
+    ok_params, retry_params = [], []
+    for r in rows:
+        if r.id not in errors:
+            ok_params.append({"b_id": r.id})
+            OUTBOX_DISPATCHED.inc(r.topic)
+            if r.created_at is not None:
+                OUTBOX_LAG.observe(max(0.0, (finished - r.created_at).total_seconds()), r.topic)
+            continue
+        attempts = int(r.attempts or 0) + 1
+        dead = attempts >= settings.OUTBOX_MAX_ATTEMPTS
+        if dead:
+            logger.error("[outbox] event %s (%s) dropped after %d attempts: %s", r.id, r.topic, attempts, errors[r.id])
+        retry_params.append({
+            "b_id": r.id,
+            "b_status": STATUS_DEAD if dead else STATUS_PENDING,
+            "b_attempts": attempts,
+            "b_done": ",".join(sorted(done[r.id]))[:255],
+            "b_error": errors[r.id],
+            "b_next": finished + _backoff(attempts),
+        })
+
+    t = OutboxEvent.__table__
+    async with AsyncSessionLocal() as s:
+        async with s.begin():
+            if ok_params:
+                await s.execute(
+                    update(t).where(t.c.id == bindparam("b_id")).values(status=STATUS_DONE, dispatched_at=finished),
+                    ok_params,
+                )
+            if retry_params:
+                await s.execute(
+                    update(t).where(t.c.id == bindparam("b_id")).values(
+                        status=bindparam("b_status"), attempts=bindparam("b_attempts"),
+                        done_handlers=bindparam("b_done"), last_error=bindparam("b_error"),
+                        next_attempt_at=bindparam("b_next"),
+                    ),
+                    retry_params,
+                )
+    return len(rows)
+
+
+async def drain_outbox() -> int:
+    """连续投递直到没有到期事件（或本轮全是失败重排的）。"""
+    total = 0
+    async with _lock:
+        while True:
+            n = await _dispatch_batch()
+            total += n
+            if n < settings.OUTBOX_BATCH:
+                return total
+
+
+async def _drain_logged() -> None:
+    try:
+        await drain_outbox()
+    except Exception as e:
+        logger.exception("[outbox] drain failed: %s", e)
+
+
+def kick_outbox() -> None:
+    """
+    事务提交后立即起一轮投递，不等下一次轮询。
+    只在主节点任务（采集 / 结算）里调用；请求路径写入的事件由主节点轮询投递。
+    """
+    try:
+        task = asyncio.get_running_loop().create_task(_drain_logged())
+    except RuntimeError:
+        return
+    _kicked.add(task)
+    task.add_done_callback(_kicked.discard)
+
+
+async def stop_outbox(timeout: float) -> None:
+    """shutdown 时调用：等 kick_outbox 起的投递最多 timeout 秒，仍未结束的取消（事件留在表里，由下一个主节点重投）。"""
+    pending = [t for t in _kicked if not t.done()]
+    if not pending:
+        return
+    _, still = await asyncio.wait(pending, timeout=timeout)
+    for t in still:
+        t.cancel()
+    if still:
+        logger.warning("[outbox] cancelled %d kicked dispatch(es) after %ss", len(still), timeout)
+        await asyncio.gather(*still, return_exceptions=True)
+
+
+async def purge_outbox() -> int:
+    """删除已投递超过 OUTBOX_RETAIN_HOURS 小时的事件及其去重记录（每次最多 5000 条），返回删除数。"""
+    cutoff = dt.datetime.now() - dt.timedelta(hours=settings.OUTBOX_RETAIN_HOURS)
+    async with AsyncSessionLocal() as s:
+        async with s.begin():
+            ids = (await s.execute(
+                select(OutboxEvent.id)
+                .where(OutboxEvent.status == STATUS_DONE, OutboxEvent.dispatched_at < cutoff)
+                .order_by(OutboxEvent.id.asc())
+                .limit(5000)
+            )).scalars().all()
+            if ids:
+                await s.execute(delete(OutboxApplied).where(OutboxApplied.event_id.in_(ids)))
+                await s.execute(delete(OutboxEvent).where(OutboxEvent.id.in_(ids)))
+    return len(ids)
+
+
+async def outbox_summary(session: AsyncSession, limit: int = 20) -> dict:
+    """各 topic / 状态的事件数、最早未投递事件的等待时长、最近的失败事件。"""
+    rs = await session.execute(
+        select(OutboxEvent.topic, OutboxEvent.status, func.count(), func.min(OutboxEvent.created_at))
+        .group_by(OutboxEvent.topic, OutboxEvent.status)
+    )
+    now = dt.datetime.now()
+    counts = []
+    for topic, status, n, oldest in rs.all():
+        counts.append({
+            "topic": topic,
+            "status": int(status),
+            "count": int(n),
+            "oldest_age_seconds": round((now - oldest).total_seconds(), 1) if oldest and status != STATUS_DONE else None,
+        })
+    failing = await session.execute(
+        select(OutboxEvent.id, OutboxEvent.topic, OutboxEvent.status, OutboxEvent.attempts,
+               OutboxEvent.done_handlers, OutboxEvent.last_error, OutboxEvent.next_attempt_at)
+        .where(OutboxEvent.status != STATUS_DONE, OutboxEvent.attempts > 0)
+        .order_by(OutboxEvent.id.desc())
+        .limit(limit)
+    )
+    return {
+        "counts": counts,
+        "failing": [
+            {
+                "id": r.id, "topic": r.topic, "status": int(r.status), "attempts": int(r.attempts),
+                "done_handlers": r.done_handlers, "last_error": r.last_error,
+                "next_attempt_at": r.next_attempt_at.strftime("%Y-%m-%d %H:%M:%S") if r.next_attempt_at else None,
+            }
+            for r in failing.all()
+        ],
+    }
+
+
+@register_collector
+async def _collect_outbox_pending():
+    """/metrics 抓取时统计各 topic 待投递 / 已放弃的事件数。"""
+    async with AsyncReadSessionLocal() as session:
+        rs = await session.execute(
+            select(OutboxEvent.topic, OutboxEvent.status, func.count())
+            .where(OutboxEvent.status.in_([STATUS_PENDING, STATUS_DEAD]))
+            .group_by(OutboxEvent.topic, OutboxEvent.status)
+        )
+        OUTBOX_PENDING.clear()
+        for topic, status, n in rs.all():
+            OUTBOX_PENDING.set(n, topic, "pending" if status == STATUS_PENDING else "dead")
@@ -0,0 +1,117 @@
+# app/services/resettle_service.py
+"""
+开奖结果更正的记录与查询（重新结算本身见 app/tasks/resettle.py）：
+  - record_result_correction：采集写库发现已开奖期次的号码变了时，在同一事务里记一个更正批次 + issue.corrected 事件
+  - recent_batches / batch_items：管理端查看批次与逐子单的改判明细
+"""
+from typing import List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.resettle import ResettleBatch, ResettleItemLog
+from app.services.outbox_service import add_event, TOPIC_ISSUE_CORRECTED
+
+BATCH_PENDING = 0
+BATCH_DONE = 1
+BATCH_FAILED = 2
+BATCH_SUPERSEDED = 3
+
+
+def _nums(n1, n2, n3) -> str:
+    return f"{n1},{n2},{n3}"
+
+
+async def record_result_correction(db: AsyncSession, row, old: tuple) -> ResettleBatch:
+    """row 是已更新为新号码的 Issue，old = (n1, n2, n3, sum_value)；不提交，随调用方事务一起落库。"""
+    batch = ResettleBatch(
+        lottery_code=row.lottery_code,
+        issue_code=row.issue_code,
+        old_nums=_nums(*old[:3]),
+        old_sum=int(old[3] if old[3] is not None else sum(old[:3])),
+        new_nums=_nums(row.n1, row.n2, row.n3),
+        new_sum=int(row.sum_value),
+        status=BATCH_PENDING,
+    )
+    db.add(batch)
+    await db.flush()
+    add_event(db, TOPIC_ISSUE_CORRECTED, {
+        "batch_id": batch.id,
+        "item": {
+            "lottery_code": row.lottery_code,
+            "issue_code": row.issue_code,
+            "n1": row.n1,
+            "n2": row.n2,
+            "n3": row.n3,
+            "sum_value": row.sum_value,
+            "bs": row.bs,
+            "oe": row.oe,
+            "extreme": row.extreme,
+            "open_time": row.open_time.strftime("%Y-%m-%d %H:%M:%S"),
+        },
+    })
+    return batch
+
+
+def _fmt_dt(v) -> Optional[str]:
+    return v.strftime("%Y-%m-%d %H:%M:%S") if v else None
+
+
+def _batch_dict(b: ResettleBatch) -> dict:
+    return {
+        "id": b.id,
+        "lottery_code": b.lottery_code,
+        "issue_code": b.issue_code,
+        "old_nums": b.old_nums,
+        "old_sum": b.old_sum,
+        "new_nums": b.new_nums,
+        "new_sum": b.new_sum,
+        "status": b.status,
+        "orders": b.order_count,
+        "items": b.item_count,
+        "users": b.user_count,
+        "delta_amount": float(b.delta_amount or 0),
+        "message": b.message,
+        "created_at": _fmt_dt(b.created_at),
+        "finished_at": _fmt_dt(b.finished_at),
+    }
+
+
+async def recent_batches(
+        session: AsyncSession, code: Optional[str], issue: Optional[str], limit: int,
+) -> List[dict]:
+    stmt = select(ResettleBatch).order_by(ResettleBatch.id.desc()).limit(limit)
+    if code:
+        stmt = stmt.where(ResettleBatch.lottery_code == code)
+    if issue:
+        stmt = stmt.where(ResettleBatch.issue_code == issue)
+    return [_batch_dict(b) for b in (await session.execute(stmt)).scalars()]
+
+
+async def get_batch(session: AsyncSession, batch_id: int) -> Optional[dict]:
+    b = await session.get(ResettleBatch, batch_id)
+    return _batch_dict(b) if b else None
+
+
+async def batch_items(session: AsyncSession, batch_id: int, after_id: int, limit: int) -> List[dict]:
+    """改判明细，按 ID 正序翻页（传上一页最后一条的 id 作为 after_id）。"""
+    rows = (await session.execute(
+        select(ResettleItemLog)
+        .where(ResettleItemLog.batch_id == batch_id, ResettleItemLog.id > after_id)
+        .order_by(ResettleItemLog.id.asc())
+        .limit(limit)
+    )).scalars()
+    return [
+        {
+            "id": x.id,
+            "order_id": x.order_id,
+            "item_id": x.item_id,
+            "user_id": x.user_id,
+            "old_result": x.old_result,
+            "new_result": x.new_result,
+            "old_win": float(x.old_win),
+            "new_win": float(x.new_win),
+            "delta": round(float(x.new_win) - float(x.old_win), 2),
+        }
+        for x in rows
+    ]
@@ -0,0 +1,142 @@
+# app/services/risk_service.py
+"""
+下单风控闸门（在任何 DB 操作之前执行）：
+  - risk_user_flag 的进程内缓存：命中 RISK_BLOCK_FLAGS 直接拒绝（403），定时全量刷新
+  - 一个 Lua 脚本一次往返完成：
+      · 每用户 / 每 IP 的滑动窗口下单次数（ZSET 存时间戳）
+      · 每用户每期累计投注额（整数“分”），通过后预占额度
+    超频 429，超额 400；被拒的请求不计入窗口
+  - 下单失败时 release_stake 归还预占额度；撤单同样归还
+Redis 不可用时放行（只记日志），不因风控组件故障停止下单。
+"""
+import logging
+import time
+import uuid
+from decimal import Decimal
+from typing import Dict, FrozenSet, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.core.metrics import RISK_REJECTED
+from app.db.redis import r
+from app.db.session import AsyncReadSessionLocal
+from app.models.risk_user_flag import RiskUserFlag
+from app.constants import k_risk_rate_user, k_risk_rate_ip, k_risk_stake
+
+logger = logging.getLogger(__name__)
+
+# KEYS: 用户窗口, IP 窗口, 本期额度
+# ARGV: now_ms, window_ms, 用户上限, IP 上限, member, 金额(分), 额度上限(分), 额度 TTL(秒)
+# 返回：0 通过 / 1 用户超频 / 2 IP 超频 / 3 超过单期额度
+_GATE_LUA = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local user_limit = tonumber(ARGV[3])
+local ip_limit = tonumber(ARGV[4])
+local cents = tonumber(ARGV[6])
+local stake_limit = tonumber(ARGV[7])
+redis.call('zremrangebyscore', KEYS[1], '-inf', now - window)
+redis.call('zremrangebyscore', KEYS[2], '-inf', now - window)
+if user_limit > 0 and redis.call('zcard', KEYS[1]) >= user_limit then return 1 end
+if ip_limit > 0 and redis.call('zcard', KEYS[2]) >= ip_limit then return 2 end
+if stake_limit > 0 and (tonumber(redis.call('get', KEYS[3]) or '0') + cents) > stake_limit then return 3 end
+redis.call('zadd', KEYS[1], now, ARGV[5])
+redis.call('pexpire', KEYS[1], window)
+redis.call('zadd', KEYS[2], now, ARGV[5])
+redis.call('pexpire', KEYS[2], window)
+if stake_limit > 0 then
+  redis.call('incrby', KEYS[3], cents)
+  redis.call('expire', KEYS[3], tonumber(ARGV[8]))
+end
+return 0
+"""
+
+# 额度 key 已过期时不再扣减，避免留下没有 TTL 的负数 key
+_RELEASE_LUA = """
+if redis.call('exists', KEYS[1]) == 1 then
+  return redis.call('decrby', KEYS[1], ARGV[1])
+end
+return 0
+"""
+
+STAKE_TTL_SECONDS = 2 * 86400
+
+_REJECT = {
+    1: (429, "user_rate", "下单过于频繁，请稍后再试"),
+    2: (429, "ip_rate", "下单过于频繁，请稍后再试"),
+    3: (400, "stake_limit", "本期累计投注额超过上限"),
+}
+
+
+# ------------------------------
+# risk_user_flag 缓存
+# ------------------------------
+_block_flags: FrozenSet[str] = frozenset(f.strip() for f in settings.RISK_BLOCK_FLAGS.split(",") if f.strip())
+_flags: Dict[int, FrozenSet[str]] = {}
+
+
+async def refresh_risk_flags() -> int:
+    """全量加载 risk_user_flag（表很小）；返回被标记的用户数。"""
+    global _flags
+    async with AsyncReadSessionLocal() as session:
+        rs = await session.execute(select(RiskUserFlag.user_id, RiskUserFlag.flag_code))
+        acc: Dict[int, set] = {}
+        for uid, code in rs.all():
+            acc.setdefault(int(uid), set()).add(str(code))
+    _flags = {uid: frozenset(codes) for uid, codes in acc.items()}
+    return len(_flags)
+
+
+def user_flags(user_id: int) -> FrozenSet[str]:
+    return _flags.get(user_id, frozenset())
+
+
+# ------------------------------
+# 闸门
+# ------------------------------
+def _cents(amount: Decimal) -> int:
+    return int(Decimal(amount) * 100)
+
+
+async def check_bet(user_id: int, ip: str, code: str, issue: str, total: Decimal) -> bool:
+    """
+    通过则返回是否预占了单期额度（调用方失败时据此 release_stake）；不通过抛 HTTPException。
+    """
+    if not settings.RISK_ENABLED:
+        return False
+    if user_flags(user_id) & _block_flags:
+        RISK_REJECTED.inc("flag")
+        raise HTTPException(403, "账户已被限制下注")
+
+    stake_limit = settings.RISK_MAX_STAKE_PER_ISSUE * 100
+    try:
+        res = await r.eval(
+            _GATE_LUA, 3,
+            k_risk_rate_user(user_id), k_risk_rate_ip(ip or "-"), k_risk_stake(code, issue, user_id),
+            int(time.time() * 1000), settings.RISK_WINDOW_MS,
+            settings.RISK_USER_BETS_PER_WINDOW, settings.RISK_IP_BETS_PER_WINDOW,
+            uuid.uuid4().hex, _cents(total), stake_limit, STAKE_TTL_SECONDS,
+        )
+    except Exception as e:
+        logger.warning("[risk] gate unavailable, allowing bet: %s", e)
+        return False
+
+    res = int(res)
+    if res:
+        status, reason, msg = _REJECT[res]
+        RISK_REJECTED.inc(reason)
+        headers: Optional[dict] = {"Retry-After": "1"} if status == 429 else None
+        raise HTTPException(status, msg, headers=headers)
+    return stake_limit > 0
+
+
+async def release_stake(user_id: int, code: str, issue: str, total: Decimal) -> None:
+    """归还单期额度（下单失败 / 撤单）。"""
+    if not settings.RISK_ENABLED or settings.RISK_MAX_STAKE_PER_ISSUE <= 0:
+        return
+    try:
+        await r.eval(_RELEASE_LUA, 1, k_risk_stake(code, issue, user_id), _cents(total))
+    except Exception as e:
+        logger.warning("[risk] release stake failed: %s", e)
@@ -0,0 +1,118 @@
+# app/services/runtime_config_service.py
+"""
+运行时参数的加载 / 修改 / 跨进程失效（快照与默认值见 app.core.runtime）：
+  - load_runtime_config：全量读 sys_kv_config 的有效行 → runtime.apply（启动时和定时兜底各调一次）
+  - set_runtime_config：校验 → upsert 一行 → 本进程立即生效 → PUBLISH 失效消息
+  - runtime_config_listener：每个 worker 一个后台任务，收到消息即重新全量加载
+    （表很小，全量读比按键增量更简单，也不怕消息乱序）；Redis 断开时隔几秒重连
+"""
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.constants import k_runtime_config_channel
+from app.core.runtime import TUNABLES, runtime, apply
+from app.db.redis import r
+from app.db.session import AsyncSessionLocal
+from app.models.sys_kv_config import SysKvConfig
+
+logger = logging.getLogger(__name__)
+
+LISTENER_RETRY_SECONDS = 5
+
+
+async def _active_values(session: AsyncSession) -> Dict[str, str]:
+    rows = await session.execute(
+        select(SysKvConfig.k, SysKvConfig.v)
+        .where(SysKvConfig.k.in_(list(TUNABLES)), SysKvConfig.is_active == 1)
+    )
+    return {k: v for k, v in rows.all()}
+
+
+async def load_runtime_config() -> Dict[str, tuple]:
+    """全量读表并刷新快照；返回变化的键。"""
+    async with AsyncSessionLocal() as session:
+        values = await _active_values(session)
+    return apply(values)
+
+
+async def list_runtime_config(session: AsyncSession) -> List[dict]:
+    rows = {
+        row.k: row for row in (await session.execute(
+            select(SysKvConfig).where(SysKvConfig.k.in_(list(TUNABLES)))
+        )).scalars()
+    }
+    items = []
+    for name, t in TUNABLES.items():
+        row = rows.get(name)
+        items.append({
+            "key": name,
+            "value": getattr(runtime, name),
+            "default": t.default,
+            "min": t.min,
+            "max": t.max,
+            "doc": t.doc,
+            "stored": None if row is None else {
+                "v": row.v,
+                "is_active": bool(row.is_active),
+                "remark": row.remark,
+                "updated_at": row.updated_at.strftime("%Y-%m-%d %H:%M:%S") if row.updated_at else None,
+            },
+        })
+    return items
+
+
+async def set_runtime_config(
+        session: AsyncSession, key: str, value: str, is_active: bool = True, remark: Optional[str] = None,
+) -> None:
+    """
+    写入一个参数并通知所有进程；key 未声明或值非法时抛 ValueError（不写库）。
+    is_active=False 表示停用该行，回到默认值。
+    """
+    t = TUNABLES.get(key)
+    if t is None:
+        raise ValueError(f"未知参数 {key}")
+    t.parse(value)
+
+    row = (await session.execute(select(SysKvConfig).where(SysKvConfig.k == key))).scalar_one_or_none()
+    if row is None:
+        session.add(SysKvConfig(k=key, v=str(value).strip(), remark=remark, is_active=int(is_active)))
+    else:
+        row.v = str(value).strip()
+        row.is_active = int(is_active)
+        if remark is not None:
+            row.remark = remark
+    await session.commit()
+
+    await load_runtime_config()
+    try:
+        await r.publish(k_runtime_config_channel(), key)
+    except Exception as e:
+        # 其他进程靠定时全量刷新兜底（RUNTIME_CONFIG_REFRESH_SECONDS）
+        logger.warning("[runtime] publish invalidation failed: %s", e)
+
+
+async def runtime_config_listener() -> None:
+    """订阅失效消息并重新加载；由 startup 以后台任务启动，shutdown 时取消。"""
+    while True:
+        pubsub = r.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(k_runtime_config_channel())
+            # 订阅成功后补一次全量，覆盖订阅前错过的消息
+            await load_runtime_config()
+            async for msg in pubsub.listen():
+                if msg.get("type") == "message":
+                    await load_runtime_config()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("[runtime] config listener error, retrying in %ss: %s", LISTENER_RETRY_SECONDS, e)
+            await asyncio.sleep(LISTENER_RETRY_SECONDS)
+        finally:
+            try:
+                await pubsub.aclose()
+            except Exception:
+                pass
@@ -0,0 +1,183 @@
+# app/services/stats_service.py
+"""
+走势统计（服务端增量维护）：
+  - 每个窗口（如最近 100/500/1000 期）维护 28 个和值的出现次数
+  - 全局维护每个和值 / 大小单双极值的“遗漏”（距上次出现的期数）
+  - 当前大小 / 单双连开长度
+每来一期只做 O(窗口数) 次数组加减，查询时不需要回放历史。
+后台预热完成前收到的查询由 ensure_trend_stats 从只读库回放一次（同一彩种只回放一次）。
+push 不会改写已入账的期次：开奖结果更正后由 sync_issue_views_job 按 result_version 整体重建。
+"""
+import asyncio
+from array import array
+from typing import Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.session import AsyncReadSessionLocal
+from app.models.issue import Issue
+from app.tasks.settlement import is_hit
+
+SUM_RANGE = 28
+
+# 分类下标；命中口径与结算 is_hit 一致（极大 ≥23 / 极小 ≤4，和 calc_fields 的 extreme 字段不同）
+CAT_NAMES = ("大", "小", "单", "双", "极大", "极小")
+CAT_BIG, CAT_SMALL, CAT_ODD, CAT_EVEN, CAT_EX_BIG, CAT_EX_SMALL = range(6)
+
+
+def _cats_of_sum(s: int) -> tuple:
+    return tuple(c for c, name in enumerate(CAT_NAMES) if is_hit(name, s))
+
+
+# 和值 → 所属分类，启动时算好一次
+SUM_CATS = tuple(_cats_of_sum(s) for s in range(SUM_RANGE))
+
+
+class TrendStats:
+    """单个彩种的走势统计；只由采集协程写入，读接口只读数组快照。"""
+
+    def __init__(self, lottery_code: str, windows: tuple[int, ...]):
+        self.lottery_code = lottery_code
+        self.windows = tuple(sorted(set(windows)))
+        self.capacity = self.windows[-1]
+
+        self.ring = array("b", [-1] * self.capacity)      # 最近 capacity 期的和值（环形）
+        self.seq = 0                                       # 已入账期数
+        self.head_issue: Optional[str] = None
+        self.loaded = False                                # 已从库里回放过（预热或按需）
+        self.freq: Dict[int, array] = {w: array("I", [0] * SUM_RANGE) for w in self.windows}
+        self.sum_last_seen = array("q", [-1] * SUM_RANGE)  # 和值上次出现的 seq
+        self.cat_last_seen = array("q", [-1] * len(CAT_NAMES))
+
+        # 连开：bs 1大/2小，oe 1单/2双
+        self.bs_value = 0
+        self.bs_len = 0
+        self.oe_value = 0
+        self.oe_len = 0
+
+    def push(self, issue_code: str, sum_value: int) -> bool:
+        """入账一期；同一期或更旧的期号直接忽略（采集会重复拉到同一期）。"""
+        issue_code = str(issue_code)
+        if self.head_issue is not None:
+            if issue_code == self.head_issue:
+                return False
+            if issue_code.isdigit() and self.head_issue.isdigit() and int(issue_code) < int(self.head_issue):
+                return False
+        s = int(sum_value)
+        if not 0 <= s < SUM_RANGE:
+            return False
+
+        n = self.seq
+        for w, counts in self.freq.items():
+            if n >= w:
+                counts[self.ring[(n - w) % self.capacity]] -= 1
+            counts[s] += 1
+        self.ring[n % self.capacity] = s
+
+        self.sum_last_seen[s] = n
+        for c in SUM_CATS[s]:
+            self.cat_last_seen[c] = n
+
+        bs = 1 if s >= 14 else 2
+        oe = 1 if s % 2 == 1 else 2
+        self.bs_len = self.bs_len + 1 if bs == self.bs_value else 1
+        self.bs_value = bs
+        self.oe_len = self.oe_len + 1 if oe == self.oe_value else 1
+        self.oe_value = oe
+
+        self.seq = n + 1
+        self.head_issue = issue_code
+        return True
+
+    def _missing(self, last_seen: int) -> int:
+        # 从未出现过：按已加载期数计
+        return self.seq - 1 - last_seen if last_seen >= 0 else self.seq
+
+    def snapshot(self, window: int) -> dict:
+        if window not in self.freq:
+            window = self.windows[0]
+        counts = self.freq[window]
+        cat_freq = [0] * len(CAT_NAMES)
+        for s in range(SUM_RANGE):
+            if counts[s]:
+                for c in SUM_CATS[s]:
+                    cat_freq[c] += counts[s]
+
+        return {
+            "code": self.lottery_code,
+            "window": window,
+            "count": min(self.seq, window),
+            "issue_code": self.head_issue or "",
+            "sums": [
+                {"value": s, "freq": counts[s], "missing": self._missing(self.sum_last_seen[s])}
+                for s in range(SUM_RANGE)
+            ],
+            "categories": [
+                {"name": CAT_NAMES[c], "freq": cat_freq[c], "missing": self._missing(self.cat_last_seen[c])}
+                for c in range(len(CAT_NAMES))
+            ],
+            "streaks": {
+                "bs": {"value": ("大" if self.bs_value == 1 else "小") if self.bs_len else "", "length": self.bs_len},
+                "oe": {"value": ("单" if self.oe_value == 1 else "双") if self.oe_len else "", "length": self.oe_len},
+            },
+        }
+
+
+def _parse_windows(raw: str) -> tuple[int, ...]:
+    out = []
+    for x in str(raw).split(","):
+        x = x.strip()
+        if x.isdigit() and int(x) > 0:
+            out.append(int(x))
+    return tuple(out) or (100, 500, 1000)
+
+
+STATS_WINDOWS = _parse_windows(settings.STATS_WINDOWS)
+
+_stats: Dict[str, TrendStats] = {}
+_loading: Dict[str, asyncio.Lock] = {}
+
+
+def get_trend_stats(lottery_code: str) -> TrendStats:
+    st = _stats.get(lottery_code)
+    if st is None:
+        st = _stats[lottery_code] = TrendStats(lottery_code, STATS_WINDOWS)
+    return st
+
+
+def push_issue_stats(item: dict) -> bool:
+    """采集到新一期后调用（item 与 Redis 历史里的 JSON 结构一致）。"""
+    return get_trend_stats(item["lottery_code"]).push(item["issue_code"], item["sum_value"])
+
+
+async def warmup_stats_from_db(session: AsyncSession, lottery_code: str) -> TrendStats:
+    """启动时用最近 max(窗口) 期回放一遍，之后只增量更新。"""
+    st = _stats[lottery_code] = TrendStats(lottery_code, STATS_WINDOWS)
+    rows: List = (
+        await session.execute(
+            select(Issue.issue_code, Issue.sum_value)
+            .where(Issue.lottery_code == lottery_code, Issue.status >= 3)
+            .order_by(Issue.open_time.desc())
+            .limit(st.capacity)
+        )
+    ).all()
+    for issue_code, sum_value in reversed(rows):
+        if sum_value is not None:
+            st.push(issue_code, sum_value)
+    st.loaded = True
+    return st
+
+
+async def ensure_trend_stats(lottery_code: str) -> TrendStats:
+    """查询入口：还没回放过（新 worker 后台预热未完成）时从只读库回放一次，之后同 get_trend_stats。"""
+    st = _stats.get(lottery_code)
+    if st is not None and st.loaded:
+        return st
+    async with _loading.setdefault(lottery_code, asyncio.Lock()):
+        st = _stats.get(lottery_code)
+        if st is not None and st.loaded:
+            return st
+        async with AsyncReadSessionLocal() as session:
+            return await warmup_stats_from_db(session, lottery_code)
@@ -0,0 +1,120 @@
+# app/tasks/archive.py
+"""
+订单归档：已撤单 / 已派彩 / 未中奖 / 作废（2/4/5/9）且最后更新超过 ORDER_ARCHIVE_AFTER_DAYS 天的订单，
+连同子单搬到 orders_archive / order_item_archive，热表只保留近期数据。
+  - 按主键顺序扫描（只读库），每块在主库一个短事务里：加锁复核 → INSERT ... SELECT → DELETE
+  - INSERT 跳过归档表里已有的 ID；幂等键与归档表里其他订单冲突的留在热表，计入 order_archive_skipped_total 并打 ERROR
+  - 每块之间 sleep，每轮块数有上限，避免长事务、锁等待和主从延迟
+  - 扫到创建时间晚于截止时间的订单即停止，下一轮从头（最旧的未归档订单）开始
+"""
+from __future__ import annotations
+import asyncio
+import datetime as dt
+import logging
+from typing import List
+
+from sqlalchemy import delete, insert, select
+
+from app.core.config import settings
+from app.core.metrics import ARCHIVE_SKIPPED
+from app.db.session import AsyncSessionLocal, AsyncReadSessionLocal
+from app.models.orders import Orders, OrderItem, OrdersArchive, OrderItemArchive
+from app.tasks.settlement import STATUS_CANCELLED, STATUS_SETTLED, STATUS_LOST, STATUS_VOID
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_STATUSES = (STATUS_CANCELLED, STATUS_SETTLED, STATUS_LOST, STATUS_VOID)
+
+ORDER_COLUMNS = tuple(c.name for c in Orders.__table__.columns)
+ITEM_COLUMNS = tuple(c.name for c in OrderItem.__table__.columns)
+
+# 本进程扫描到的订单 ID；扫到近期订单后归零
+_cursor = 0
+
+
+async def _archive_chunk(ids: List[int], cutoff: dt.datetime) -> int:
+    async with AsyncSessionLocal() as s:
+        async with s.begin():
+            # 主库加锁复核（候选来自只读库，可能已被归档或状态变化）
+            locked = (await s.execute(
+                select(Orders.id)
+                .where(Orders.id.in_(ids), Orders.status.in_(ARCHIVE_STATUSES), Orders.updated_at < cutoff)
+                .with_for_update()
+            )).scalars().all()
+            if not locked:
+                return 0
+            # 幂等键已被归档表里的另一笔订单占用：搬过去会违反唯一键，留在热表并告警（需人工处理）
+            conflicts = set((await s.execute(
+                select(Orders.id)
+                .join(OrdersArchive, OrdersArchive.idempotency_key == Orders.idempotency_key)
+                .where(Orders.id.in_(locked), OrdersArchive.id != Orders.id)
+            )).scalars().all())
+            if conflicts:
+                ARCHIVE_SKIPPED.inc("idempotency_conflict", amount=len(conflicts))
+                logger.error("[archive] %d orders left in the hot table, idempotency key taken in orders_archive: %s",
+                             len(conflicts), sorted(conflicts)[:20])
+            move = [oid for oid in locked if oid not in conflicts]
+            if not move:
+                return 0
+            # 按 ID 过滤已在归档表里的行（此前搬过一半 / 人工补过），重跑不会撞主键
+            await s.execute(insert(OrdersArchive).from_select(
+                ORDER_COLUMNS,
+                select(*(getattr(Orders, c) for c in ORDER_COLUMNS))
+                .where(Orders.id.in_(move), ~select(OrdersArchive.id).where(OrdersArchive.id == Orders.id).exists()),
+            ))
+            await s.execute(insert(OrderItemArchive).from_select(
+                ITEM_COLUMNS,
+                select(*(getattr(OrderItem, c) for c in ITEM_COLUMNS))
+                .where(OrderItem.order_id.in_(move),
+                       ~select(OrderItemArchive.id).where(OrderItemArchive.id == OrderItem.id).exists()),
+            ))
+            await s.execute(delete(OrderItem).where(OrderItem.order_id.in_(move)))
+            await s.execute(delete(Orders).where(Orders.id.in_(move)))
+    return len(move)
+
+
+async def archive_orders_once() -> int:
+    """跑一轮归档，返回本轮搬走的订单数。"""
+    global _cursor
+    cutoff = dt.datetime.now() - dt.timedelta(days=settings.ORDER_ARCHIVE_AFTER_DAYS)
+    chunk = settings.ORDER_ARCHIVE_CHUNK
+    archived = 0
+    for i in range(settings.ORDER_ARCHIVE_MAX_CHUNKS):
+        if i:
+            await asyncio.sleep(settings.ORDER_ARCHIVE_SLEEP_MS / 1000.0)
+        async with AsyncReadSessionLocal() as s:
+            rows = (await s.execute(
+                select(Orders.id, Orders.status, Orders.updated_at, Orders.created_at)
+                .where(Orders.id > _cursor)
+                .order_by(Orders.id.asc())
+                .limit(chunk)
+            )).all()
+        if not rows:
+            _cursor = 0
+            break
+
+        ids = [oid for oid, st, upd, _ in rows if st in ARCHIVE_STATUSES and upd is not None and upd < cutoff]
+        if ids:
+            try:
+                archived += await _archive_chunk(ids, cutoff)
+            except Exception as e:
+                # 单块失败（如有外键引用）跳过，下一轮从头再试；一直失败时 order_archive_skipped_total 持续增长
+                ARCHIVE_SKIPPED.inc("chunk_error", amount=len(ids))
+                logger.exception("[archive] chunk %s..%s failed: %s", ids[0], ids[-1], e)
+
+        _cursor = rows[-1].id
+        if len(rows) < chunk or rows[-1].created_at >= cutoff:
+            _cursor = 0
+            break
+    if archived:
+        logger.info("[archive] moved %d orders older than %s", archived, cutoff.strftime("%Y-%m-%d"))
+    return archived
+
+
+async def archive_orders_job():
+    try:
+        return await archive_orders_once()
+    except Exception as e:
+        logger.exception("archive_orders_job failed: %s", e)
+        raise
+
@@ -0,0 +1,95 @@
+# app/tasks/leader.py
+"""
+基于 Redis 锁的调度主节点选举：
+  - SET key token NX PX ttl 抢锁；持锁者每次心跳用 Lua 校验 token 后续期
+  - 续期失败 / Redis 异常立即降级为从节点，锁自然过期后其他实例在下一次心跳接管
+多个 uvicorn worker / Pod 同时运行时，只有主节点执行采集、结算等定时任务。
+"""
+import logging
+import os
+import socket
+import uuid
+
+from app.core.config import settings
+from app.db.redis import r
+from app.constants import k_scheduler_leader
+
+logger = logging.getLogger(__name__)
+
+# 仅当锁仍属于自己时续期 / 释放
+_RENEW_LUA = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+  return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+_RELEASE_LUA = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+  return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class LeaderElector:
+    def __init__(self, key: str, ttl_seconds: int):
+        self.key = key
+        self.ttl_ms = ttl_seconds * 1000
+        self.is_leader = False
+        self._token = None
+        self._pid = None
+
+    @property
+    def token(self) -> str:
+        """
+        本进程的锁标识，第一次用到时才生成。预加载（WEB_PRELOAD）时模块在 fork 前就 import 了，
+        若在构造时生成，所有 worker 会继承同一个 token，能互相续期 / 释放对方的锁。
+        """
+        pid = os.getpid()
+        if self._pid != pid:
+            # fork 出来的子进程：换新 token，并且不继承父进程的主节点身份
+            self._token = f"{socket.gethostname()}:{pid}:{uuid.uuid4().hex[:8]}"
+            self._pid = pid
+            self.is_leader = False
+        return self._token
+
+    async def heartbeat(self) -> bool:
+        token = self.token
+        try:
+            if self.is_leader:
+                if not await r.eval(_RENEW_LUA, 1, self.key, token, self.ttl_ms):
+                    self.is_leader = False
+                    logger.warning("[leader] lost leadership: %s", token)
+            if not self.is_leader:
+                if await r.set(self.key, token, nx=True, px=self.ttl_ms):
+                    self.is_leader = True
+                    logger.warning("[leader] acquired leadership: %s", token)
+        except Exception as e:
+            # Redis 不可用时无法确认自己仍持锁：主动降级，避免双主
+            if self.is_leader:
+                logger.warning("[leader] heartbeat failed, stepping down: %s", e)
+            self.is_leader = False
+        return self.is_leader
+
+    def leading(self) -> bool:
+        # 持锁标记只对生成 token 的那个进程有效（fork 出来的子进程不算）
+        return self.is_leader and self._pid == os.getpid()
+
+    async def release(self) -> None:
+        token = self.token
+        if not self.is_leader:
+            return
+        self.is_leader = False
+        try:
+            await r.eval(_RELEASE_LUA, 1, self.key, token)
+        except Exception as e:
+            logger.warning("[leader] release failed: %s", e)
+
+
+# 模块级只保存配置；token 在各进程第一次心跳时生成（见 LeaderElector.token）
+elector = LeaderElector(k_scheduler_leader(), settings.LEADER_LOCK_TTL_SECONDS)
+
+
+def is_leader() -> bool:
+    # 关闭选举时（单实例部署）每个进程都视为主节点
+    return elector.leading() or not settings.LEADER_ELECTION_ENABLED
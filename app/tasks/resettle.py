@@ -0,0 +1,250 @@
+# app/tasks/resettle.py
+"""
+开奖结果更正后的重新结算（issue.corrected 事件的 outbox 订阅者，只在主节点投递；管理端也可手动重跑）：
+  - 只处理已结算（4/5）的订单；未结算的由结算任务按库里更正后的和值照常结算
+  - 按新和值判断每个子单是否命中，只改“命中状态翻转”的子单；每 RESETTLE_CHUNK 单一个事务：
+      · FOR UPDATE 锁订单 → 按用户 / 订单汇总派彩变化（一条 GROUP BY）
+      · INSERT ... SELECT 写改判明细（resettle_item_log）→ UPDATE order_item（CASE）→ UPDATE orders（按子单合计重算）
+      · 每个用户一条余额 / 累计调整（executemany）+ orders.resettled 事件（排行榜）
+    改过的子单不再满足翻转条件，失败重试 / 重复投递都是幂等的
+  - 全部块做完再扫一遍（覆盖更正提交前刚按旧和值结算的订单），直到没有改动
+  - 批次开始 / 完成 / 失败写 settle_log；失败抛出，由 outbox 退避重试
+余额按差额调整，可能被追回成负数（用户已提走中奖金额时），每笔追回都能在明细里查到。
+已归档（orders_archive）的订单不在处理范围内。
+"""
+from __future__ import annotations
+import datetime as dt
+import logging
+import time
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select, insert, update, case, func, and_, or_, literal, bindparam
+
+from app.core.config import settings
+from app.core.metrics import RESETTLED_ITEMS
+from app.db.session import AsyncSessionLocal
+from app.models.issue import Issue
+from app.models.orders import Orders, OrderItem
+from app.models.resettle import ResettleBatch, ResettleItemLog
+from app.models.settle_log import SettleLog
+from app.models.user import User
+from app.services.leaderboard_service import add_profit, fresh_events, event_ids
+from app.services.outbox_service import (
+    add_event, kick_outbox, subscribe, TOPIC_ISSUE_CORRECTED, TOPIC_ORDERS_RESETTLED,
+)
+from app.services.resettle_service import BATCH_DONE, BATCH_FAILED, BATCH_SUPERSEDED
+from app.tasks.settlement import STATUS_SETTLED, STATUS_LOST, is_hit, q2
+
+logger = logging.getLogger(__name__)
+
+RESULT_WIN = 1
+RESULT_LOSE = 2
+MAX_PASSES = 3
+
+SETTLE_LOG_START = 1
+SETTLE_LOG_DONE = 2
+SETTLE_LOG_FAILED = 3
+
+
+def hit_selections(sum_value: int) -> List[str]:
+    """开出 sum_value 时命中的全部 selection（和值 + 大小单双极值），与 is_hit 一致。"""
+    return [str(sum_value)] + [n for n in ("大", "小", "单", "双", "极大", "极小") if is_hit(n, sum_value)]
+
+
+async def _resettle_chunk(
+        batch: ResettleBatch, ids: List[int], hits: List[str], now: dt.datetime,
+) -> Tuple[int, int, Dict[int, Decimal]]:
+    """一个事务重新结算一块订单；返回 (改判订单数, 改判子单数, {用户: 派彩变化})。"""
+    ot, it, ut, lt = Orders.__table__, OrderItem.__table__, User.__table__, ResettleItemLog.__table__
+    hit = it.c.selection.in_(hits)
+    flipped = or_(and_(hit, it.c.result_status == RESULT_LOSE), and_(~hit, it.c.result_status == RESULT_WIN))
+    new_result = case((hit, RESULT_WIN), else_=RESULT_LOSE)
+    new_win = case((hit, func.round(it.c.stake_amount * it.c.odds, 2)), else_=0)
+
+    async with AsyncSessionLocal() as s:
+        async with s.begin():
+            locked = (await s.execute(
+                select(ot.c.id)
+                .where(ot.c.id.in_(ids), ot.c.status.in_([STATUS_SETTLED, STATUS_LOST]))
+                .with_for_update()
+            )).scalars().all()
+            if not locked:
+                return 0, 0, {}
+
+            rows = (await s.execute(
+                select(ot.c.user_id, it.c.order_id, func.count(), func.sum(new_win - it.c.win_amount))
+                .select_from(it.join(ot, ot.c.id == it.c.order_id))
+                .where(it.c.order_id.in_(locked), flipped)
+                .group_by(ot.c.user_id, it.c.order_id)
+            )).all()
+            if not rows:
+                return 0, 0, {}
+            changed = [oid for _, oid, _, _ in rows]
+            n_items = sum(n for _, _, n, _ in rows)
+            deltas: Dict[int, Decimal] = {}
+            for uid, _, _, d in rows:
+                deltas[uid] = deltas.get(uid, Decimal("0")) + Decimal(str(d))
+            deltas = {uid: q2(d) for uid, d in deltas.items()}
+
+            # 改判明细（改之前先记下旧值）
+            await s.execute(insert(lt).from_select(
+                ["batch_id", "order_id", "item_id", "user_id", "old_result", "new_result", "old_win", "new_win"],
+                select(literal(batch.id), it.c.order_id, it.c.id, ot.c.user_id,
+                       it.c.result_status, new_result, it.c.win_amount, new_win)
+                .select_from(it.join(ot, ot.c.id == it.c.order_id))
+                .where(it.c.order_id.in_(changed), flipped),
+            ))
+            await s.execute(
+                update(it).where(it.c.order_id.in_(changed), flipped)
+                .values(result_status=new_result, win_amount=new_win, settled_at=now)
+            )
+            total = (
+                select(func.coalesce(func.sum(it.c.win_amount), 0))
+                .where(it.c.order_id == ot.c.id)
+                .scalar_subquery()
+            )
+            await s.execute(
+                update(ot).where(ot.c.id.in_(changed))
+                .values(win_amount=total, status=case((total > 0, STATUS_SETTLED), else_=STATUS_LOST))
+            )
+            adjust = [{"b_uid": uid, "b_d": float(d)} for uid, d in sorted(deltas.items()) if d]
+            if adjust:
+                await s.execute(
+                    update(ut).where(ut.c.id == bindparam("b_uid"))
+                    .values(
+                        balance=ut.c.balance + bindparam("b_d"),
+                        total_payout=ut.c.total_payout + bindparam("b_d"),
+                        total_profit=ut.c.total_profit + bindparam("b_d"),
+                    ),
+                    adjust,
+                )
+                robots = (await s.execute(
+                    select(ut.c.id).where(ut.c.id.in_([a["b_uid"] for a in adjust]), ut.c.is_robot.is_(True))
+                )).scalars().all()
+                add_event(s, TOPIC_ORDERS_RESETTLED, {
+                    "batch_id": batch.id,
+                    "lottery_code": batch.lottery_code,
+                    "issue_code": batch.issue_code,
+                    "users": {str(a["b_uid"]): a["b_d"] for a in adjust},
+                    "robots": [str(uid) for uid in robots],  # 机器人用户：榜单 / 每期盈亏不计
+                })
+            bt = ResettleBatch.__table__
+            await s.execute(
+                update(bt).where(bt.c.id == batch.id).values(
+                    order_count=bt.c.order_count + len(changed),
+                    item_count=bt.c.item_count + n_items,
+                    user_count=bt.c.user_count + len(adjust),
+                    delta_amount=bt.c.delta_amount + float(sum(deltas.values(), Decimal("0"))),
+                )
+            )
+    return len(changed), n_items, deltas
+
+
+async def _finish(batch_id: int, status: int, message: str, code: str, issue: str, log_status: int) -> None:
+    async with AsyncSessionLocal() as s:
+        async with s.begin():
+            await s.execute(
+                update(ResettleBatch).where(ResettleBatch.id == batch_id)
+                .values(status=status, message=message[:255], finished_at=dt.datetime.now())
+            )
+            s.add(SettleLog(lottery_code=code, issue_code=issue, status=log_status, message=message[:255]))
+
+
+async def run_resettle(batch_id: int) -> Optional[dict]:
+    """
+    处理一个更正批次；已完成 / 已被取代的批次直接返回 None。
+    期次当前和值与批次的新和值不一致（之后又更正过）时标记为已取代，由最新的批次处理。
+    """
+    async with AsyncSessionLocal() as s:
+        batch = await s.get(ResettleBatch, batch_id)
+        if batch is None or batch.status in (BATCH_DONE, BATCH_SUPERSEDED):
+            return None
+        s.expunge(batch)
+        current = (await s.execute(
+            select(Issue.sum_value).where(Issue.lottery_code == batch.lottery_code, Issue.issue_code == batch.issue_code)
+        )).scalar_one_or_none()
+    code, issue = batch.lottery_code, batch.issue_code
+    if current is None or int(current) != batch.new_sum:
+        await _finish(batch_id, BATCH_SUPERSEDED, f"resettle #{batch_id} superseded (current sum {current})",
+                      code, issue, SETTLE_LOG_DONE)
+        return None
+
+    async with AsyncSessionLocal() as s:
+        async with s.begin():
+            s.add(SettleLog(lottery_code=code, issue_code=issue, status=SETTLE_LOG_START,
+                            message=f"resettle #{batch_id} {batch.old_nums}={batch.old_sum} -> {batch.new_nums}={batch.new_sum}"))
+
+    t0 = time.perf_counter()
+    hits = hit_selections(batch.new_sum)
+    chunk = max(1, settings.RESETTLE_CHUNK)
+    n_orders = n_items = 0
+    delta = Decimal("0")
+    users: set = set()
+    try:
+        for _ in range(MAX_PASSES):
+            async with AsyncSessionLocal() as s:
+                ids = (await s.execute(
+                    select(Orders.id)
+                    .where(Orders.lottery_code == code, Orders.issue_code == issue,
+                           Orders.status.in_([STATUS_SETTLED, STATUS_LOST]))
+                    .order_by(Orders.id.asc())
+                )).scalars().all()
+            changed_this_pass = 0
+            now = dt.datetime.utcnow()
+            for i in range(0, len(ids), chunk):
+                o, n, d = await _resettle_chunk(batch, ids[i:i + chunk], hits, now)
+                changed_this_pass += o
+                n_orders += o
+                n_items += n
+                delta += sum(d.values(), Decimal("0"))
+                users.update(uid for uid, v in d.items() if v)
+            if not changed_this_pass:
+                break
+    except Exception as e:
+        await _finish(batch_id, BATCH_FAILED, f"resettle #{batch_id} failed: {e}", code, issue, SETTLE_LOG_FAILED)
+        raise
+    finally:
+        if n_items:
+            RESETTLED_ITEMS.inc(code, amount=n_items)
+            kick_outbox()
+
+    summary = {
+        "batch_id": batch_id, "lottery_code": code, "issue_code": issue,
+        "old_sum": batch.old_sum, "new_sum": batch.new_sum,
+        "orders": n_orders, "items": n_items, "users": len(users), "delta": float(q2(delta)),
+        "ms": round((time.perf_counter() - t0) * 1000, 1),
+    }
+    await _finish(
+        batch_id, BATCH_DONE,
+        f"resettle #{batch_id} done: orders={n_orders} items={n_items} users={len(users)} delta={summary['delta']:.2f}",
+        code, issue, SETTLE_LOG_DONE,
+    )
+    logger.warning(
+        "第%s期开奖更正 %s(%s) -> %s(%s)：改判 %d 单 / %d 子单，%d 个用户，派彩变化 %.2f，耗时 %.0fms",
+        issue, batch.old_nums, batch.old_sum, batch.new_nums, batch.new_sum,
+        n_orders, n_items, len(users), summary["delta"], summary["ms"],
+    )
+    return summary
+
+
+# ------------------------------
+# outbox 订阅
+# ------------------------------
+@subscribe(TOPIC_ISSUE_CORRECTED, "resettle")
+async def _on_issue_corrected(events: list):
+    for e in events:
+        await run_resettle(int(e["batch_id"]))
+
+
+@subscribe(TOPIC_ORDERS_RESETTLED, "leaderboard_profit")
+async def _on_resettled_leaderboard(events: list):
+    events = await fresh_events("leaderboard_profit", events)
+    deltas: Dict[int, Decimal] = {}
+    for e in events:
+        robots = set(e.get("robots", ()))
+        for uid, d in e["users"].items():
+            if uid in robots:
+                continue
+            deltas[int(uid)] = deltas.get(int(uid), Decimal("0")) + Decimal(str(d))
+    await add_profit(deltas, handler="leaderboard_profit", applied=event_ids(events))
@@ -0,0 +1,379 @@
+# app/tasks/robots.py
+"""
+机器人下注引擎（is_robot 用户，活动前容量评估 / 压测）：
+  - provision_robots(n)：批量创建 ROBOT_USERNAME_PREFIX 开头的机器人用户，余额低于初始额度的 1/10 时补满
+  - 每期投注窗口内按到达曲线安排 ROBOT_BETS_PER_ISSUE 笔下单：ROBOT_BURST_SHARE 的下单集中在封盘前
+    ROBOT_BURST_SECONDS 秒，其余均匀分布在整个窗口；玩法 / 金额按配置的权重抽样，子单数 1..ROBOT_MAX_ITEMS
+  - 下单走真实的 POST /api/orders/place（JWT、风控、扣款、outbox 全链路）：
+    ROBOT_TARGET_URL 为空时进程内 ASGI 调用本应用，否则打到指定地址（如前端 LB，才能测到多 worker / 多实例）
+  - 每个机器人一个固定 IP（风控按 IP 的频率限制）：进程内调用由 _with_robot_ip 改写 ASGI scope 的对端地址；
+    打远端时只发 X-Forwarded-For，仅当压测机在 WEB_FORWARDED_ALLOW_IPS 里才会被采信，否则全部算压测机一个 IP
+  - 机器人订单记 channel=robot，事件带 robot 标记：排行榜、每期盈亏、导出都不计
+  - 每期结束汇总：计划 / 发出 / 成功笔数、按状态码的错误数、吞吐（成功笔数 / 实际发送时长）、峰值每秒、延迟分位，
+    写日志、计指标并存入 Redis（最近 ROBOT_REPORT_KEEP 期），GET /api/admin/robots/reports 查看
+主节点调度任务（ROBOT_ENABLED=1）或独立命令：python -m app.tasks.robots --provision 200 --issues 3
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import bisect
+import datetime as dt
+import logging
+import random
+import time
+import uuid
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import func, insert, select, update
+
+from app.constants import k_current_issue, k_robot_reports
+from app.core.config import settings
+from app.core.metrics import ROBOT_BETS
+from app.core.responses import dumps
+from app.core.security import create_access_token, hash_password_async
+from app.db.redis import r
+from app.db.session import AsyncSessionLocal
+from app.models.orders import CHANNEL_ROBOT
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+SUM_PLAY = "和值"      # 权重表里的 “和值” 表示随机一个 0..27
+SEND_MARGIN = 0.5      # 距封盘不足这么多秒不再发（避免全部落在封盘之后）
+MIN_WINDOW = 5.0       # 剩余投注窗口不足 N 秒的期次直接跳过
+
+
+def parse_weights(spec: str) -> Tuple[List[str], List[float]]:
+    """'大:25,小:25,和值:6' → (['大','小','和值'], [25, 25, 6])"""
+    keys, weights = [], []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        k, _, w = part.rpartition(":")
+        if not k or float(w) <= 0:
+            raise ValueError(f"bad weight spec: {part!r}")
+        keys.append(k.strip())
+        weights.append(float(w))
+    if not keys:
+        raise ValueError("empty weight spec")
+    return keys, weights
+
+
+def _cumulative(weights: Sequence[float]):
+    acc = 0.0
+    for w in weights:
+        acc += w
+        yield acc
+
+
+def arrival_offsets(n: int, window: float, burst_share: float, burst_seconds: float, rnd: random.Random) -> List[float]:
+    """窗口 [0, window) 内 n 个下单时刻（升序）：burst_share 落在最后 burst_seconds 秒，其余均匀分布。"""
+    burst_n = int(round(n * min(1.0, max(0.0, burst_share))))
+    burst_from = max(0.0, window - burst_seconds)
+    out = [rnd.uniform(burst_from, window) for _ in range(burst_n)]
+    out += [rnd.uniform(0.0, window) for _ in range(n - burst_n)]
+    out.sort()
+    return out
+
+
+ROBOT_IP_HEADER = "X-Robot-IP"  # 只有进程内的 _with_robot_ip 认这个头，对外的应用不处理
+
+
+def _robot_ip(uid: int) -> str:
+    return f"10.{(uid >> 16) & 255}.{(uid >> 8) & 255}.{uid & 255}"
+
+
+def _with_robot_ip(app):
+    """进程内调用的 ASGI 包装：按 X-Robot-IP 改写 scope["client"]，让 get_client_ip 看到每个机器人自己的 IP。"""
+    header = ROBOT_IP_HEADER.lower().encode()
+
+    async def wrapped(scope, receive, send):
+        if scope["type"] == "http":
+            for k, v in scope["headers"]:
+                if k == header:
+                    scope = dict(scope, client=(v.decode(), 0))
+                    break
+        await app(scope, receive, send)
+    return wrapped
+
+
+def _percentile(sorted_vals: Sequence[float], q: float) -> Optional[float]:
+    if not sorted_vals:
+        return None
+    return round(sorted_vals[min(len(sorted_vals) - 1, int(q * len(sorted_vals)))], 1)
+
+
+# ------------------------------
+# 机器人用户
+# ------------------------------
+async def provision_robots(n: int) -> List[int]:
+    """确保至少 n 个可用机器人用户，返回前 n 个的 ID；余额不足的补到 ROBOT_INITIAL_BALANCE。"""
+    balance = settings.ROBOT_INITIAL_BALANCE
+    async with AsyncSessionLocal() as s:
+        async with s.begin():
+            have = int(await s.scalar(select(func.count()).select_from(User).where(User.is_robot.is_(True))) or 0)
+            if have < n:
+                # 随机口令的真实哈希：机器人不需要登录，令牌直接签发
+                pw = await hash_password_async(uuid.uuid4().hex)
+                tag = uuid.uuid4().hex[:6]
+                await s.execute(insert(User), [
+                    {"username": f"{settings.ROBOT_USERNAME_PREFIX}{tag}_{i:06d}", "password_hash": pw,
+                     "nickname": f"robot{have + i}", "is_robot": True, "status": 1, "balance": balance}
+                    for i in range(n - have)
+                ])
+            ids = list((await s.execute(
+                select(User.id).where(User.is_robot.is_(True), User.status == 1).order_by(User.id.asc()).limit(n)
+            )).scalars().all())
+            if ids:
+                await s.execute(
+                    update(User)
+                    .where(User.id.in_(ids), User.balance < balance / 10)
+                    .values(balance=balance)
+                )
+    return ids
+
+
+# ------------------------------
+# 单期运行
+# ------------------------------
+class _IssueRun:
+    def __init__(self, code: str, issue: str, planned: int):
+        self.code = code
+        self.issue = issue
+        self.planned = planned
+        self.sent = 0
+        self.ok = 0
+        self.errors: Dict[str, int] = {}
+        self.latencies: List[float] = []
+        self.ok_at: List[float] = []
+        self.first_send: Optional[float] = None
+        self.last_done: Optional[float] = None
+
+    def record(self, sent_at: float, outcome: str) -> None:
+        done = time.perf_counter()
+        self.latencies.append((done - sent_at) * 1000)
+        self.last_done = done
+        if outcome == "ok":
+            self.ok += 1
+            self.ok_at.append(done)
+        else:
+            self.errors[outcome] = self.errors.get(outcome, 0) + 1
+        ROBOT_BETS.inc(outcome)
+
+    def report(self, window: float) -> dict:
+        span = (self.last_done - self.first_send) if self.first_send and self.last_done else 0.0
+        per_second: Dict[int, int] = {}
+        for t in self.ok_at:
+            per_second[int(t)] = per_second.get(int(t), 0) + 1
+        lat = sorted(self.latencies)
+        failed = self.sent - self.ok
+        return {
+            "lottery_code": self.code,
+            "issue_code": self.issue,
+            "finished_at": dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "planned": self.planned,
+            "sent": self.sent,
+            "ok": self.ok,
+            "errors": dict(sorted(self.errors.items())),
+            "error_rate": round(failed / self.sent, 4) if self.sent else 0.0,
+            "window_seconds": round(window, 1),
+            "send_seconds": round(span, 2),
+            "throughput_rps": round(self.ok / span, 1) if span > 0 else 0.0,
+            "peak_rps": max(per_second.values(), default=0),
+            "latency_ms": {
+                "p50": _percentile(lat, 0.50), "p95": _percentile(lat, 0.95),
+                "p99": _percentile(lat, 0.99), "max": round(lat[-1], 1) if lat else None,
+            },
+        }
+
+
+def _client():
+    """返回 (客户端, 携带机器人 IP 的请求头名)。"""
+    import httpx  # 只有机器人引擎用到
+    if settings.ROBOT_TARGET_URL:
+        return httpx.AsyncClient(base_url=settings.ROBOT_TARGET_URL, timeout=10), "X-Forwarded-For"
+    from app.main import app  # 进程内调用本应用（不经网络，也不触发 lifespan）
+    transport = httpx.ASGITransport(app=_with_robot_ip(app))
+    return httpx.AsyncClient(transport=transport, base_url="http://robots", timeout=10), ROBOT_IP_HEADER
+
+
+async def run_issue(code: str, issue: str, close_time: dt.datetime, robot_ids: Sequence[int],
+                    seed: Optional[int] = None) -> Optional[dict]:
+    """在 issue 的剩余投注窗口内按到达曲线下单，返回本期报告；窗口太短时返回 None。"""
+    window = (close_time - dt.datetime.now()).total_seconds() - SEND_MARGIN
+    if window < MIN_WINDOW or not robot_ids:
+        return None
+    rnd = random.Random(seed)
+    plays, play_w = parse_weights(settings.ROBOT_PLAY_WEIGHTS)
+    stakes, stake_w = parse_weights(settings.ROBOT_STAKE_WEIGHTS)
+    plays_cum = list(_cumulative(play_w))
+    stakes_cum = list(_cumulative(stake_w))
+    offsets = arrival_offsets(settings.ROBOT_BETS_PER_ISSUE, window, settings.ROBOT_BURST_SHARE,
+                              settings.ROBOT_BURST_SECONDS, rnd)
+    tokens = {uid: create_access_token(uid) for uid in robot_ids}
+    run = _IssueRun(code, issue, len(offsets))
+    sem = asyncio.Semaphore(max(1, settings.ROBOT_CONCURRENCY))
+
+    def pick(keys, cum):
+        return keys[bisect.bisect_left(cum, rnd.random() * cum[-1])]
+
+    def build_items() -> List[dict]:
+        chosen: Dict[str, dict] = {}
+        for _ in range(rnd.randint(1, max(1, settings.ROBOT_MAX_ITEMS))):
+            play = pick(plays, plays_cum)
+            if play == SUM_PLAY:
+                play = str(rnd.randint(0, 27))
+            chosen[play] = {"play": play, "amount": float(pick(stakes, stakes_cum))}
+        return list(chosen.values())
+
+    client, ip_header = _client()
+
+    async def bet(uid: int, body: dict) -> None:
+        t0 = time.perf_counter()
+        try:
+            resp = await client.post(
+                "/api/orders/place", content=dumps(body),
+                headers={"Authorization": f"Bearer {tokens[uid]}", ip_header: _robot_ip(uid),
+                         "Content-Type": "application/json"},
+            )
+            outcome = "ok" if resp.status_code == 200 else str(resp.status_code)
+        except Exception as e:
+            outcome = type(e).__name__
+        finally:
+            sem.release()
+        run.record(t0, outcome)
+
+    start = time.monotonic()
+    tasks = []
+    async with client:
+        for off in offsets:
+            delay = start + off - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await sem.acquire()
+            uid = rnd.choice(robot_ids)
+            body = {"code": code, "issue": issue, "items": build_items(), "channel": CHANNEL_ROBOT,
+                    "idempotency_key": uuid.uuid4().hex}
+            if run.first_send is None:
+                run.first_send = time.perf_counter()
+            run.sent += 1
+            tasks.append(asyncio.create_task(bet(uid, body)))
+        if tasks:
+            await asyncio.gather(*tasks)
+
+    rep = run.report(window)
+    logger.warning(
+        "[robots] %s/%s ok=%d/%d err=%s rps=%.1f peak=%d p95=%sms",
+        code, issue, rep["ok"], rep["sent"], rep["errors"], rep["throughput_rps"], rep["peak_rps"],
+        rep["latency_ms"]["p95"],
+    )
+    try:
+        key = k_robot_reports(code)
+        pipe = r.pipeline(transaction=False)
+        pipe.lpush(key, dumps(rep))
+        pipe.ltrim(key, 0, settings.ROBOT_REPORT_KEEP - 1)
+        await pipe.execute()
+    except Exception as e:
+        logger.warning("[robots] store report failed: %s", e)
+    return rep
+
+
+async def recent_reports(code: str, limit: int = 20) -> List[str]:
+    """最近的每期报告（新→旧，JSON 字符串）。"""
+    return await r.lrange(k_robot_reports(code), 0, max(0, limit - 1))
+
+
+async def _current_issue(code: str) -> Optional[Tuple[str, dt.datetime]]:
+    data = await r.hgetall(k_current_issue(code))
+    if not data or data.get("allow_bet") != "1" or not data.get("issue_code"):
+        return None
+    try:
+        close_time = dt.datetime.strptime(data["close_time"], "%Y-%m-%d %H:%M:%S")
+    except Exception:
+        return None
+    return data["issue_code"], close_time
+
+
+# ------------------------------
+# 调度任务（主节点）
+# ------------------------------
+_robot_ids: List[int] = []
+_last_issue: Optional[str] = None
+_running: Optional[asyncio.Task] = None
+
+
+async def _run_logged(code: str, issue: str, close_time: dt.datetime) -> None:
+    try:
+        await run_issue(code, issue, close_time, _robot_ids)
+    except Exception as e:
+        logger.exception("[robots] %s/%s failed: %s", code, issue, e)
+
+
+async def robot_job() -> int:
+    """每秒检查当前期：新的一期开放投注时在后台启动本期机器人下单，返回是否启动（0/1）。"""
+    global _robot_ids, _last_issue, _running
+    code = settings.LOTTERY_DEFAULT_CODE
+    cur = await _current_issue(code)
+    if cur is None:
+        return 0
+    issue, close_time = cur
+    if issue == _last_issue or (_running is not None and not _running.done()):
+        return 0
+    _last_issue = issue
+    _robot_ids = await provision_robots(settings.ROBOT_COUNT)
+    _running = asyncio.get_running_loop().create_task(_run_logged(code, issue, close_time))
+    return 1
+
+
+async def stop_robots() -> None:
+    if _running is not None and not _running.done():
+        _running.cancel()
+        await asyncio.gather(_running, return_exceptions=True)
+
+
+# ------------------------------
+# 独立命令
+# ------------------------------
+async def _main(args) -> None:
+    code = args.code
+    ids = await provision_robots(args.provision)
+    print(f"[robots] {len(ids)} robots ready, target={settings.ROBOT_TARGET_URL or 'in-process'}", flush=True)
+    done, last = 0, None
+    while done < args.issues:
+        cur = await _current_issue(code)
+        if cur is None or cur[0] == last:
+            await asyncio.sleep(1)
+            continue
+        last = cur[0]
+        rep = await run_issue(code, cur[0], cur[1], ids, seed=args.seed)
+        if rep is not None:
+            print(dumps(rep).decode(), flush=True)
+            done += 1
+
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(prog="python -m app.tasks.robots", description="机器人下注压测")
+    ap.add_argument("--code", default=settings.LOTTERY_DEFAULT_CODE)
+    ap.add_argument("--provision", type=int, default=settings.ROBOT_COUNT, help="机器人数量（不足时创建）")
+    ap.add_argument("--issues", type=int, default=1, help="跑满 N 期后退出")
+    ap.add_argument("--url", default=None, help="目标地址（覆盖 ROBOT_TARGET_URL；为空则进程内调用）")
+    ap.add_argument("--seed", type=int, default=None)
+    args = ap.parse_args(argv)
+    if args.url is not None:
+        settings.ROBOT_TARGET_URL = args.url
+
+    async def run():
+        from app.db.session import engine, read_engine
+        try:
+            await _main(args)
+        finally:
+            await engine.dispose()
+            if read_engine is not engine:
+                await read_engine.dispose()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
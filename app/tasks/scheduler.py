@@ -2,33 +2,67 @@
 import asyncio
 import json
 import logging
+import time
 from datetime import datetime, timedelta
+from typing import Dict
 
-import httpx
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from sqlalchemy import select
 
 from app.core.config import settings
+from app.core.metrics import COLLECTOR_LAG
+from app.core.runtime import runtime, on_change
 from app.db.redis import r
 from app.db.session import AsyncSessionLocal
 from app.models.lottery import Lottery
 from app.services.issue_service import (
     upsert_issue_from_result,
-    set_redis_after_issue,
     set_current_issue_cache,
 )
-from app.constants import k_current_issue
-from app.tasks.settlement import settle_orders_job  # ← 新增：结算任务
+from app.services.stats_service import push_issue_stats, warmup_stats_from_db
+from app.services.issue_store import push_issue_store, warmup_issue_store_from_db
+from app.services.job_log_service import record_job_run, flush_job_runs, purge_job_runs
+from app.services.outbox_service import (
+    add_event, kick_outbox, drain_outbox, purge_outbox, stop_outbox, TOPIC_ISSUE_OPENED,
+)
+from app.services.risk_service import refresh_risk_flags
+from app.services.runtime_config_service import load_runtime_config
+from app.constants import k_current_issue, k_last_result, k_result_version
+from app.tasks.settlement import (  # ← 新增：结算任务
+    settle_orders_job, build_payout_plan, has_payout_plan,
+)
+from app.tasks.archive import archive_orders_job
+from app.tasks import resettle  # noqa: F401  注册 issue.corrected 订阅者（重新结算）
+from app.services import issue_pnl_service  # noqa: F401  注册每期盈亏汇总的订阅者
+from app.tasks.robots import robot_job, stop_robots
+from app.tasks.leader import elector, is_leader
 
 logger = logging.getLogger(__name__)
 
 scheduler = AsyncIOScheduler()  # 如果你有时区需求，可传 timezone="UTC"/"Asia/Shanghai"
 
+# 正在执行的主节点任务（停机时等它们跑完再释放主节点锁）
+_running_jobs: set = set()
+
+
+def _reschedule(job_id: str):
+    """运行时参数变化时按新间隔重排任务（下次触发从现在起算）；调度器未启动时由 start_scheduler 读取新值。"""
+    def _cb(seconds):
+        if scheduler.running and scheduler.get_job(job_id) is not None:
+            scheduler.reschedule_job(job_id, trigger="interval", seconds=seconds)
+            logger.info("rescheduled %s every %ss", job_id, seconds)
+    return _cb
+
+
+on_change("SETTLE_INTERVAL_SECONDS", _reschedule("settle_orders_job"))
+on_change("COLLECTOR_POLL_SECONDS", _reschedule("collector_jnd28"))
+
 
 async def fetch_jnd28_result():
     url = settings.COLLECTOR_JND28_URL
     ts = int(datetime.now().timestamp() * 1000)
     url = f"{url}{'&' if '?' in url else '?'}_={ts}"
+    import httpx  # 只有主节点采集用到，不放在启动 import 路径上（约 0.2s）
     async with httpx.AsyncClient(timeout=10) as client:
         resp = await client.get(url)
         resp.raise_for_status()
@@ -37,7 +71,9 @@ async def fetch_jnd28_result():
 
 async def collector_job():
     """
-    拉取开奖结果 → 写库（期次/开奖结果）→ 写 Redis 历史缓存 → 计算下一期的 open/close/allow_bet → 写当前期缓存
+    拉取开奖结果 → 写库（期次/开奖结果 + issue.opened 事件，同一事务）→ 立即触发 outbox 投递
+    （Redis 历史、当前期缓存、预计算派彩写回由订阅者完成）
+    返回新入库的期数（0/1），记入 job_run_log。
     """
     async with AsyncSessionLocal() as session:
         lottery_code = settings.LOTTERY_DEFAULT_CODE
@@ -65,12 +101,12 @@ async def collector_job():
             )
 
             if not issue_code or not nums:
-                return
+                return 0
 
             try:
                 n1, n2, n3 = [int(x) for x in nums.split(",")[:3]]
             except Exception:
-                return
+                return 0
 
             if open_time_str:
                 try:
@@ -81,8 +117,9 @@ async def collector_job():
             else:
                 open_time = datetime.now()
 
-            # 写库/更新该期
-            row = await upsert_issue_from_result(
+            # 写库/更新该期（先不提交：开奖事件要和期次写入同一事务）
+            # is_new 以库为准：该期刚插入或刚变为已开奖（重复拉到同一期为 False，不依赖进程内预热状态）
+            row, is_new = await upsert_issue_from_result(
                 session,
                 lottery_code,
                 issue_code,
@@ -91,9 +128,9 @@ async def collector_job():
                 n3,
                 open_time,
                 json.dumps(data, ensure_ascii=False),
+                commit=False,
             )
 
-            # 写 redis 历史
             item = {
                 "lottery_code": row.lottery_code,
                 "issue_code": row.issue_code,
@@ -106,9 +143,8 @@ async def collector_job():
                 "extreme": row.extreme,
                 "open_time": row.open_time.strftime("%Y-%m-%d %H:%M:%S"),
             }
-            await set_redis_after_issue(lottery_code, item)
 
-            # 计算下一期开奖/封盘时间并缓存“当前期”
+            # 计算下一期开奖/封盘时间
             lot = (
                 await session.execute(
                     select(Lottery).where(Lottery.code == lottery_code)
@@ -116,23 +152,38 @@ async def collector_job():
             ).scalar_one()
             next_open = row.open_time + timedelta(seconds=lot.period_seconds or 210)
             close_time = next_open - timedelta(seconds=lot.lock_ahead_seconds or 3)
-            now = datetime.now()
-            allow_bet = now < close_time
 
             # 当前期号：如果是纯数字，+1；否则仍用当前字符串（外部也能覆盖）
             next_issue_str = (
                 str(int(issue_code) + 1) if issue_code.isdigit() else issue_code
             )
-            await set_current_issue_cache(
-                lottery_code,
-                next_issue_str,
-                next_open,
-                close_time,
-                allow_bet,
-            )
+
+            # 新一期（或 Redis 当前期缓存丢失 / 落后）：Redis 历史、当前期缓存、预计算派彩写回
+            # 都由 outbox 订阅者完成，这里只写一条事件；订阅者对同一期重复投递是幂等的
+            emit = is_new or (await r.hget(k_current_issue(lottery_code), "issue_code")) != next_issue_str
+            if emit:
+                add_event(session, TOPIC_ISSUE_OPENED, {
+                    "item": item,
+                    "next": {
+                        "issue_code": next_issue_str,
+                        "open_time": next_open.strftime("%Y-%m-%d %H:%M:%S"),
+                        "close_time": close_time.strftime("%Y-%m-%d %H:%M:%S"),
+                    },
+                })
+            await session.commit()
+
+            # 进程内视图（纯内存）：走势统计增量入账、列式期次存储追加（重复拉到同一期会被忽略）
+            push_issue_stats(item)
+            push_issue_store(item)
+            if is_new:
+                COLLECTOR_LAG.observe(max(0.0, (datetime.now() - row.open_time).total_seconds()), lottery_code)
+            if emit:
+                kick_outbox()
+            return 1 if is_new else 0
 
         except Exception as e:
             logger.exception("[collector_job] error: %s", e)
+            raise
 
 
 async def refresh_current_issue_job():
@@ -160,18 +211,175 @@ async def refresh_current_issue_job():
         pass
 
 
+async def presettle_job():
+    """
+    封盘后、开奖前为当前期预计算派彩（每期一次），返回纳入计划的订单数。
+    """
+    lottery_code = settings.LOTTERY_DEFAULT_CODE
+    data = await r.hgetall(k_current_issue(lottery_code))
+    issue_code = (data or {}).get("issue_code")
+    if not issue_code or has_payout_plan(lottery_code, issue_code):
+        return 0
+    try:
+        close_time = datetime.strptime(data.get("close_time"), "%Y-%m-%d %H:%M:%S")
+    except Exception:
+        return 0
+    if datetime.now() < close_time:
+        return 0
+    try:
+        return await build_payout_plan(lottery_code, issue_code)
+    except Exception as e:
+        logger.exception("[presettle_job] %s/%s failed: %s", lottery_code, issue_code, e)
+        raise
+
+
+_views_version: Dict[str, int] = {}  # 进程内视图对应的 result_version（彩种 → 版本）
+
+
+def set_views_version(lottery_code: str, version) -> None:
+    """预热前读到的 result_version；预热期间发生的更正会在第一次同步时触发重建。"""
+    _views_version[lottery_code] = int(version or 0)
+
+
+async def rebuild_issue_views(lottery_code: str) -> None:
+    """开奖结果更正后整体重建走势统计 / 列式期次存储；读主库（只读库可能还没同步到更正）。"""
+    async with AsyncSessionLocal() as session:
+        await warmup_stats_from_db(session, lottery_code)
+        await warmup_issue_store_from_db(session, lottery_code)
+
+
+async def sync_issue_views_job():
+    """
+    所有实例都跑：从 Redis last_result 同步进程内的走势统计 / 列式期次存储。
+    主节点采集时已直接入账，这里重复入账会被去重；从节点靠它跟上最新一期。
+    增量入账会忽略同一期的新号码，所以 result_version 变了（有期次被更正）时整体重建一次。
+    """
+    lottery_code = settings.LOTTERY_DEFAULT_CODE
+    raw, version = await r.mget(k_last_result(lottery_code), k_result_version(lottery_code))
+    version = int(version or 0)
+    seen = _views_version.setdefault(lottery_code, version)
+    if version != seen:
+        await rebuild_issue_views(lottery_code)
+        _views_version[lottery_code] = version
+        logger.info("[views] %s rebuilt after result correction (version %s)", lottery_code, version)
+    if not raw:
+        return
+    try:
+        item = json.loads(raw)
+        push_issue_stats(item)
+        push_issue_store(item)
+    except Exception:
+        # 容忍解析失败
+        pass
+
+
+async def refresh_risk_flags_job():
+    try:
+        await refresh_risk_flags()
+    except Exception as e:
+        logger.warning("[risk] refresh flags failed: %s", e)
+
+
+async def refresh_runtime_config_job():
+    try:
+        await load_runtime_config()
+    except Exception as e:
+        logger.warning("[runtime] refresh config failed: %s", e)
+
+
+async def leader_heartbeat_job():
+    await elector.heartbeat()
+
+
+async def flush_job_runs_job():
+    await flush_job_runs()
+
+
+async def dispatch_outbox_job():
+    try:
+        return await drain_outbox()
+    except Exception as e:
+        logger.exception("dispatch_outbox_job failed: %s", e)
+        raise
+
+
+async def purge_outbox_job():
+    try:
+        return await purge_outbox()
+    except Exception as e:
+        logger.exception("purge_outbox_job failed: %s", e)
+        raise
+
+
+async def purge_job_runs_job():
+    try:
+        return await purge_job_runs()
+    except Exception as e:
+        logger.exception("purge_job_runs_job failed: %s", e)
+        raise
+
+
+async def purge_issue_bettors_job():
+    try:
+        return await issue_pnl_service.purge_issue_bettors()
+    except Exception as e:
+        logger.exception("purge_issue_bettors_job failed: %s", e)
+        raise
+
+
+def _leader_only(fn, job_name: str):
+    """
+    只在主节点上执行的任务包装；从节点直接跳过。
+    每次实际执行都记一条运行记录：耗时、处理条数（任务返回值）、成功/失败。
+    """
+    async def wrapper():
+        if not is_leader():
+            return
+        task = asyncio.current_task()
+        _running_jobs.add(task)
+        started_at = datetime.now()
+        t0 = time.perf_counter()
+        try:
+            items = await fn()
+        except Exception as e:
+            # 任务内部已打过异常日志，这里只记录结果，不再抛给 APScheduler
+            record_job_run(job_name, started_at, time.perf_counter() - t0, error=f"{type(e).__name__}: {e}")
+            return
+        finally:
+            _running_jobs.discard(task)
+        record_job_run(job_name, started_at, time.perf_counter() - t0,
+                       items=items if isinstance(items, int) else None)
+    wrapper.__name__ = fn.__name__
+    return wrapper
+
+
 def start_scheduler():
     """
     启动调度器：
       - 采集开奖结果
       - 刷新当前期（allow_bet）
       - ✅ 新增：开奖结算任务（扫描未结算订单并派彩）
+    以上任务只在选举出的主节点执行；所有实例都跑心跳和进程内视图同步。
     """
-    # 采集（按你的配置频率）
+    # 主节点选举心跳（启动即抢一次锁）
+    if settings.LEADER_ELECTION_ENABLED:
+        scheduler.add_job(
+            leader_heartbeat_job,
+            "interval",
+            seconds=settings.LEADER_HEARTBEAT_SECONDS,
+            id="leader_heartbeat",
+            replace_existing=True,
+            coalesce=True,
+            max_instances=1,
+            misfire_grace_time=5,
+            next_run_time=datetime.now(),
+        )
+
+    # 采集（默认 COLLECTOR_POLL_SECONDS 秒，运行时参数可热改）
     scheduler.add_job(
-        collector_job,
+        _leader_only(collector_job, "collector_jnd28"),
         "interval",
-        seconds=settings.COLLECTOR_POLL_SECONDS,
+        seconds=runtime.COLLECTOR_POLL_SECONDS,
         id="collector_jnd28",
         replace_existing=True,
         coalesce=True,
@@ -181,7 +389,7 @@ def start_scheduler():
 
     # 刷新当前期
     scheduler.add_job(
-        refresh_current_issue_job,
+        _leader_only(refresh_current_issue_job, "tick_current_issue"),
         "interval",
         seconds=1,
         id="tick_current_issue",
@@ -191,11 +399,11 @@ def start_scheduler():
         misfire_grace_time=5,
     )
 
-    # ✅ 新增：结算任务（每 2 秒跑一次；你也可以调到 1~5 秒）
+    # ✅ 新增：结算任务（默认每 2 秒跑一次；运行时参数 SETTLE_INTERVAL_SECONDS 可热改）
     scheduler.add_job(
-        settle_orders_job,
+        _leader_only(settle_orders_job, "settle_orders_job"),
         "interval",
-        seconds=2,
+        seconds=runtime.SETTLE_INTERVAL_SECONDS,
         id="settle_orders_job",
         replace_existing=True,
         coalesce=True,          # 合并堆积触发
@@ -203,6 +411,157 @@ def start_scheduler():
         misfire_grace_time=10,  # 允许一定延迟
     )
 
+    # 封盘后预计算派彩（只在主节点；计划保存在主节点内存，供开奖后批量写回）
+    if settings.SETTLE_PRECOMPUTE_ENABLED:
+        scheduler.add_job(
+            _leader_only(presettle_job, "presettle"),
+            "interval",
+            seconds=1,
+            id="presettle",
+            replace_existing=True,
+            coalesce=True,
+            max_instances=1,
+            misfire_grace_time=5,
+        )
+
+    # outbox 投递（只在主节点；采集 / 结算提交后会立即触发一轮，这里兜底轮询请求路径写入的事件和重试）
+    scheduler.add_job(
+        _leader_only(dispatch_outbox_job, "dispatch_outbox"),
+        "interval",
+        seconds=settings.OUTBOX_POLL_SECONDS,
+        id="dispatch_outbox",
+        replace_existing=True,
+        coalesce=True,
+        max_instances=1,
+        misfire_grace_time=5,
+    )
+    scheduler.add_job(
+        _leader_only(purge_outbox_job, "purge_outbox"),
+        "interval",
+        seconds=600,
+        id="purge_outbox",
+        replace_existing=True,
+        coalesce=True,
+        max_instances=1,
+        misfire_grace_time=60,
+    )
+    scheduler.add_job(
+        _leader_only(purge_job_runs_job, "purge_job_runs"),
+        "interval",
+        seconds=600,
+        id="purge_job_runs",
+        replace_existing=True,
+        coalesce=True,
+        max_instances=1,
+        misfire_grace_time=60,
+    )
+    scheduler.add_job(
+        _leader_only(purge_issue_bettors_job, "purge_issue_bettors"),
+        "interval",
+        seconds=600,
+        id="purge_issue_bettors",
+        replace_existing=True,
+        coalesce=True,
+        max_instances=1,
+        misfire_grace_time=60,
+    )
+
+    # 订单归档（分批、限速；只在主节点）
+    if settings.ORDER_ARCHIVE_ENABLED:
+        scheduler.add_job(
+            _leader_only(archive_orders_job, "archive_orders"),
+            "interval",
+            seconds=settings.ORDER_ARCHIVE_INTERVAL_SECONDS,
+            id="archive_orders",
+            replace_existing=True,
+            coalesce=True,
+            max_instances=1,
+            misfire_grace_time=60,
+        )
+
+    # 机器人下注（压测用，只在主节点；每期开放投注后在后台按到达曲线下单）
+    if settings.ROBOT_ENABLED:
+        scheduler.add_job(
+            _leader_only(robot_job, "robots"),
+            "interval",
+            seconds=1,
+            id="robots",
+            replace_existing=True,
+            coalesce=True,
+            max_instances=1,
+            misfire_grace_time=5,
+        )
+
+    # 进程内视图同步（所有实例）
+    scheduler.add_job(
+        sync_issue_views_job,
+        "interval",
+        seconds=1,
+        id="sync_issue_views",
+        replace_existing=True,
+        coalesce=True,
+        max_instances=1,
+        misfire_grace_time=5,
+    )
+
+    # 风控标记缓存刷新（所有实例，启动即加载一次）
+    scheduler.add_job(
+        refresh_risk_flags_job,
+        "interval",
+        seconds=settings.RISK_FLAG_REFRESH_SECONDS,
+        id="refresh_risk_flags",
+        replace_existing=True,
+        coalesce=True,
+        max_instances=1,
+        misfire_grace_time=10,
+        next_run_time=datetime.now(),
+    )
+
+    # 运行时参数全量刷新（所有实例；平时靠 Redis 失效消息即时生效，这里兜底丢失的消息）
+    scheduler.add_job(
+        refresh_runtime_config_job,
+        "interval",
+        seconds=settings.RUNTIME_CONFIG_REFRESH_SECONDS,
+        id="refresh_runtime_config",
+        replace_existing=True,
+        coalesce=True,
+        max_instances=1,
+        misfire_grace_time=10,
+    )
+
+    # 任务运行记录批量落库（所有实例；从节点缓冲区为空时不写库）
+    scheduler.add_job(
+        flush_job_runs_job,
+        "interval",
+        seconds=settings.JOB_RUN_LOG_FLUSH_SECONDS,
+        id="flush_job_runs",
+        replace_existing=True,
+        coalesce=True,
+        max_instances=1,
+        misfire_grace_time=10,
+    )
+
     if not scheduler.running:
         scheduler.start()
         logger.info("Scheduler started")
+
+
+async def stop_scheduler():
+    """
+    停止调度并释放主节点锁，让其他实例立即接管；把缓冲的运行记录写完。
+    释放锁之前先等正在执行的主节点任务（结算 / 采集 / 投递）和它们 kick_outbox 起的投递跑完，
+    各最多 SCHEDULER_SHUTDOWN_TIMEOUT_SECONDS 秒（超时的投递取消），避免新主节点与本进程同时结算同一批订单。
+    """
+    if scheduler.running:
+        scheduler.shutdown(wait=False)
+    await stop_robots()
+    pending = [t for t in _running_jobs if not t.done()]
+    if pending:
+        logger.info("waiting for %d running job(s) before releasing leadership", len(pending))
+        _, still = await asyncio.wait(pending, timeout=settings.SCHEDULER_SHUTDOWN_TIMEOUT_SECONDS)
+        if still:
+            logger.warning("%d job(s) still running after %ss, releasing leadership anyway",
+                           len(still), settings.SCHEDULER_SHUTDOWN_TIMEOUT_SECONDS)
+    await stop_outbox(settings.SCHEDULER_SHUTDOWN_TIMEOUT_SECONDS)
+    await elector.release()
+    await flush_job_runs()
@@ -2,13 +2,17 @@
 from __future__ import annotations
 import datetime as dt
 import logging
+import time
+from array import array
 from decimal import Decimal, ROUND_HALF_UP
-from typing import Optional, Dict, Tuple, Iterable
+from functools import lru_cache
+from typing import Optional, Dict, List, Set, Tuple, Iterable
 
-from sqlalchemy import select
+from sqlalchemy import select, func, and_, or_, update, bindparam
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.session import AsyncSessionLocal, Base
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal, AsyncReadSessionLocal, Base
 
 # 适配你的 orders 模型（文件名是 orders.py）
 try:
@@ -19,6 +23,13 @@ except ModuleNotFoundError:
 
 # user 表（只有 balance，用它派彩）
 from app.models.user import User
+from app.models.issue import Issue
+from app.core.metrics import SETTLEMENT_LAG, PENDING_ORDERS, register_collector
+from app.core.runtime import runtime
+from app.services.leaderboard_service import add_profit, fresh_events, event_ids
+from app.services.outbox_service import (
+    add_event, claim_events, kick_outbox, subscribe, TOPIC_ISSUE_OPENED, TOPIC_ORDERS_SETTLED,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -30,8 +41,6 @@ STATUS_SETTLED   = 4   # 已派彩（中奖）
 STATUS_LOST      = 5   # 未中奖
 STATUS_VOID      = 9   # 作废
 
-BATCH_LIMIT = 200      # 每轮最多处理 N 笔，避免长事务/大锁
-
 
 def q2(v: Decimal) -> Decimal:
     return Decimal(v).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
@@ -40,6 +49,7 @@ def q2(v: Decimal) -> Decimal:
 # ------------------------------
 # 开奖结果获取（和值 0..27）
 # ------------------------------
+@lru_cache(maxsize=None)
 def _choose_open_model() -> tuple[type | None, str | None, str | None, Tuple[str, ...], Tuple[str, ...]]:
     """
     尝试在已注册的 ORM 模型里，找到“开奖号码”模型：
@@ -50,6 +60,7 @@ def _choose_open_model() -> tuple[type | None, str | None, str | None, Tuple[str
           * 有 code/nums/opencode（三球字符串）
     返回：(Model, lot_col_name, issue_col_name, sum_candidates, code_candidates)
     失败返回 (None, None, None, (), ()).
+    结果按进程缓存：模型在 import 时注册完毕，不必每次结算都重新尝试 import、遍历 mapper。
     """
     # 确保常见模块被 import（一些项目直到第一次用到才 import）
     for mod, name in [
@@ -97,9 +108,13 @@ def _choose_open_model() -> tuple[type | None, str | None, str | None, Tuple[str
     return None, None, None, (), ()
 
 
-async def get_open_sum(session: AsyncSession, lottery_code: str, issue_code: str | int) -> Optional[int]:
+async def get_open_sum(
+        session: AsyncSession, lottery_code: str, issue_code: str | int, lock: bool = False,
+) -> Optional[int]:
     """
     返回该期的和值 (0..27)。若未开奖返回 None。
+    lock=True 时对开奖行加共享锁（结算事务内复核用）：并发的结果更正要等本事务提交，
+    提交后的重新结算一定能看到这里结算的订单；已提交的更正则在这里直接读到新和值。
     - 优先读 sum_value
     - 否则 n1+n2+n3（或 num1../a..）
     - 否则从 "x,y,z" 字符串解析
@@ -114,11 +129,10 @@ async def get_open_sum(session: AsyncSession, lottery_code: str, issue_code: str
     lot_attr = getattr(Model, lot_col)
     issue_attr = getattr(Model, issue_col)
 
-    row = (
-        await session.execute(
-            select(Model).where(lot_attr == lottery_code, issue_attr == issue_code)
-        )
-    ).scalar_one_or_none()
+    stmt = select(Model).where(lot_attr == lottery_code, issue_attr == issue_code)
+    if lock:
+        stmt = stmt.with_for_update(read=True)
+    row = (await session.execute(stmt)).scalar_one_or_none()
     if not row:
         return None
 
@@ -230,6 +244,7 @@ async def _settle_one_order(session: AsyncSession, order_id: int, sum_value: int
             "stake": float(q2(stake_total)),
             "win": 0.0,
             "status": int(order.status),
+            "robot": bool(user.is_robot),
         }
 
     total_win = Decimal("0")
@@ -284,9 +299,327 @@ async def _settle_one_order(session: AsyncSession, order_id: int, sum_value: int
         "stake": float(q2(stake_total)),
         "win": float(q2(total_win)),
         "status": int(order.status),
+        "robot": bool(user.is_robot),
     }
 
 
+async def _get_open_times(session: AsyncSession, pairs: list) -> Dict[Tuple[str, str], dt.datetime]:
+    if not pairs:
+        return {}
+    rs = await session.execute(
+        select(Issue.lottery_code, Issue.issue_code, Issue.open_time)
+        # 展开成 OR（而不是行值 IN），各分支都能走 uk_issue
+        .where(or_(*(and_(Issue.lottery_code == code, Issue.issue_code == issue) for code, issue in pairs)))
+    )
+    return {(code, issue): ot for code, issue, ot in rs.all()}
+
+
+@register_collector
+async def _collect_pending_orders():
+    """/metrics 抓取时统计各期未结算订单数（只取积压最多的 50 期）。"""
+    async with AsyncReadSessionLocal() as session:
+        rs = await session.execute(
+            select(Orders.lottery_code, Orders.issue_code, func.count())
+            .where(Orders.status.in_([STATUS_SUBMITTED, STATUS_PENDING]))
+            .group_by(Orders.lottery_code, Orders.issue_code)
+            .order_by(func.count().desc())
+            .limit(50)
+        )
+        PENDING_ORDERS.clear()
+        for code, issue, n in rs.all():
+            PENDING_ORDERS.set(n, code, issue)
+
+
+# ------------------------------
+# outbox 订阅：结算提交后的用户累计 / 排行榜 / 日志
+# ------------------------------
+def _settled_deltas(events: list, skip_robots: bool = False) -> Dict[int, list]:
+    """按用户汇总一批结算事件的 [本金, 派彩]（只算中奖 / 未中奖，作废不计）；skip_robots 时不计机器人订单。"""
+    deltas: Dict[int, list] = {}
+    for e in events:
+        for o in e["orders"]:
+            if o.get("user_id") is None or o.get("status") not in (STATUS_SETTLED, STATUS_LOST):
+                continue
+            if skip_robots and o.get("robot"):
+                continue
+            acc = deltas.setdefault(int(o["user_id"]), [Decimal("0"), Decimal("0")])
+            acc[0] += Decimal(str(o["stake"]))
+            acc[1] += Decimal(str(o["win"]))
+    return deltas
+
+
+@subscribe(TOPIC_ORDERS_SETTLED, "user_totals")
+async def _on_settled_user_totals(events: list):
+    """
+    把一批结算的用户累计（total_payout / total_profit）一次性写回：
+    每个用户一条 UPDATE（executemany），与事件登记（claim_events）同一事务；失败抛出，由 outbox 重试。
+    """
+    async with AsyncSessionLocal() as s:
+        async with s.begin():
+            deltas = _settled_deltas(await claim_events(s, "user_totals", events))
+            if not deltas:
+                return
+            params = [
+                {"uid": uid, "payout": float(q2(win)), "profit": float(q2(win - stake))}
+                for uid, (stake, win) in deltas.items()
+            ]
+            await s.execute(
+                update(User.__table__)
+                .where(User.__table__.c.id == bindparam("uid"))
+                .values(
+                    total_payout=User.__table__.c.total_payout + bindparam("payout"),
+                    total_profit=User.__table__.c.total_profit + bindparam("profit"),
+                ),
+                params,
+            )
+
+
+@subscribe(TOPIC_ORDERS_SETTLED, "leaderboard_profit")
+async def _on_settled_leaderboard(events: list):
+    events = await fresh_events("leaderboard_profit", events)
+    deltas = _settled_deltas(events, skip_robots=True)  # 公开榜单不收机器人
+    await add_profit({uid: win - stake for uid, (stake, win) in deltas.items()},
+                     handler="leaderboard_profit", applied=event_ids(events))
+
+
+@subscribe(TOPIC_ORDERS_SETTLED, "log")
+async def _on_settled_log(events: list):
+    for e in events:
+        orders = e["orders"]
+        if len(orders) > 1:
+            logger.info(
+                "第%s期：批量结算 %d 单，派彩 %.2f",
+                orders[0].get("issue_code", ""), len(orders), sum(o.get("win", 0.0) for o in orders),
+            )
+            continue
+        for o in orders:
+            logger.warning(
+                "第%s期：%s，投注 %.2f，赢得 %.2f（订单ID=%s）",
+                o.get("issue_code", ""),
+                o.get("user_name") or f"UID{o.get('user_id')}",
+                o.get("stake", 0.0),
+                o.get("win", 0.0),
+                o.get("order_id", ""),
+            )
+
+
+# ------------------------------
+# 开奖前预计算派彩（封盘 → 开奖之间）
+# ------------------------------
+# 封盘后投注已冻结、结果未知：先把每笔订单在 28 个和值下的派彩算好放在内存里，
+# 开奖后只需按和值取对应一列，按块批量写回（订单状态 / 子单结果 / 余额），不再逐单加锁计算。
+# 计划只在主节点内存中；没有计划（主节点切换、封盘后才下的单、块失败）的订单照常走逐单结算。
+_PLAN_TTL_SECONDS = 3600
+
+
+@lru_cache(maxsize=256)
+def _hit_mask(selection: str) -> int:
+    """玩法在 28 个和值上的命中位图：第 s 位为 1 表示开出和值 s 时命中。"""
+    return sum(1 << s for s in range(28) if is_hit(selection, s))
+
+
+class _PlannedOrder:
+    __slots__ = ("user_id", "stake", "payout", "items")
+
+    def __init__(self, user_id: int, stake: Decimal, payout: array, items: tuple):
+        self.user_id = user_id
+        self.stake = stake
+        self.payout = payout    # array('q', 28)：各和值下的派彩（分）
+        self.items = items      # ((item_id, 命中位图, 中奖派彩（分）), ...)
+
+
+# (lottery_code, issue_code) -> (构建时间, {order_id: _PlannedOrder})
+_plans: Dict[Tuple[str, str], Tuple[float, Dict[int, _PlannedOrder]]] = {}
+
+
+def has_payout_plan(code: str, issue: str) -> bool:
+    return (code, str(issue)) in _plans
+
+
+async def build_payout_plan(code: str, issue: str) -> int:
+    """
+    为一期的未结算订单预计算派彩，返回纳入计划的订单数。
+    已有子单结算过、没有子单的订单不纳入（留给逐单结算按原规则处理）。
+    """
+    issue = str(issue)
+    now = time.monotonic()
+    for key in [k for k, (ts, _) in _plans.items() if now - ts > _PLAN_TTL_SECONDS]:
+        _plans.pop(key, None)
+
+    async with AsyncReadSessionLocal() as session:
+        orders = (await session.execute(
+            select(Orders.id, Orders.user_id, Orders.total_amount)
+            .where(
+                Orders.lottery_code == code,
+                Orders.issue_code == issue,
+                Orders.status.in_([STATUS_SUBMITTED, STATUS_PENDING]),
+            )
+        )).all()
+        items_by_order: Dict[int, list] = {}
+        skip: Set[int] = set()
+        ids = [o.id for o in orders]
+        for i in range(0, len(ids), 1000):
+            rs = await session.execute(
+                select(OrderItem.order_id, OrderItem.id, OrderItem.selection,
+                       OrderItem.stake_amount, OrderItem.odds, OrderItem.result_status)
+                .where(OrderItem.order_id.in_(ids[i:i + 1000]))
+            )
+            for oid, item_id, sel, stake, odds, result_status in rs.all():
+                if int(result_status or 0) != 0:
+                    skip.add(oid)
+                    continue
+                win = q2(Decimal(str(stake)) * Decimal(str(odds)))
+                items_by_order.setdefault(oid, []).append((item_id, _hit_mask(str(sel)), int(win * 100)))
+
+    planned: Dict[int, _PlannedOrder] = {}
+    for oid, uid, total in orders:
+        items = items_by_order.get(oid)
+        if not items or oid in skip:
+            continue
+        payout = array("q", bytes(8 * 28))
+        for _, mask, win in items:
+            for s in range(28):
+                if mask >> s & 1:
+                    payout[s] += win
+        planned[oid] = _PlannedOrder(int(uid), Decimal(str(total)), payout, tuple(items))
+
+    _plans[(code, issue)] = (time.monotonic(), planned)
+    return len(planned)
+
+
+def _cents_to_amount(cents: int) -> float:
+    return float(Decimal(cents) / 100)
+
+
+async def _apply_plan_chunk(
+        code: str, issue: str, planned: Dict[int, _PlannedOrder], ids: List[int], sum_value: int, now: dt.datetime,
+) -> Tuple[List[int], int]:
+    """
+    一个事务：主库加锁复核和值与订单状态 → 批量写订单 / 子单 / 余额 + orders.settled 事件。
+    计划里每单都有 0..27 全部和值的派彩，以库里的和值为准（调用方传入的可能是更正前的快照）。
+    返回 (实际结算的订单 ID, 实际使用的和值)。
+    """
+    async with AsyncSessionLocal() as s:
+        async with s.begin():
+            current = await get_open_sum(s, code, issue, lock=True)
+            if current is None:
+                return [], sum_value
+            if current != sum_value:
+                logger.warning("第%s期：和值已更正 %s -> %s，按库里的和值写回", issue, sum_value, current)
+                sum_value = current
+            locked = (await s.execute(
+                select(Orders.id)
+                .where(Orders.id.in_(ids), Orders.status.in_([STATUS_SUBMITTED, STATUS_PENDING]))
+                .with_for_update()
+            )).scalars().all()
+            if not locked:
+                return [], sum_value
+            uids = {planned[oid].user_id for oid in locked}
+            existing = dict((await s.execute(select(User.id, User.is_robot).where(User.id.in_(uids)))).tuples().all())
+            # 用户不存在的订单留给逐单结算（作废）
+            locked = [oid for oid in locked if planned[oid].user_id in existing]
+            if not locked:
+                return [], sum_value
+
+            order_params, item_params, credit, settled = [], [], {}, []
+            bit = 1 << sum_value
+            for oid in locked:
+                po = planned[oid]
+                win = po.payout[sum_value]
+                status = STATUS_SETTLED if win > 0 else STATUS_LOST
+                order_params.append({
+                    "b_id": oid,
+                    "b_status": status,
+                    "b_win": _cents_to_amount(win),
+                })
+                settled.append({
+                    "order_id": oid, "lottery_code": code, "issue_code": issue, "user_id": po.user_id,
+                    "stake": float(po.stake), "win": _cents_to_amount(win), "status": status,
+                    "robot": bool(existing[po.user_id]),
+                })
+                for item_id, mask, item_win in po.items:
+                    hit = mask & bit
+                    item_params.append({
+                        "b_id": item_id,
+                        "b_result": 1 if hit else 2,
+                        "b_win": _cents_to_amount(item_win) if hit else 0.0,
+                    })
+                if win > 0:
+                    credit[po.user_id] = credit.get(po.user_id, 0) + win
+
+            ot, it, ut = Orders.__table__, OrderItem.__table__, User.__table__
+            await s.execute(
+                update(ot).where(ot.c.id == bindparam("b_id"))
+                .values(status=bindparam("b_status"), win_amount=bindparam("b_win")),
+                order_params,
+            )
+            await s.execute(
+                update(it).where(it.c.id == bindparam("b_id"), it.c.result_status == 0)
+                .values(result_status=bindparam("b_result"), win_amount=bindparam("b_win"), settled_at=now),
+                item_params,
+            )
+            if credit:
+                await s.execute(
+                    update(ut).where(ut.c.id == bindparam("b_uid"))
+                    .values(balance=ut.c.balance + bindparam("b_win")),
+                    [{"b_uid": uid, "b_win": _cents_to_amount(c)} for uid, c in sorted(credit.items())],
+                )
+            add_event(s, TOPIC_ORDERS_SETTLED, {"orders": settled})
+    return locked, sum_value
+
+
+async def apply_payout_plan(
+        code: str, issue: str, sum_value: int, open_time: Optional[dt.datetime] = None,
+) -> Set[int]:
+    """
+    开奖后按和值套用预计算的派彩，按块批量提交；返回已结算的订单 ID。
+    sum_value 只是预期值：每块在事务里按主库的和值复核（见 _apply_plan_chunk）。失败的块保持未结算，由逐单结算兜底。
+    """
+    entry = _plans.pop((code, str(issue)), None)
+    if entry is None:
+        return set()
+    planned = entry[1]
+
+    t0 = time.perf_counter()
+    now = dt.datetime.utcnow()
+    ids = sorted(planned)
+    chunk = max(1, settings.SETTLE_APPLY_CHUNK)
+    done: Set[int] = set()
+    total_win = 0
+    for i in range(0, len(ids), chunk):
+        try:
+            settled, used = await _apply_plan_chunk(code, str(issue), planned, ids[i:i + chunk], int(sum_value), now)
+        except Exception as e:
+            logger.exception("预计算派彩写回失败 %s/%s orders=%s..%s: %s", code, issue, ids[i], ids[min(len(ids), i + chunk) - 1], e)
+            continue
+        lag = max(0.0, (dt.datetime.now() - open_time).total_seconds()) if open_time else None
+        for oid in settled:
+            total_win += planned[oid].payout[used]
+            if lag is not None:
+                SETTLEMENT_LAG.observe(lag, code)
+        done.update(settled)
+    if done:
+        kick_outbox()
+        logger.info(
+            "第%s期：预计算派彩写回 %d 单（计划 %d 单），派彩 %.2f，耗时 %.0fms",
+            issue, len(done), len(ids), total_win / 100, (time.perf_counter() - t0) * 1000,
+        )
+    return done
+
+
+@subscribe(TOPIC_ISSUE_OPENED, "apply_payout_plan")
+async def _on_issue_opened_apply_plan(events: list):
+    """
+    开奖事件：有预计算计划的期次直接按和值批量写回（没有计划时什么也不做，留给逐单结算）。
+    事件里的和值是写事件时的快照，之后可能已被更正；写回时以库里的和值为准。
+    """
+    for e in events:
+        item = e["item"]
+        if has_payout_plan(item["lottery_code"], item["issue_code"]):
+            open_time = dt.datetime.strptime(item["open_time"], "%Y-%m-%d %H:%M:%S")
+            await apply_payout_plan(item["lottery_code"], item["issue_code"], int(item["sum_value"]), open_time)
+
+
 # ------------------------------
 # 一轮扫描 + 批量结算
 # ------------------------------
@@ -294,18 +627,20 @@ async def settle_orders_once():
     """
     扫描未结算订单（status in 1/3），对已开奖的期次进行结算。
     读与写分离：读取用一个 session；结算每单用一个新的 session（事务独立，避免嵌套）。
+    返回本轮结算成功的订单数。
     """
-    # 先用一个 session 拉取候选订单，并查每期和值
-    async with AsyncSessionLocal() as session:
+    # 先用只读 session 拉取候选订单，并查每期和值。副本可能落后（含结果更正），这里的和值只用来挑出已开奖的期次；
+    # 真正结算时在主库事务里加锁重读和值（批量写回见 _apply_plan_chunk，逐单见下面的循环）
+    async with AsyncReadSessionLocal() as session:
         rs = await session.execute(
             select(Orders.id, Orders.lottery_code, Orders.issue_code)
             .where(Orders.status.in_([STATUS_SUBMITTED, STATUS_PENDING]))
             .order_by(Orders.id.asc())
-            .limit(BATCH_LIMIT)
+            .limit(runtime.SETTLE_BATCH_LIMIT)  # 每轮最多 N 笔，避免长事务/大锁
         )
         rows = rs.all()
         if not rows:
-            return
+            return 0
 
         # 拿到所有 (lottery_code, issue_code) 去重
         pairs: Dict[Tuple[str, str], Optional[int]] = {}
@@ -316,38 +651,53 @@ async def settle_orders_once():
         for (code, issue) in list(pairs.keys()):
             pairs[(code, issue)] = await get_open_sum(session, code, issue)
 
+        # 开奖时间：用于统计“开奖→派彩”延迟
+        open_times = await _get_open_times(session, [k for k, v in pairs.items() if v is not None])
+
     # 对每个订单，用独立的会话做“锁订单/锁用户/更新子单/派彩”
+    # 用户累计、排行榜、结算日志由 orders.settled 事件的 outbox 订阅者完成
+    settled = 0
+    # 有预计算计划的期次先整期批量写回，剩下的订单再逐单结算
+    handled: Set[int] = set()
+    for (code, issue), sum_val in pairs.items():
+        if sum_val is not None and has_payout_plan(code, issue):
+            done = await apply_payout_plan(code, issue, int(sum_val), open_times.get((code, issue)))
+            settled += len(done)
+            handled |= done
+
     for oid, code, issue in rows:
         sum_val = pairs.get((code, issue))
-        if sum_val is None:
-            # 该期还没出结果，跳过
+        if sum_val is None or oid in handled:
+            # 该期还没出结果 / 已批量结算，跳过
             continue
 
-        details = None
         try:
             async with AsyncSessionLocal() as s:
-                async with s.begin():  # 一单一事务
-                    details = await _settle_one_order(s, oid, int(sum_val))
-            # 只有事务成功提交才会走到这里；打印成功日志
+                async with s.begin():  # 一单一事务（结算事件同事务写入）
+                    current = await get_open_sum(s, code, issue, lock=True)
+                    details = await _settle_one_order(s, oid, current) if current is not None else None
+                    if details:
+                        add_event(s, TOPIC_ORDERS_SETTLED, {"orders": [details]})
+            # 只有事务成功提交才会走到这里
             if details:
-                logger.warning(
-                    "第%s期：%s，投注 %.2f，赢得 %.2f（订单ID=%s）",
-                    details.get("issue_code", ""),
-                    details.get("user_name", ""),
-                    details.get("stake", 0.0),
-                    details.get("win", 0.0),
-                    details.get("order_id", ""),
-                )
+                settled += 1
+                ot = open_times.get((code, issue))
+                if ot is not None:
+                    SETTLEMENT_LAG.observe(max(0.0, (dt.datetime.now() - ot).total_seconds()), code)
         except Exception as e:
             logger.exception("结算订单异常 order_id=%s: %s", oid, e)
             # 不中断后续订单
             continue
+    if settled:
+        kick_outbox()
+    return settled
 
 # ------------------------------
 # 调度器入口（供 scheduler 调用）
 # ------------------------------
 async def settle_orders_job():
     try:
-        await settle_orders_once()
+        return await settle_orders_once()
     except Exception as e:
         logger.exception("settle_orders_job failed: %s", e)
+        raise
@@ -0,0 +1,11 @@
+"""
+cs28-api 性能基准。
+
+    python -m bench                      # 全部，结果 JSON 打到 stdout
+    python -m bench --suite micro        # 只跑纯函数微基准
+    python -m bench --suite e2e --out bench_output.json
+
+端到端基准使用本地替身：SQLite（aiosqlite，临时文件）+ fakeredis；
+设置 BENCH_REDIS_URL 时改连真实 Redis（会清空该库，请用独立 db）。
+需要：pip install -e .[bench]
+"""
@@ -0,0 +1,82 @@
+# bench/__main__.py
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import sys
+from datetime import datetime
+
+
+def _git_rev() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return ""
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m bench", description="cs28-api 性能基准")
+    ap.add_argument("--suite", choices=("micro", "serialize", "e2e", "plans", "all"), default="all")
+    ap.add_argument("--out", help="结果写入文件（默认 stdout）")
+    ap.add_argument("--number", type=int, default=100_000, help="微基准每项循环次数")
+    ap.add_argument("--users", type=int, default=50)
+    ap.add_argument("--orders", type=int, default=2000)
+    ap.add_argument("--requests", type=int, default=5000)
+    ap.add_argument("--concurrency", type=int, default=20)
+    ap.add_argument("--dsn", help="plans：对这个 MySQL 库跑 EXPLAIN（默认用替身 SQLite 并自建数据）")
+    args = ap.parse_args(argv)
+
+    # 必须先替换 DB / Redis，再 import 其余 app 模块
+    from bench.harness import setup_stand_ins, teardown_stand_ins
+    setup_stand_ins()
+
+    results = []
+    if args.suite in ("micro", "all"):
+        from bench import micro
+        results.extend(micro.run(args.number))
+    if args.suite in ("serialize", "all"):
+        from bench import serialize
+        results.extend(serialize.run(max(1, args.number // 50)))
+    if args.suite in ("e2e", "all"):
+        from bench import e2e
+
+        async def _e2e():
+            try:
+                return await e2e.run(args.users, args.orders, args.requests, args.concurrency)
+            finally:
+                await teardown_stand_ins()
+        results.extend(asyncio.run(_e2e()))
+    if args.suite == "plans":
+        # 执行计划检查不计入 all（需要灌数据，且结果是通过 / 不通过而不是耗时）
+        from bench import plans
+
+        async def _plans():
+            try:
+                return await plans.run(args.dsn)
+            finally:
+                await teardown_stand_ins()
+        results.extend(asyncio.run(_plans()))
+
+    report = {
+        "meta": {
+            "git_rev": _git_rev(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "suite": args.suite,
+        },
+        "results": results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    # 回归检查（plans）有不通过项时非 0 退出，便于接 CI
+    return 1 if any(r.get("ok") is False for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
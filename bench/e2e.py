@@ -0,0 +1,160 @@
+# bench/e2e.py
+"""
+端到端基准（进程内 ASGI 调用，包含 FastAPI 路由/依赖/序列化开销）：
+  - place_order 吞吐（并发 POST /api/orders/place）
+  - settle_orders_once 结算速度（订单/秒）：逐单结算，以及封盘后预计算派彩再批量写回
+  - GET /api/lottery/history 每秒请求数
+数值只在同一台机器、同一替身后端之间可比；SQLite 写入是串行的，下单吞吐偏保守。
+"""
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import List
+
+import httpx
+
+from bench.harness import summarize
+
+LOTTERY = "jnd28"
+PLAYS = ["大", "小", "单", "双", "极大", "极小"] + [str(i) for i in range(28)]
+ISSUE_BASE = 3_000_000
+
+
+async def _seed(n_users: int, n_issues: int) -> None:
+    from app.db.session import engine, Base, AsyncSessionLocal
+    from app.models.issue import Issue
+    from app.models.lottery import Lottery
+    from app.models.play_type import PlayType
+    from app.models.user import User
+    from app.services.issue_service import calc_fields
+    from app.services.bootstrap_service import warmup_redis_from_db
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    rnd = random.Random(28)
+    async with AsyncSessionLocal() as s:
+        s.add(Lottery(code=LOTTERY, name="加拿大28", period_seconds=210, lock_ahead_seconds=3, status=1, tz="Asia/Shanghai"))
+        for i, name in enumerate(PLAYS):
+            odds = Decimal("1.98") if i < 4 else (Decimal("15") if i < 6 else Decimal("10"))
+            s.add(PlayType(id=i + 1, lottery_code=LOTTERY, code=i + 1, name=name, odds=odds, status=1))
+        # 基准直接签发 token，不走登录；密码哈希给不可用的占位值即可
+        pw = "!"
+        for u in range(n_users):
+            s.add(User(id=u + 1, username=f"bench{u}", password_hash=pw, nickname=f"bench{u}",
+                       status=1, is_robot=True, balance=Decimal("100000000")))
+        t0 = datetime.now() - timedelta(seconds=210 * n_issues)
+        for i in range(n_issues):
+            n = [rnd.randint(0, 9) for _ in range(3)]
+            sm, bs, oe, ex = calc_fields(*n)
+            ot = t0 + timedelta(seconds=210 * i)
+            s.add(Issue(lottery_code=LOTTERY, issue_code=str(ISSUE_BASE + i), open_time=ot,
+                        close_time=ot - timedelta(seconds=3), status=3,
+                        n1=n[0], n2=n[1], n3=n[2], sum_value=sm, bs=bs, oe=oe, extreme=ex))
+        await s.commit()
+        await warmup_redis_from_db(s, LOTTERY, limit=200)
+
+
+async def _bench_place_order(client: httpx.AsyncClient, n_users: int, n_orders: int, concurrency: int, n_issues: int) -> dict:
+    from app.core.security import create_access_token
+
+    tokens = [create_access_token(u + 1) for u in range(n_users)]
+    rnd = random.Random(7)
+    jobs = []
+    for k in range(n_orders):
+        items = [{"play": p, "amount": rnd.choice((1, 5, 10, 50))} for p in rnd.sample(PLAYS, rnd.randint(1, 3))]
+        jobs.append((tokens[k % n_users], {
+            "code": LOTTERY, "issue": str(ISSUE_BASE + rnd.randrange(n_issues)), "items": items,
+        }))
+
+    latencies: List[float] = []
+    errors = 0
+    queue = iter(jobs)
+
+    async def worker():
+        nonlocal errors
+        for token, body in queue:
+            t = time.perf_counter()
+            resp = await client.post("/api/orders/place", json=body, headers={"Authorization": f"Bearer {token}"})
+            latencies.append(time.perf_counter() - t)
+            if resp.status_code != 200:
+                errors += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize("e2e.place_order", n_orders, time.perf_counter() - t0, latencies,
+                     concurrency=concurrency, errors=errors)
+
+
+async def _bench_settlement(precompute: bool = False) -> List[dict]:
+    from sqlalchemy import func, select
+    from app.db.session import AsyncSessionLocal
+    from app.models.orders import Orders
+    from app.tasks.settlement import settle_orders_once, build_payout_plan, STATUS_SUBMITTED, STATUS_PENDING
+
+    async def pending() -> int:
+        async with AsyncSessionLocal() as s:
+            return int(await s.scalar(
+                select(func.count()).select_from(Orders).where(Orders.status.in_([STATUS_SUBMITTED, STATUS_PENDING]))
+            ) or 0)
+
+    results = []
+    before = await pending()
+    if precompute:
+        async with AsyncSessionLocal() as s:
+            issues = (await s.execute(
+                select(Orders.issue_code).where(Orders.status.in_([STATUS_SUBMITTED, STATUS_PENDING])).distinct()
+            )).scalars().all()
+        t0 = time.perf_counter()
+        planned = 0
+        for issue in issues:
+            planned += await build_payout_plan(LOTTERY, issue)
+        results.append(summarize("e2e.presettle_build", planned, time.perf_counter() - t0, issues=len(issues)))
+
+    t0 = time.perf_counter()
+    rounds = 0
+    while rounds < 10_000:
+        rounds += 1
+        await settle_orders_once()
+        if await pending() == 0:
+            break
+    elapsed = time.perf_counter() - t0
+    name = "e2e.settle_orders_once[precomputed]" if precompute else "e2e.settle_orders_once"
+    results.append(summarize(name, before - await pending(), elapsed, rounds=rounds))
+    return results
+
+
+async def _bench_history(client: httpx.AsyncClient, n_requests: int, concurrency: int) -> dict:
+    latencies: List[float] = []
+    remaining = iter(range(n_requests))
+
+    async def worker():
+        for _ in remaining:
+            t = time.perf_counter()
+            await client.get("/api/lottery/history", params={"code": LOTTERY, "limit": 30})
+            latencies.append(time.perf_counter() - t)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize("e2e.history", n_requests, time.perf_counter() - t0, latencies, concurrency=concurrency)
+
+
+async def run(n_users: int = 50, n_orders: int = 2000, n_requests: int = 5000, concurrency: int = 20, n_issues: int = 300) -> List[dict]:
+    from app.main import app
+    import logging
+    # 结算每单一行 WARNING 日志，会淹没结果并拖慢结算
+    logging.getLogger("app.tasks.settlement").setLevel(logging.ERROR)
+
+    await _seed(n_users, n_issues)
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        results.append(await _bench_place_order(client, n_users, n_orders, concurrency, n_issues))
+        results.extend(await _bench_settlement())
+        results.append(await _bench_history(client, n_requests, concurrency))
+        # 再下一批单，走“封盘后预计算 → 开奖批量写回”的路径
+        await _bench_place_order(client, n_users, n_orders, concurrency, n_issues)
+        results.extend(await _bench_settlement(precompute=True))
+    return results
@@ -0,0 +1,47 @@
+# bench/micro.py
+"""热点纯函数的微基准（不依赖 DB / Redis）。"""
+from decimal import Decimal
+from typing import List
+
+from bench.harness import timeit_loop
+
+SELECTIONS = ["大", "小", "单", "双", "极大", "极小"] + [str(i) for i in range(28)]
+INPUTS = ["DA", "x", "单", "S", "JDA", "极小", "13", " 27 ", "0"]
+
+
+def run(number: int = 100_000) -> List[dict]:
+    from app.routers.orders import normalize_play_to_name, q2, q4
+    from app.services.issue_service import calc_fields
+    from app.tasks.settlement import is_hit
+    from app.services.odds_analysis_service import play_report, pnl_vector, exact_distribution, monte_carlo
+
+    enabled = set(SELECTIONS)
+    results = []
+
+    def bench_is_hit():
+        for s in SELECTIONS:
+            is_hit(s, 14)
+    r = timeit_loop("micro.is_hit[34 selections]", bench_is_hit, max(1, number // 34))
+    results.append(r)
+
+    def bench_normalize():
+        for p in INPUTS:
+            normalize_play_to_name(p, enabled)
+    results.append(timeit_loop("micro.normalize_play_to_name[9 inputs]", bench_normalize, max(1, number // 9)))
+
+    stake, odds = Decimal("12.34"), Decimal("1.9800")
+    results.append(timeit_loop("micro.q2(stake*odds)", lambda: q2(stake * odds), number))
+    results.append(timeit_loop("micro.q4(odds)", lambda: q4(odds), number))
+    results.append(timeit_loop("micro.calc_fields", lambda: calc_fields(3, 7, 9), number))
+
+    odds = {s: 1.98 if i < 4 else 9.8 for i, s in enumerate(SELECTIONS)}
+    bets = [(s, Decimal("10"), Decimal(str(odds[s]))) for s in SELECTIONS] * 30
+    results.append(timeit_loop("micro.odds.play_report[34 plays]", lambda: play_report(odds), max(1, number // 100)))
+
+    def bench_issue():
+        _, pnl = pnl_vector(bets)
+        exact_distribution(pnl)
+    results.append(timeit_loop("micro.odds.pnl_vector+exact[1020 items]", bench_issue, max(1, number // 1000)))
+    _, pnl = pnl_vector(bets)
+    results.append(timeit_loop("micro.odds.monte_carlo[100x1000]", lambda: monte_carlo(pnl, 100, 1000, 1), max(1, number // 10_000)))
+    return results
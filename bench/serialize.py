@@ -0,0 +1,118 @@
+# bench/serialize.py
+"""
+按路由对比响应序列化的 CPU 开销（不含 DB / Redis）：
+  - before：FastAPI 默认路径（response_model 校验 + dump(mode="json")，或 jsonable_encoder）+ stdlib json
+  - after：直接拼 dict + FastJSONResponse（orjson）
+用 time.process_time 计 CPU 时间，取 repeat 轮最快值。
+"""
+import json
+import random
+import time
+from decimal import Decimal
+from typing import Callable, List
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from app.core.responses import dumps as fast_dumps
+from app.routers.lottery import _history_items
+from app.schemas.lottery import HistoryItem, HistoryResp, StatsResp
+from app.schemas.orders import OrderOut
+from app.services.stats_service import TrendStats
+
+
+def _stdlib_dumps(content) -> bytes:
+    # 与 starlette JSONResponse.render 相同的参数
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def _cpu_ns(fn: Callable[[], object], number: int, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.process_time()
+        for _ in range(number):
+            fn()
+        best = min(best, time.process_time() - t0)
+    return best / number * 1e9
+
+
+def _compare(name: str, before: Callable[[], bytes], after: Callable[[], bytes], number: int) -> dict:
+    # 两条路径的输出必须语义一致，否则对比没有意义
+    assert json.loads(before()) == json.loads(after()), name
+    b = _cpu_ns(before, number)
+    a = _cpu_ns(after, number)
+    return {
+        "name": f"serialize.{name}",
+        "ops": number,
+        "before_cpu_us": round(b / 1000, 2),
+        "after_cpu_us": round(a / 1000, 2),
+        "saving_pct": round((1 - a / b) * 100, 1) if b > 0 else None,
+    }
+
+
+def run(number: int = 2000) -> List[dict]:
+    rnd = random.Random(37)
+    results = []
+
+    # /api/lottery/history：Redis 里的 JSON 字符串（30 条）
+    raw = []
+    for i in range(30):
+        n = [rnd.randint(0, 9) for _ in range(3)]
+        s = sum(n)
+        raw.append(json.dumps({
+            "lottery_code": "jnd28", "issue_code": str(3_000_000 - i), "n1": n[0], "n2": n[1], "n3": n[2],
+            "sum_value": s, "bs": 1 if s >= 14 else 2, "oe": 1 if s % 2 else 2, "extreme": 0,
+            "open_time": "2024-07-01 12:00:00",
+        }, ensure_ascii=False))
+    history_ta = TypeAdapter(HistoryResp)
+
+    def history_before():
+        items = [HistoryItem(**json.loads(s)) for s in raw]
+        content = {"code": "jnd28", "head": items[0].issue_code, "list": items}
+        return _stdlib_dumps(history_ta.dump_python(history_ta.validate_python(content), mode="json"))
+
+    def history_after():
+        items = _history_items(raw)
+        return fast_dumps({"code": "jnd28", "head": items[0]["issue_code"], "truncated": False, "list": items})
+
+    results.append(_compare("history[30]", history_before, history_after, number))
+
+    # /api/orders/history：20 单 × 3 子单
+    orders = []
+    for k in range(20):
+        orders.append({
+            "id": 1000 + k, "lottery_code": "jnd28", "issue_code": str(3_000_000 + k),
+            "total_amount": 30.0, "status": 1,
+            "items": [{"id": 5000 + k * 3 + j, "play": p, "amount": 10.0, "odds": 1.98} for j, p in enumerate(("大", "单", "13"))],
+        })
+    orders_ta = TypeAdapter(List[OrderOut])
+    results.append(_compare(
+        "orders_history[20x3]",
+        lambda: _stdlib_dumps(orders_ta.dump_python(orders_ta.validate_python(orders), mode="json")),
+        lambda: fast_dumps(orders),
+        number,
+    ))
+
+    # /api/lottery/odds：34 个玩法，赔率为 Decimal（原先无 response_model，走 jsonable_encoder）
+    odds = [{"name": str(i), "odds": Decimal("9.8000"), "status": 1} for i in range(28)]
+    odds += [{"name": n, "odds": Decimal("1.9800"), "status": 1} for n in ("大", "小", "单", "双", "极大", "极小")]
+    results.append(_compare(
+        "odds[34]",
+        lambda: _stdlib_dumps(jsonable_encoder(odds)),
+        lambda: fast_dumps(odds),
+        number,
+    ))
+
+    # /api/lottery/stats：窗口 100 的快照
+    ts = TrendStats("jnd28", (100,))
+    for i in range(100):
+        ts.push(str(3_000_000 + i), rnd.randint(0, 27))
+    snap = ts.snapshot(100)
+    stats_ta = TypeAdapter(StatsResp)
+    results.append(_compare(
+        "stats[window=100]",
+        lambda: _stdlib_dumps(stats_ta.dump_python(stats_ta.validate_python(snap), mode="json")),
+        lambda: fast_dumps(snap),
+        number,
+    ))
+    return results
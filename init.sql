@@ -138,7 +138,8 @@ CREATE TABLE IF NOT EXISTS issue (
   created_at      DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
   updated_at      DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
   UNIQUE KEY uk_issue (lottery_code, issue_code),
-  INDEX idx_issue_status (lottery_code, status, open_time)
+  INDEX idx_issue_status (lottery_code, status, open_time),
+  INDEX idx_issue_open_time (lottery_code, open_time)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
 -- 6. 下注订单（主+明细） ---------------------------------------------------
@@ -154,10 +155,15 @@ CREATE TABLE IF NOT EXISTS orders (
   win_amount       DECIMAL(16,2) NOT NULL DEFAULT 0.00,
   ip               VARCHAR(64) NULL,
   channel          VARCHAR(32) NULL,             -- web/h5/ios/android/robot
+  idempotency_key  VARCHAR(64) NULL,             -- 客户端幂等键
   created_at       DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
   updated_at       DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  UNIQUE KEY idempotency_key (idempotency_key),
   INDEX idx_order_user_time (user_id, created_at),
+  INDEX idx_order_user_id (user_id, id),                       -- 订单历史（按 ID 倒序翻页）
   INDEX idx_order_issue (lottery_code, issue_code),
+  INDEX idx_order_issue_status (lottery_code, issue_code, status),  -- 整期预计算 / 批量写回
+  INDEX idx_order_status (status),                             -- 未结算订单扫描（status IN (1,3)）
   FOREIGN KEY (user_id) REFERENCES user(id)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
@@ -174,9 +180,45 @@ CREATE TABLE IF NOT EXISTS order_item (
   settled_at       DATETIME NULL,
   UNIQUE KEY uk_order_play_sel (order_id, play_code, selection),
   INDEX idx_item_order (order_id),
+  INDEX idx_item_settled (settled_at),                         -- 结算明细导出（按结算时间）
   FOREIGN KEY (order_id) REFERENCES orders(id)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
+-- 归档（已结算/撤单超过 ORDER_ARCHIVE_AFTER_DAYS 天的订单，由定时任务分批搬迁；无外键）
+CREATE TABLE IF NOT EXISTS orders_archive (
+  id               BIGINT UNSIGNED PRIMARY KEY,  -- 保留原订单 ID
+  user_id          BIGINT UNSIGNED NOT NULL,
+  lottery_code     VARCHAR(32) NOT NULL,
+  issue_code       VARCHAR(32) NOT NULL,
+  total_amount     DECIMAL(16,2) NOT NULL,
+  total_odds       DECIMAL(10,4) NULL,
+  status           TINYINT NOT NULL,
+  win_amount       DECIMAL(16,2) NOT NULL DEFAULT 0.00,
+  ip               VARCHAR(64) NULL,
+  channel          VARCHAR(32) NULL,
+  idempotency_key  VARCHAR(64) NULL,
+  created_at       DATETIME NOT NULL,
+  updated_at       DATETIME NOT NULL,
+  archived_at      DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  INDEX idx_order_arch_user (user_id, id),
+  INDEX idx_order_arch_created (created_at),                    -- 订单导出（按下单日）
+  UNIQUE KEY uk_order_arch_idem (idempotency_key)               -- 幂等键查询（归档后重放同一键不重复下单）
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS order_item_archive (
+  id               BIGINT UNSIGNED PRIMARY KEY,
+  order_id         BIGINT UNSIGNED NOT NULL,
+  play_code        INT NOT NULL,
+  selection        VARCHAR(32) NOT NULL,
+  odds             DECIMAL(10,4) NOT NULL,
+  stake_amount     DECIMAL(16,2) NOT NULL,
+  result_status    TINYINT NOT NULL DEFAULT 0,
+  win_amount       DECIMAL(16,2) NOT NULL DEFAULT 0.00,
+  settled_at       DATETIME NULL,
+  INDEX idx_item_arch_order (order_id),
+  INDEX idx_item_arch_settled (settled_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
 -- 撤单记录（冗余以便审计）
 CREATE TABLE IF NOT EXISTS order_cancel_log (
   id               BIGINT UNSIGNED PRIMARY KEY AUTO_INCREMENT,
@@ -224,6 +266,70 @@ CREATE TABLE IF NOT EXISTS settle_log (
   INDEX idx_settle_issue (lottery_code, issue_code)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
+-- 每期盈亏汇总：下单 / 撤单 / 结算的 outbox 事件增量维护（见 app/services/issue_pnl_service.py）
+CREATE TABLE IF NOT EXISTS issue_pnl (
+  id               BIGINT UNSIGNED PRIMARY KEY AUTO_INCREMENT,
+  lottery_code     VARCHAR(32) NOT NULL,
+  issue_code       VARCHAR(32) NOT NULL,
+  issue_date       DATE NOT NULL,               -- 开奖日期（开奖前为下单日期）
+  order_count      INT NOT NULL DEFAULT 0,      -- 有效订单数（不含撤单）
+  bettor_count     INT NOT NULL DEFAULT 0,      -- 投注人数（不含撤单）
+  turnover         DECIMAL(18,2) NOT NULL DEFAULT 0,  -- 有效投注额
+  cancel_count     INT NOT NULL DEFAULT 0,
+  cancel_amount    DECIMAL(18,2) NOT NULL DEFAULT 0,
+  settled_count    INT NOT NULL DEFAULT 0,      -- 已结算订单数
+  settled_stake    DECIMAL(18,2) NOT NULL DEFAULT 0,  -- 已结算订单的投注额
+  payout           DECIMAL(18,2) NOT NULL DEFAULT 0,  -- 派彩（含重新结算调整）
+  updated_at       DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  UNIQUE KEY uk_issue_pnl (lottery_code, issue_code),
+  INDEX idx_pnl_date (lottery_code, issue_date)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- 每期投注人数的增量依据：(期次, 用户) 的有效订单数，0 ↔ 正数时 issue_pnl.bettor_count ±1；过了保留期按期次清理
+CREATE TABLE IF NOT EXISTS issue_bettor (
+  id               BIGINT UNSIGNED PRIMARY KEY AUTO_INCREMENT,
+  lottery_code     VARCHAR(32) NOT NULL,
+  issue_code       VARCHAR(32) NOT NULL,
+  user_id          BIGINT UNSIGNED NOT NULL,
+  order_count      INT NOT NULL DEFAULT 0,      -- 有效订单数（不含撤单）
+  UNIQUE KEY uk_issue_bettor (lottery_code, issue_code, user_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- 开奖结果更正后的重新结算：一次更正一个批次（见 app/tasks/resettle.py）
+CREATE TABLE IF NOT EXISTS resettle_batch (
+  id               BIGINT UNSIGNED PRIMARY KEY AUTO_INCREMENT,
+  lottery_code     VARCHAR(32) NOT NULL,
+  issue_code       VARCHAR(32) NOT NULL,
+  old_nums         VARCHAR(16) NOT NULL,        -- 更正前 "n1,n2,n3"
+  old_sum          TINYINT UNSIGNED NOT NULL,
+  new_nums         VARCHAR(16) NOT NULL,
+  new_sum          TINYINT UNSIGNED NOT NULL,
+  status           SMALLINT NOT NULL DEFAULT 0, -- 0待处理 1完成 2失败 3已被后续更正取代
+  order_count      INT NOT NULL DEFAULT 0,      -- 改判的订单数
+  item_count       INT NOT NULL DEFAULT 0,      -- 改判的子单数
+  user_count       INT NOT NULL DEFAULT 0,      -- 调整余额的用户数（各块累加）
+  delta_amount     DECIMAL(16,2) NOT NULL DEFAULT 0,  -- 派彩净变化（正=补发，负=追回）
+  message          VARCHAR(255) NULL,
+  created_at       DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  finished_at      DATETIME NULL,
+  INDEX idx_resettle_issue (lottery_code, issue_code)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- 重新结算明细：每个改判的子单一行（改判前后的结果 / 派彩）
+CREATE TABLE IF NOT EXISTS resettle_item_log (
+  id               BIGINT UNSIGNED PRIMARY KEY AUTO_INCREMENT,
+  batch_id         BIGINT UNSIGNED NOT NULL,
+  order_id         BIGINT UNSIGNED NOT NULL,
+  item_id          BIGINT UNSIGNED NOT NULL,
+  user_id          BIGINT UNSIGNED NOT NULL,
+  old_result       SMALLINT NOT NULL,
+  new_result       SMALLINT NOT NULL,
+  old_win          DECIMAL(16,2) NOT NULL,
+  new_win          DECIMAL(16,2) NOT NULL,
+  created_at       DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  INDEX idx_resettle_item_batch (batch_id, order_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
 CREATE TABLE IF NOT EXISTS job_run_log (
   id               BIGINT UNSIGNED PRIMARY KEY AUTO_INCREMENT,
   job_name         VARCHAR(64) NOT NULL,        -- collector_jnd28 / auto_settle 等
@@ -235,6 +341,29 @@ CREATE TABLE IF NOT EXISTS job_run_log (
   INDEX idx_job_time (job_name, started_at)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
+-- 事务发件箱：业务变更与事件同一事务写入，主节点后台批量投递（Redis / 日志 / 订阅者），失败退避重试
+CREATE TABLE IF NOT EXISTS outbox_event (
+  id               BIGINT UNSIGNED PRIMARY KEY AUTO_INCREMENT,
+  topic            VARCHAR(64) NOT NULL,        -- issue.opened / orders.settled / order.placed / order.cancelled
+  payload          MEDIUMTEXT NOT NULL,         -- JSON
+  status           TINYINT NOT NULL DEFAULT 0,  -- 0待投递 1已投递 2放弃
+  attempts         INT NOT NULL DEFAULT 0,
+  done_handlers    VARCHAR(255) NOT NULL DEFAULT '',
+  last_error       VARCHAR(255) NULL,
+  next_attempt_at  DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  dispatched_at    DATETIME NULL,
+  created_at       DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  INDEX idx_outbox_due (status, next_attempt_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- 增量型订阅者（用户累计 / 每期盈亏）已处理的事件：与增量写同一事务登记，重复投递时跳过
+CREATE TABLE IF NOT EXISTS outbox_applied (
+  event_id         BIGINT UNSIGNED NOT NULL,
+  handler          VARCHAR(64) NOT NULL,
+  created_at       DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (event_id, handler)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
 -- 9. 风控（频控/黑名单等，可扩） ------------------------------------------
 CREATE TABLE IF NOT EXISTS risk_user_flag (
   id               BIGINT UNSIGNED PRIMARY KEY AUTO_INCREMENT,
@@ -569,6 +569,8 @@ CREATE TABLE `orders`  (
   INDEX `idx_order_issue`(`lottery_code`, `issue_code`) USING BTREE,
   INDEX `idx_order_issue_status`(`lottery_code`, `issue_code`, `status`) USING BTREE,
   INDEX `idx_order_user_status_time`(`user_id`, `status`, `created_at`) USING BTREE,
+  INDEX `idx_order_user_id`(`user_id`, `id`) USING BTREE,
+  INDEX `idx_order_status`(`status`) USING BTREE,
   CONSTRAINT `orders_ibfk_1` FOREIGN KEY (`user_id`) REFERENCES `user` (`id`) ON DELETE RESTRICT ON UPDATE RESTRICT
 ) ENGINE = InnoDB AUTO_INCREMENT = 8 CHARACTER SET = utf8mb4 COLLATE = utf8mb4_general_ci ROW_FORMAT = Dynamic;
 